@@ -0,0 +1,126 @@
+"""asyncio flavour of ZMQInstrument based on zmq.asyncio."""
+import asyncio
+import time
+from typing import Any, Optional
+
+import zmq
+import zmq.asyncio
+
+from .ZMQInstrument import ZMQInstrument
+from .ZMQTransport import decode_reply
+
+
+class AsyncZMQInstrument(ZMQInstrument):
+    """
+    ZMQInstrument with an awaitable command API for asyncio code.
+
+    Next to the blocking socket used by the QCoDeS parameters, it owns a
+    zmq.asyncio DEALER socket. Any number of coroutines on one event loop
+    can have commands in flight on it; a reader task hands each reply to
+    its request by JSON-RPC id. One event loop can so drive several
+    instruments at once without a thread per instrument.
+
+    The socket belongs to the event loop it was first used in and is
+    created again when the instrument is used from another loop.
+
+    Args:
+        name: What the instrument is called locally.
+        address: The ZMQ resource name to use to connect.
+        **kwargs: Passed on to ZMQInstrument.
+    """
+
+    def __init__(self, name: str, address: str, **kwargs: Any) -> None:
+        super().__init__(name=name, address=address, **kwargs)
+        self._async_context = zmq.asyncio.Context.shadow(self.context.underlying)
+        self._async_socket: Optional[zmq.asyncio.Socket] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[asyncio.Task] = None
+        # Ids of the requests in flight on the async socket
+        self._async_requests: set[str] = set()
+
+    async def send_command(self, cmd: str, params: dict = {}, binary: bool = False) -> dict:
+        """
+        Sends a JSON-RPC command and waits for its response without blocking the loop.
+
+        Args:
+            cmd: The method to call.
+            params: The parameters of the call.
+            binary: Ask for binary framing of array replies,
+                if binary_arrays is enabled.
+
+        Returns:
+            dict: The instrument's response.
+        """
+        socket = self._get_async_socket()
+        request_id = self._requests.next_id()
+        payload = self._encode_command(cmd, params, request_id, binary and self._binary_arrays)
+        future = self._requests.register(request_id, self._async_loop.create_future())
+        self._async_requests.add(request_id)
+        start = time.perf_counter()
+        try:
+            self.zmq_log.debug("Querying: %s", payload)
+            await socket.send_multipart([b"", payload])
+            response = await asyncio.wait_for(future, self._timeout)
+            self.zmq_log.debug("Response: %s", response)
+        except asyncio.TimeoutError:
+            self.metrics.count_timeout(cmd)
+            raise zmq.Again() from None
+        finally:
+            self._async_requests.discard(request_id)
+            self._requests.discard(request_id)
+        self.metrics.observe_request(cmd, time.perf_counter() - start)
+        return response
+
+    def _get_async_socket(self) -> zmq.asyncio.Socket:
+        loop = asyncio.get_running_loop()
+        # A new socket for another loop, or to replace a reader that died
+        if (self._async_socket is None or self._async_loop is not loop
+                or self._reader is None or self._reader.done()):
+            self._close_async_socket()
+            self._async_socket = self._async_context.socket(zmq.DEALER)
+            self._async_socket.setsockopt(zmq.LINGER, 0)
+            self._async_socket.connect(self._address)
+            self._async_loop = loop
+            self._reader = loop.create_task(self._read_replies(self._async_socket))
+        return self._async_socket
+
+    async def _read_replies(self, socket: zmq.asyncio.Socket) -> None:
+        try:
+            while True:
+                self._dispatch_reply(await socket.recv_multipart())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Nothing reads the socket any more, so fail the waiting requests
+            # now instead of letting each run into its timeout
+            self.log.error("Reading replies failed, dropping the async socket: %s", e)
+            error = RuntimeError(f"The reply reader of {self.name} stopped: {e!r}")
+            self._requests.fail(self._async_requests, error)
+
+    def _dispatch_reply(self, frames: list) -> None:
+        while frames and not frames[0]:
+            frames = frames[1:]
+        if not frames:
+            return
+        try:
+            self._requests.resolve(decode_reply(frames, self.metrics, self._codec))
+        except Exception as e:
+            self.log.warning("Dropping a reply that can't be read: %s", e)
+
+    def _close_async_socket(self) -> None:
+        if self._reader is not None and not self._reader.done():
+            self._reader.cancel()
+        if self._async_socket is not None:
+            self._async_socket.close(linger=0)
+        self._reader = None
+        self._async_socket = None
+
+    def close(self) -> None:
+        """Disconnect and irreversibly tear down the instrument."""
+        if getattr(self, '_async_context', None) is not None:
+            try:
+                self._close_async_socket()
+            except RuntimeError:
+                # The event loop of the reader is already closed
+                self._async_socket = None
+        super().close()
@@ -0,0 +1,113 @@
+"""JSON codecs for the JSON-RPC messages of ZMQInstrument, fastest available first."""
+import json
+from functools import lru_cache
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+
+Buffer = Union[bytes, bytearray, memoryview, str]
+
+
+class Codec:
+    """
+    Turns JSON-RPC messages into compact UTF-8 JSON bytes and back.
+
+    Subclasses wrap a JSON library; dumps must produce the same key order
+    as the dict it is given, so pre-serialized command templates (see
+    ZMQInstrument) stay interchangeable with encoded dicts.
+    """
+
+    name = 'json'
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(',', ':'), default=_default).encode()
+
+    def loads(self, data: Buffer) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+
+class OrjsonCodec(Codec):
+    """
+    orjson: several times faster than the standard library on both ends,
+    serializes NumPy arrays natively and parses memoryviews without copying.
+    """
+
+    name = 'orjson'
+
+    def __init__(self) -> None:
+        import orjson
+        self._dumps: Callable[..., bytes] = orjson.dumps
+        self._loads: Callable[[Buffer], Any] = orjson.loads
+        self._error = orjson.JSONDecodeError
+        self._options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._dumps(obj, default=_default, option=self._options)
+
+    def loads(self, data: Buffer) -> Any:
+        try:
+            return self._loads(data)
+        except self._error:
+            # Strict JSON only; NaN and Infinity from LabVIEW need the stdlib
+            return super().loads(data)
+
+
+class UjsonCodec(Codec):
+    """
+    ujson: faster than the standard library, for machines without orjson.
+    """
+
+    name = 'ujson'
+
+    def __init__(self) -> None:
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._ujson.dumps(obj, default=_default, ensure_ascii=False).encode()
+
+    def loads(self, data: Buffer) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return self._ujson.loads(data)
+
+
+CODECS: dict[str, type[Codec]] = {'orjson': OrjsonCodec, 'ujson': UjsonCodec, 'json': Codec}
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """
+    Returns a codec by name ('orjson', 'ujson' or 'json'), or the fastest
+    installed one if name is None.
+    """
+    if name is not None:
+        if name not in CODECS:
+            raise ValueError(f"Unknown codec {name!r}, expected one of {list(CODECS)}")
+        return CODECS[name]()
+    return get_codec(installed_codecs()[0])
+
+
+@lru_cache(maxsize=None)
+def installed_codecs() -> tuple[str, ...]:
+    """
+    Returns the names of the codecs whose library is installed, fastest first.
+    Looked up once per process.
+    """
+    names = []
+    for name, codec in CODECS.items():
+        try:
+            codec()
+        except ImportError:
+            continue
+        names.append(name)
+    return tuple(names)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
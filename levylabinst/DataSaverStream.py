@@ -0,0 +1,120 @@
+"""Background writer that streams sweep waveforms into a QCoDeS DataSaver."""
+import logging
+import queue
+import threading
+from typing import Any, Optional, Sequence
+
+import numpy as np
+import qcodes as qc
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class DataSaverStream:
+    """
+    Writes waveform chunks to a DataSaver from a background thread.
+
+    Chunks are put in as they arrive, e.g. by passing put as the on_chunk
+    callback of MCLockin.sweep1d_async. The writer thread turns them into
+    NumPy arrays and adds them to the DataSaver in batches of at most
+    batch_size points, so the data can be plotted live and the stream holds
+    a bounded number of chunks: put blocks while max_pending chunks wait to
+    be written. That bounds the stream only; the chunk polling of
+    sweep1d_async still downloads the whole waveform recorded so far on
+    every poll.
+
+    The measurement must run with write_in_background=True: otherwise
+    add_result flushes to SQLite from the thread that calls it, and the
+    connection belongs to the main thread. QCoDeS doesn't tell from the
+    DataSaver, so pass the same write_in_background as to Measurement.run();
+    a ValueError is raised if it is False. Nothing else should add results
+    to the DataSaver while the stream is open.
+
+    E.g.
+        with meas.run(write_in_background=True) as datasaver, \\
+                DataSaverStream(datasaver, (lockin.gate_DC, lockin.drain_X),
+                                write_in_background=True) as stream:
+            lockin.sweep1d_async(2, 0, 0.1, 10, 1, on_chunk=stream.put,
+                                 chunk_interval=0.5).result()
+
+    Args:
+        datasaver: The DataSaver of the running measurement.
+        parameters: The parameters of the arrays of a chunk, in order.
+        static: (parameter, value) pairs added to every batch, e.g. the
+            setpoints of the outer loops.
+        batch_size: Most points per add_result call. Default 1000.
+        max_pending: Most chunks waiting to be written. Default 16.
+        write_in_background: What the measurement was run with. None takes
+            qc.config.dataset.write_in_background, like Measurement.run().
+    """
+
+    def __init__(self, datasaver: Any, parameters: Sequence[Any],
+                 static: Sequence[tuple[Any, Any]] = (),
+                 batch_size: int = 1000, max_pending: int = 16,
+                 write_in_background: Optional[bool] = None) -> None:
+        if write_in_background is None:
+            write_in_background = qc.config.dataset.write_in_background
+        if not write_in_background:
+            raise ValueError('DataSaverStream needs a measurement run with '
+                             'write_in_background=True; without it the writer thread '
+                             'cannot flush to the SQLite connection of the main thread.')
+        self.datasaver = datasaver
+        self.parameters = tuple(parameters)
+        self.static = tuple(static)
+        self.batch_size = batch_size
+        self.points_written = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._write, name='datasaver_stream',
+                                        daemon=True)
+        self._thread.start()
+
+    def put(self, *arrays: Any) -> None:
+        """
+        Queues a chunk: one array of new points per parameter.
+        """
+        if self._error is not None:
+            raise RuntimeError('The DataSaver stream failed') from self._error
+        if len(arrays) != len(self.parameters):
+            raise ValueError(f'Expected {len(self.parameters)} arrays, got {len(arrays)}')
+        self._queue.put(arrays)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Writes the queued chunks, stops the writer and raises its error, if any.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        if self._error is not None:
+            raise RuntimeError('The DataSaver stream failed') from self._error
+
+    def __enter__(self) -> 'DataSaverStream':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _write(self) -> None:
+        while True:
+            chunk = self._queue.get()
+            if chunk is _STOP:
+                return
+            if self._error is not None:
+                # Keep draining so that put never blocks forever
+                continue
+            try:
+                arrays = [np.asarray(array, dtype=float) for array in chunk]
+                n = min(len(array) for array in arrays)
+                for start in range(0, n, self.batch_size):
+                    stop = min(start + self.batch_size, n)
+                    self.datasaver.add_result(
+                        *((parameter, array[start:stop])
+                          for parameter, array in zip(self.parameters, arrays)),
+                        *self.static)
+                    self.points_written += stop - start
+            except BaseException as e:
+                log.error('Writing streamed data failed: %s', e)
+                self._error = e
@@ -1,17 +1,202 @@
-import json
-import warnings
+import asyncio
+from concurrent.futures import Future
 from functools import partial
-from time import sleep
-from typing import Any, Callable, ClassVar, Literal, Optional, Union, cast
-import zmq
+from operator import itemgetter
+from typing import Any, Callable, ClassVar, Dict, Optional, Sequence, cast
 import numpy as np
 from .ZMQInstrument import ZMQInstrument
+from .AsyncZMQInstrument import AsyncZMQInstrument
 import qcodes.validators as vals
-from qcodes.utils import DelayedKeyboardInterrupt
+from qcodes.instrument import InstrumentChannel
+from qcodes.parameters import MultiParameter, ParameterWithSetpoints
 import time
-import tkinter as tk
-from tkinter import simpledialog, messagebox
-from typing import Any, Dict
+
+MEASUREMENTS = ('X', 'Y', 'R', 'Theta', 'Mean')
+# Quantities recorded as waveforms during a hardware sweep
+SWEEP_MEASUREMENTS = ('X', 'Y')
+# Source settings of an AO channel: parameter -> (set command, key of the value
+# in the command params and in the AO config reply)
+AO_SETTINGS = {'Amp': ('setAO_Amplitude', 'Amplitude (V)'),
+               'DC': ('setAO_DC', 'DC (V)'),
+               'Freq': ('setAO_Frequency', 'Frequency (Hz)'),
+               'Phase': ('setAO_Phase', 'Phase (deg)'),
+               'Function': ('setAO_Function', 'Function')}
+# Parameters of every LockinChannel, also reachable as lockin.{label}_{name}
+CHANNEL_PARAMETERS = ('Amp', 'DC', 'Freq', 'Phase', 'Function', *MEASUREMENTS,
+                      'AO_sweep', *(f'{m}_sweep' for m in SWEEP_MEASUREMENTS))
+
+
+class ResultsIndex:
+    """
+    Pulls a fixed set of result keys out of getResults replies by position.
+
+    The server returns its results as a list of {'key': ..., 'value': ...}
+    items whose order does not change between replies. The position of every
+    wanted key is learned from the first reply; later replies are only checked
+    against that layout and read by index. The full key dictionary is built
+    again only when the layout changes. While some wanted keys are missing,
+    every reply's full key list is compared, so a key that appears in place
+    of another one is picked up.
+
+    Args:
+        keys: The result keys to extract, in the order of the returned array.
+    """
+
+    def __init__(self, keys: Sequence[str]) -> None:
+        self.keys = tuple(keys)
+        self._length = -1
+        self._found_keys: list[str] = []
+        self._found: frozenset[str] = frozenset()
+        self._slots: list[int] = []
+        # Every key of the learned reply, kept only while wanted keys are missing
+        self._layout: Optional[list[str]] = None
+        self._pick: Callable[[Sequence[dict]], tuple] = lambda results: ()
+
+    def values(self, results: Sequence[dict]) -> np.ndarray:
+        """
+        Returns the values of the wanted keys as a float array, NaN where missing.
+        """
+        items = self._pick(results) if len(results) == self._length else None
+        if (items is None or [item['key'] for item in items] != self._found_keys
+                or (self._layout is not None
+                    and [item['key'] for item in results] != self._layout)):
+            self._learn(results)
+            items = self._pick(results)
+        packed = np.array([item['value'] for item in items], dtype=float)
+        if len(self._slots) == len(self.keys):
+            return packed
+        values = np.full(len(self.keys), np.nan)
+        values[self._slots] = packed
+        return values
+
+    def found(self, key: str) -> bool:
+        """
+        Returns whether key was in the last reply passed to values().
+        """
+        return key in self._found
+
+    def _learn(self, results: Sequence[dict]) -> None:
+        positions = {item['key']: i for i, item in enumerate(results)}
+        found = [(positions[key], slot) for slot, key in enumerate(self.keys)
+                 if key in positions]
+        self._found_keys = [self.keys[slot] for _, slot in found]
+        self._found = frozenset(self._found_keys)
+        self._slots = [slot for _, slot in found]
+        self._length = len(results)
+        self._layout = (None if len(found) == len(self.keys)
+                        else [item['key'] for item in results])
+        getter = itemgetter(*(i for i, _ in found)) if found else None
+        if getter is None:
+            self._pick = lambda results: ()
+        elif len(found) == 1:
+            self._pick = lambda results: (getter(results),)
+        else:
+            self._pick = getter
+
+
+class LockinResults(MultiParameter):
+    """
+    X/Y/R/Theta/Mean of every configured AI channel from a single getResults reply.
+
+    Each element is a NumPy array over the AI channels of the instrument config
+    (sorted, labels sharing a channel appear once), so a Measurement can
+    register this one parameter instead of one scalar per label and quantity.
+
+    Args:
+        name: The parameter name.
+        instrument: The MCLockin this parameter belongs to.
+    """
+
+    def __init__(self, name: str, instrument: 'MCLockin', **kwargs: Any) -> None:
+        channels = np.array(instrument._result_channels)
+        n = len(channels)
+        super().__init__(name,
+                         instrument=instrument,
+                         names=tuple(f'{name}_{m}' for m in MEASUREMENTS),
+                         shapes=((n,),) * len(MEASUREMENTS),
+                         labels=MEASUREMENTS,
+                         units=tuple('deg' if m == 'Theta' else 'V' for m in MEASUREMENTS),
+                         setpoints=((channels,),) * len(MEASUREMENTS),
+                         setpoint_names=(('AI_channel',),) * len(MEASUREMENTS),
+                         setpoint_labels=(('AI Channel',),) * len(MEASUREMENTS),
+                         docstring='Lock-in results of all configured channels as arrays.',
+                         **kwargs)
+
+    def get_raw(self) -> tuple[np.ndarray, ...]:
+        return tuple(self.instrument._get_results().copy())
+
+
+class LockinChannel(InstrumentChannel):
+    """
+    The output settings, lock-in results and buffered sweep waveforms of one
+    labelled channel of the lock-in config.
+
+    MCLockin creates these on first access, e.g. lockin.drain or lockin.drain_X,
+    which is the same parameter as lockin.drain.X. Parameters keep their
+    full names (lockin_drain_X), so datasets look the same either way.
+
+    Args:
+        parent: The MCLockin this channel belongs to.
+        name: The label of the channel in the config.
+        channel: The lock-in channel number of the label.
+    """
+
+    def __init__(self, parent: 'MCLockin', name: str, channel: int, **kwargs: Any) -> None:
+        super().__init__(parent, name, **kwargs)
+        self.channel = channel
+
+        self.add_parameter('Amp',
+                           label=f'{name} Amplitude',
+                           unit='V',
+                           vals=vals.Numbers(0, 100),
+                           get_cmd=partial(parent._get_ao, 'Amp', channel),
+                           set_cmd=partial(parent._set_ao, 'Amp', channel))
+
+        self.add_parameter('DC',
+                           label=f'{name} DC',
+                           unit='V',
+                           vals=vals.Numbers(0, 100),
+                           get_cmd=partial(parent._get_ao, 'DC', channel),
+                           set_cmd=partial(parent._set_ao, 'DC', channel))
+
+        self.add_parameter('Freq',
+                           label=f'{name} Frequency',
+                           unit='Hz',
+                           vals=vals.Numbers(0, 100),
+                           get_cmd=partial(parent._get_ao, 'Freq', channel),
+                           set_cmd=partial(parent._set_ao, 'Freq', channel))
+
+        self.add_parameter('Phase',
+                           label=f'{name} Phase',
+                           unit='deg',
+                           vals=vals.Numbers(0, 100),
+                           get_cmd=partial(parent._get_ao, 'Phase', channel),
+                           set_cmd=partial(parent._set_ao, 'Phase', channel))
+
+        self.add_parameter('Function',
+                           label=f'{name} Function',
+                           unit='',
+                           vals=vals.Enum('Sine', 'Square', 'Triangle'),
+                           get_cmd=partial(parent._get_ao, 'Function', channel),
+                           set_cmd=partial(parent._set_ao, 'Function', channel))
+
+        for measurement in MEASUREMENTS:
+            self.add_parameter(measurement,
+                               label=f'{name} {measurement}',
+                               unit='deg' if measurement == 'Theta' else 'V',
+                               get_cmd=partial(parent._get_lockin, measurement, channel))
+
+        for measurement in ('AO', *SWEEP_MEASUREMENTS):
+            self.add_parameter(f'{measurement}_sweep',
+                               label=f'{name} {measurement}',
+                               unit='V',
+                               parameter_class=ParameterWithSetpoints,
+                               setpoints=(parent.sweep_setpoints,),
+                               vals=vals.Arrays(shape=(parent.sweep_npts.get_latest,)),
+                               get_cmd=partial(parent._get_buffered, measurement, channel,
+                                               f'{name}_{measurement}_sweep'),
+                               set_cmd=False)
+
 
 class MCLockin(ZMQInstrument):
     """
@@ -26,9 +211,16 @@ class MCLockin(ZMQInstrument):
             E.g. 'tcp://localhost:29170' for the MC Lock-in
         config: A dictionary of the channel configuration parameters for the lock-in
             E.g. {'Ip': 1, 'Im': 2, 'Vp': 3, 'Vm': 4}
+        lazy_channels: Create the LockinChannel of a label only when it is first
+            used, so channels that are never touched stay out of the snapshot.
+            False creates all of them up front. Default True.
     """
 
-    def __init__(self, name: str, address: str, config:dict, **kwargs: Any) -> None:
+    # Request that returns the source settings of all AO channels
+    _ao_config_cmd: ClassVar[str] = 'getAOConfig'
+
+    def __init__(self, name: str, address: str, config:dict, lazy_channels: bool = True,
+                 **kwargs: Any) -> None:
         super().__init__(name=name, address=address,**kwargs)
         if config is None:
             config = self._get_config_from_gui()
@@ -40,66 +232,226 @@ class MCLockin(ZMQInstrument):
         # self.drain_measurement = 'X'
         self._ref_channel = 1
 
-        for label, value in config.items():
-            self.add_parameter(f'{label}_Amp',
-                               label=f'{label} Amplitude',
-                               unit='V',
-                               vals=vals.Numbers(0, 100),
-                               get_cmd=self._dump,
-                               set_cmd=partial(self._set_amplitude, config[label]))
-            
-            self.add_parameter(f'{label}_DC',
-                               label=f'{label} DC',
-                               unit='V',
-                               vals=vals.Numbers(0, 100),
-                               get_cmd=self._dump,
-                               set_cmd=partial(self._set_dc, config[label]))
-            
-            self.add_parameter(f'{label}_Freq',
-                               label=f'{label} Frequency',
-                               unit='Hz',
-                               vals=vals.Numbers(0, 100),
-                               get_cmd=self._dump,
-                               set_cmd=partial(self._set_freq, config[label]))
-            
-            self.add_parameter(f'{label}_Phase',
-                               label=f'{label} Phase',
-                               unit='deg',
-                               vals=vals.Numbers(0, 100),
-                               get_cmd=self._dump,
-                               set_cmd=partial(self._set_phase, config[label]))
-            
-            self.add_parameter(f'{label}_Function',
-                               label=f'{label} Function',
-                               unit='',
-                               vals=vals.Enum('Sine', 'Square', 'Triangle'),
-                               get_cmd=self._dump,
-                               set_cmd=partial(self._set_func, config[label]))
-            
-            Measurements = ['X', 'Y', 'R', 'Theta', 'Mean']
-            for measurement in Measurements:
-                meas_unit = 'deg' if measurement == 'Theta' else 'V'
-                self.add_parameter(f'{label}_{measurement}',
-                                   label=f'{label} {measurement}',
-                                   unit=meas_unit,
-                                   get_cmd=partial(self._get_lockin, measurement, config[label]))
-            
+        # Every result key the getters can ask for, laid out as
+        # (measurement, channel) so one packed array serves all of them
+        self._result_channels = sorted(set(config.values()))
+        self._results_index = ResultsIndex([self._result_key(m, ch)
+                                            for m in MEASUREMENTS
+                                            for ch in self._result_channels])
+        # Last getResults reply, shared by every lock-in getter
+        self._results_snapshot: Optional[np.ndarray] = None
+        self._results_timestamp = 0.0
+
+        self.add_parameter('results_max_age',
+                           label='Results Max Age',
+                           unit='s',
+                           initial_value=0,
+                           vals=vals.MultiType(vals.Numbers(min_value=0), vals.Enum(None)),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='How long a getResults snapshot is reused by the '
+                                     'lock-in getters. 0 fetches on every read, None '
+                                     'holds the snapshot until invalidate_results().')
+
+        self.add_parameter('results', parameter_class=LockinResults)
+
+        # Amp/DC/Freq/Phase/Function of the channels are cached client side,
+        # seeded from one AO config read and updated by every set
+        self._ao_cache: dict[tuple[int, str], Any] = {}
+        self._ao_cache_seeded = False
+        # False once the server answered the AO config read with an error
+        self._ao_config_supported = True
+
+        self.add_parameter('ao_skip_unchanged',
+                           label='Skip Unchanged AO Sets',
+                           initial_value=True,
+                           vals=vals.Bool(),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='Do not send setAO_* commands for values the '
+                                     'AO cache already holds.')
+
+        self.add_parameter('ao_tolerance',
+                           label='AO Tolerance',
+                           initial_value=1e-9,
+                           vals=vals.Numbers(min_value=0),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='Largest difference to the cached AO value '
+                                     'that still counts as unchanged.')
+
+        # Buffered hardware sweep: the lock-in sweeps sweep_channel (and any
+        # sweep_extra_channels) on its own and the {AO,X,Y}_sweep parameters
+        # of the channels return the recorded waveforms, resampled to sweep_npts
+        # points, so dond only loops the slow axes.
+        self._sweep_data: Optional[dict] = None
+        self._sweep_npts_acquired = 0
+        self._sweep_consumers: set[str] = set()
+
+        self.add_parameter('sweep_channel',
+                           label='Sweep AO Channel',
+                           vals=vals.Ints(min_value=1),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('sweep_start',
+                           label='Sweep Start',
+                           unit='V',
+                           initial_value=0,
+                           vals=vals.Numbers(),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('sweep_stop',
+                           label='Sweep Stop',
+                           unit='V',
+                           initial_value=0,
+                           vals=vals.Numbers(),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('sweep_time',
+                           label='Sweep Time',
+                           unit='s',
+                           initial_value=1,
+                           vals=vals.Numbers(min_value=0),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('sweep_pattern',
+                           label='Sweep Pattern',
+                           initial_value='Ramp /',
+                           vals=vals.Strings(),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('sweep_table',
+                           label='Sweep Table',
+                           unit='V',
+                           initial_value=np.array([]),
+                           vals=vals.Arrays(),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='Setpoints of sweep_channel for table patterns.')
+
+        self.add_parameter('sweep_extra_channels',
+                           label='Extra Swept Channels',
+                           initial_value=[],
+                           vals=vals.Lists(vals.Dict()),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='Further AO channels swept together with '
+                                     'sweep_channel, as dicts with the keys of set_sweep.')
+
+        self.add_parameter('sweep_initial_wait',
+                           label='Sweep Initial Wait',
+                           unit='s',
+                           initial_value=1,
+                           vals=vals.Numbers(min_value=0),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('sweep_return_to_start',
+                           label='Sweep Return to Start',
+                           initial_value=False,
+                           vals=vals.Bool(),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('sweep_timeout',
+                           label='Sweep Timeout',
+                           unit='s',
+                           initial_value=30,
+                           vals=vals.Numbers(min_value=0),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='How long past its expected end a sweep may run '
+                                     'before waiting for it raises TimeoutError.')
+
+        self.add_parameter('sweep_poll_interval',
+                           label='Sweep Poll Interval',
+                           unit='s',
+                           initial_value=(0.02, 0.5),
+                           vals=vals.Sequence(vals.Numbers(min_value=0), length=2),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='First and longest interval between status polls '
+                                     'once a sweep is due to end.')
+
+        self.add_parameter('sweep_npts',
+                           label='Sweep Points',
+                           initial_value=101,
+                           vals=vals.Ints(min_value=1),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('sweep_setpoints',
+                           label='Sweep AO',
+                           unit='V',
+                           vals=vals.Arrays(shape=(self.sweep_npts.get_latest,)),
+                           get_cmd=self._get_sweep_setpoints,
+                           set_cmd=False)
+
         self.add_parameter('state',
                             label='Lockin State',
                             unit='',
                             vals=vals.Enum('start', 'start sweep', 'stop'),
                             get_cmd=self._get_state,
                             set_cmd=self._set_state)
-            
+
+        if not lazy_channels:
+            for label in config:
+                self.channel(label)
+
         # self.print_readable_snapshot(update=True)
         self.connect_message()
 
+    def channel(self, label: str) -> 'LockinChannel':
+        '''
+        Returns the LockinChannel of a config label, creating it on first use.
+        '''
+        if label not in self.submodules:
+            if label not in self.config:
+                raise KeyError(f'{label} is not in the lock-in config')
+            self.add_submodule(label, LockinChannel(self, label, self.config[label]))
+        return cast(LockinChannel, self.submodules[label])
+
+    def __getattr__(self, key: str) -> Any:
+        try:
+            return super().__getattr__(key)
+        except AttributeError:
+            # lockin.drain and lockin.drain_X create the drain channel on first
+            # access; the parameter is then cached as a plain attribute
+            config = self.__dict__.get('config')
+            if config is None:
+                raise
+            if key in config:
+                return self.channel(key)
+            for label in config:
+                name = key[len(label) + 1:]
+                if key.startswith(f'{label}_') and name in CHANNEL_PARAMETERS:
+                    parameter = self.channel(label).parameters[name]
+                    self.__dict__[key] = parameter
+                    return parameter
+            raise
+
+    def __dir__(self) -> list:
+        names = set(super().__dir__())
+        for label in self.config:
+            names.add(label)
+            names.update(f'{label}_{name}' for name in CHANNEL_PARAMETERS)
+        return sorted(names)
+
     def _get_config_from_gui(self) -> Dict[str, int]:
         """
         Opens a GUI to prompt the user for channel configuration.
         Returns:
             config (dict): A dictionary with labels as keys and lead numbers as values.
         """
+        # Imported here so headless nodes can load the driver without Tk
+        import tkinter as tk
+        from tkinter import messagebox
+
         config = {}
 
         # Create the tkinter root window
@@ -184,39 +536,145 @@ class MCLockin(ZMQInstrument):
             "serial": None,
             "firmware": "v2.15.4.4",
         }
-    def _dump(self):
-        pass
+    def read_ao_config(self) -> dict[tuple[int, str], Any]:
+        '''
+        Reads the source settings of all AO channels in one request and seeds
+        the AO cache with them.
 
-    def _set_amplitude(self, channel: int, value: float) -> None:
-        param = {'AO Channel': channel, 'Amplitude (V)': value}
-        self._send_command('setAO_Amplitude', param)
+        The reply is expected to hold one dict per AO channel, keyed like the
+        setAO_* params, e.g. {'AO Channel': 1, 'Amplitude (V)': 0.1, ...}.
+        A server that answers with an error, e.g. one without the command, is
+        not asked again by the AO getters and setters.
+        '''
+        response = self._send_command(self._ao_config_cmd)
+        if 'error' in response:
+            self._ao_config_supported = False
+            raise RuntimeError(f"{self._ao_config_cmd} failed: {response['error']}")
+        channels = response['result']
+        if isinstance(channels, dict):
+            # Unwrap a LabVIEW style {'AO Config': [...]} cluster
+            channels = next(iter(channels.values()))
+        for entry in channels:
+            channel = int(entry['AO Channel'])
+            for setting, (_, key) in AO_SETTINGS.items():
+                if key in entry:
+                    self._ao_cache[channel, setting] = entry[key]
+        self._ao_cache_seeded = True
+        return dict(self._ao_cache)
 
-    def _set_dc(self, channel: int, value: float) -> None:
-        param = {'AO Channel': channel, 'DC (V)': value}
-        self._send_command('setAO_DC', param)
+    def invalidate_ao_cache(self) -> None:
+        '''
+        Forgets the cached AO settings, e.g. after changing them on the
+        lock-in front panel. The next AO get or set reads them again.
+        '''
+        self._ao_cache.clear()
+        self._ao_cache_seeded = False
 
-    def _set_freq(self, channel: int, value: float) -> None:
-        param = {'AO Channel': channel, 'Frequency (Hz)': value}
-        self._send_command('setAO_Frequency', param)
+    def _seed_ao_cache(self) -> None:
+        if self._ao_cache_seeded or not self._ao_config_supported:
+            return
+        try:
+            self.read_ao_config()
+        except Exception as e:
+            # Older servers without the command: fall back to write-through only
+            self.log.warning('Could not read the AO config with %s: %s', self._ao_config_cmd, e)
+            self._ao_cache_seeded = True
 
-    def _set_phase(self, channel: int, value: float) -> None:
-        param = {'AO Channel': channel, 'Phase (deg)': value}
-        self._send_command('setAO_Phase', param)
+    def _get_ao(self, setting: str, channel: int) -> Any:
+        self._seed_ao_cache()
+        return self._ao_cache.get((channel, setting))
 
-    def _set_func(self, channel: int, value: str) -> None:
-        param = {'AO Channel': channel, 'Function': value}
-        self._send_command('setAO_Function', param)
+    def _set_ao(self, setting: str, channel: int, value: Any) -> None:
+        # Inside batch() requests only queue, so the config read has to wait
+        if getattr(self._batch, 'commands', None) is None:
+            self._seed_ao_cache()
+        cached = self._ao_cache.get((channel, setting), _UNKNOWN)
+        if self.ao_skip_unchanged() and _same_setting(cached, value, self.ao_tolerance()):
+            return
+        command, key = AO_SETTINGS[setting]
+        try:
+            response = self._send_command(command, {'AO Channel': channel, key: value})
+        except BaseException:
+            # The set may or may not have reached the lock-in
+            self.invalidate_ao_cache()
+            raise
+        if isinstance(response, Future):
+            # Queued by batch(): cached once the batch reply arrives
+            response.add_done_callback(partial(self._cache_ao, channel, setting, value))
+        else:
+            self._cache_ao(channel, setting, value, response)
+
+    def _cache_ao(self, channel: int, setting: str, value: Any, response: Any) -> None:
+        '''
+        Caches an AO setting once the lock-in has acknowledged it. A cancelled
+        batch leaves the cache alone; a failed or rejected set invalidates it,
+        so the next get or set reads the config from the lock-in.
+        '''
+        if isinstance(response, Future):
+            if response.cancelled():
+                return
+            if response.exception() is not None:
+                self.invalidate_ao_cache()
+                return
+            response = response.result()
+        if isinstance(response, dict) and 'error' in response:
+            self.log.warning('%s of AO%s rejected: %s', AO_SETTINGS[setting][0], channel,
+                             response['error'])
+            self.invalidate_ao_cache()
+            return
+        self._ao_cache[channel, setting] = value
     
-    def _get_lockin(self, value: str, channel: int) -> float:
-        key = f"AI{channel}.Ref{self._ref_channel}.{value}"
+    def acquire_results(self) -> np.ndarray:
+        '''
+        Fetches a fresh getResults snapshot and stores it for the lock-in getters.
+
+        The snapshot is a (measurement, channel) array ordered like MEASUREMENTS
+        and the sorted AI channels of the config, NaN for keys the server did
+        not report.
+
+        With results_max_age set to None, call this (or invalidate_results) once
+        per setpoint, e.g. as a post_action of the dond sweep, so that every
+        X/Y/R/Theta/Mean getter of that step shares one round trip.
+        '''
         response = self._send_command('getResults')
         results = response['result']['Results (Dictionary)']
-        results_dict = {item['key']: item['value'] for item in results}
-        return results_dict.get(key)
+        values = self._results_index.values(results)
+        self._results_snapshot = values.reshape(len(MEASUREMENTS), -1)
+        self._results_timestamp = time.monotonic()
+        return self._results_snapshot
+
+    def invalidate_results(self) -> None:
+        '''
+        Drops the stored getResults snapshot so the next getter fetches a new one.
+        '''
+        self._results_snapshot = None
+
+    def _get_results(self) -> np.ndarray:
+        snapshot = self._results_snapshot
+        if snapshot is not None:
+            max_age = self.results_max_age()
+            if max_age is None or time.monotonic() - self._results_timestamp < max_age:
+                return snapshot
+        return self.acquire_results()
+
+    def _result_key(self, value: str, channel: int) -> str:
+        return f"AI{channel}.Ref{self._ref_channel}.{value}"
+
+    def _get_lockin(self, value: str, channel: int) -> Optional[float]:
+        results = self._get_results()
+        # None, not NaN, for a key the server did not report
+        if not self._results_index.found(self._result_key(value, channel)):
+            return None
+        return float(results[MEASUREMENTS.index(value),
+                             self._result_channels.index(channel)])
     
     def _set_state(self, value: str) -> None:
         param = value
         self._send_command('setState', param)
+        self.invalidate_results()
+        if value == 'start sweep':
+            # The sweep moves the DC of the swept channels
+            self.invalidate_ao_cache()
     
     def _get_state(self) -> str:
         response = self._send_command('getStatus')
@@ -227,53 +685,355 @@ class MCLockin(ZMQInstrument):
         self._send_command('setSweepTime', param)
     
     def getsweep(self):
-        response = self._send_command('getSweepWaveforms')
+        response = self._send_command('getSweepWaveforms', binary=True)
         return response['result']
 
     def _set_sweepconfig(self, channel: int, start: float, stop: float, sweep_time: float) -> None:
         '''
-        Sets the sweep configuration for the lock-in
-        Currently only supports one channel
+        Sets a single channel ramp as the sweep configuration for the lock-in
         Args:
             channel: The channel to set the sweep configuration for
             start: The start time of the sweep
             stop: The stop time of the sweep
             sweep_time: The time of the sweep
-            pattern: The pattern of the sweep
         '''
-        param = {"Sweep Time (s)":sweep_time,
-                 "Initial Wait (s)":1,
-                 "Return to Start":False,
-                 "Channels":[{"Enable?":True,
-                              "Channel":channel,
-                              "Start":start,
-                              "End":stop,
-                              "Pattern": "Ramp /",
-                              "Table":[]}]}      
-        self._send_command('setSweep', param)
+        self._send_command('setSweep', self._sweepconfig(channel, start, stop, sweep_time))
+
+    def set_sweep(self, channels: Sequence[Dict[str, Any]], sweep_time: float,
+                  initial_wait: float = 1, return_to_start: bool = False) -> None:
+        '''
+        Sets the sweep configuration for the lock-in, sweeping any number of AO
+        channels at once
+
+        The configuration is kept in the sweep_* parameters: the first
+        channel becomes sweep_channel/sweep_start/sweep_stop/sweep_pattern/
+        sweep_table, the others sweep_extra_channels. acquire_sweep() and
+        the buffered {label}_X_sweep parameters run it. sweep_setpoints
+        records the waveform of the first channel only. The waveforms of the
+        others are not added to a dataset on their own; pass
+        swept_ao_parameters() to the measurement next to the buffered
+        parameters to record them, e.g.
+            lockin.set_sweep([{'channel': 2, 'start': 0, 'end': 1},
+                              {'channel': 3, 'start': 1, 'end': 0}], 10)
+            dond(LinSweep(ppms.field_target, 0, 1, 11),
+                 lockin.drain_X_sweep, *lockin.swept_ao_parameters())
+
+        It is also sent to the lock-in right away, so state('start sweep')
+        runs it as well.
+        Args:
+            channels: One dict per swept channel with the keys
+                channel: The AO channel
+                start, end: The first and last value of the pattern
+                pattern: The sweep pattern as named by the lock-in. Default 'Ramp /'
+                table: Setpoints (e.g. a NumPy array) for table patterns
+            sweep_time: The time of the sweep
+            initial_wait: Seconds to wait at the start values before sweeping
+            return_to_start: Whether the channels go back to their start values
+        '''
+        if not channels:
+            raise ValueError('set_sweep needs at least one channel')
+        primary, *extra = channels
+        self.sweep_channel(int(primary['channel']))
+        self.sweep_start(primary.get('start', 0))
+        self.sweep_stop(primary.get('end', 0))
+        self.sweep_pattern(primary.get('pattern', 'Ramp /'))
+        self.sweep_table(np.asarray(primary.get('table', ()), dtype=float))
+        self.sweep_extra_channels([dict(channel) for channel in extra])
+        self.sweep_time(sweep_time)
+        self.sweep_initial_wait(initial_wait)
+        self.sweep_return_to_start(return_to_start)
+        self._send_command('setSweep', self._configured_sweep())
+
+    @staticmethod
+    def _sweep_params(channels: Sequence[Dict[str, Any]], sweep_time: float,
+                      initial_wait: float = 1, return_to_start: bool = False) -> dict:
+        return {"Sweep Time (s)":sweep_time,
+                "Initial Wait (s)":initial_wait,
+                "Return to Start":return_to_start,
+                "Channels":[{"Enable?":True,
+                             "Channel":int(channel['channel']),
+                             "Start":channel.get('start', 0),
+                             "End":channel.get('end', 0),
+                             "Pattern": channel.get('pattern', "Ramp /"),
+                             "Table":np.asarray(channel.get('table', ()), dtype=float).tolist()}
+                            for channel in channels]}
+
+    @classmethod
+    def _sweepconfig(cls, channel: int, start: float, stop: float, sweep_time: float) -> dict:
+        return cls._sweep_params([{'channel': channel, 'start': start, 'end': stop}], sweep_time)
+
+    def _configured_sweep(self) -> dict:
+        channel = self.sweep_channel()
+        if channel is None:
+            raise ValueError('Set sweep_channel before acquiring a buffered sweep')
+        primary = {'channel': channel,
+                   'start': self.sweep_start(),
+                   'end': self.sweep_stop(),
+                   'pattern': self.sweep_pattern(),
+                   'table': self.sweep_table()}
+        return self._sweep_params([primary, *self.sweep_extra_channels()],
+                                  self.sweep_time(),
+                                  self.sweep_initial_wait(),
+                                  self.sweep_return_to_start())
+
+    def swept_ao_parameters(self) -> list:
+        '''
+        Returns the AO_sweep parameters of the extra swept channels,
+        to be measured next to the buffered X/Y parameters so the waveform of
+        every swept channel ends up in the dataset. The first swept channel
+        is already recorded as sweep_setpoints.
+
+        This is manual: the buffered parameters only have sweep_setpoints
+        as setpoints, so dond records the extra waveforms only when these are
+        passed to it, e.g. *lockin.swept_ao_parameters().
+        Raises ValueError if an extra swept channel has no label in the
+        config, as it then has no AO_sweep parameter to record it with.
+        '''
+        labels = {value: label for label, value in self.config.items()}
+        parameters = []
+        for channel in self.sweep_extra_channels():
+            label = labels.get(int(channel['channel']))
+            if label is None:
+                raise ValueError(f"Swept AO channel {channel['channel']} has no label in "
+                                 f"the lock-in config, so it can't be recorded")
+            parameters.append(self.channel(label).AO_sweep)
+        return parameters
 
     def sweep_realtime(self):
         pass
 
     def sweep1d(self, sweep_channel, start, stop, duration, measure_channel):
-        if self.state() == 'sweeping':
+        return self.sweep1d_async(sweep_channel, start, stop, duration, measure_channel).result()
+
+    def sweep1d_async(self, sweep_channel: int, start: float, stop: float, duration: float,
+                      measure_channel: int,
+                      on_chunk: Optional[Callable[[np.ndarray, np.ndarray], None]] = None,
+                      chunk_interval: Optional[float] = None) -> 'SweepHandle':
+        '''
+        Starts a hardware sweep and returns its handle without waiting for it.
+
+        The sweep runs in the instrument's background worker, so PPMS moves or
+        data saving can go on meanwhile. The handle's result is the (x, y)
+        waveform pair, fetched with a single getSweepWaveforms call at the end.
+        Args:
+            sweep_channel: The AO channel to sweep
+            start: The start value of the sweep
+            stop: The stop value of the sweep
+            duration: The time of the sweep
+            measure_channel: The AI channel whose X waveform is returned
+            on_chunk: Called with the (x, y) points that are new since the
+                last call, while the sweep runs and once more at the end
+            chunk_interval: Seconds between waveform polls for on_chunk.
+                The server can't send only the new points, so every poll
+                downloads the whole waveforms recorded so far: a sweep of n
+                points polled k times moves about k*n/2 points, which grows
+                with the square of the sweep length. Keep it coarse and use
+                it for live views only. None sends everything at the end.
+        '''
+        def select(wfm: dict) -> tuple[np.ndarray, np.ndarray]:
+            return (np.asarray(wfm['AO_wfm'][sweep_channel - 1]['Y'], dtype=float),
+                    np.asarray(wfm['X_wfm'][measure_channel - 1]['Y'], dtype=float))
+
+        return self._start_sweep(self._sweepconfig(sweep_channel, start, stop, duration),
+                                 select, on_chunk, chunk_interval)
+
+    def _start_sweep(self, config: dict, select: Callable[[dict], Any],
+                     on_chunk: Optional[Callable[..., None]] = None,
+                     chunk_interval: Optional[float] = None) -> 'SweepHandle':
+        state = self.state()
+        if state == 'sweeping':
             raise Exception('Request Denied! Already sweeping')    
-        elif self.state() == 'idle':
+        elif state == 'idle':
             self.state('start')   
-        # TODO: The state check should be happening with another function
-        self._set_sweepconfig(sweep_channel, start, stop, duration)
-        time.sleep(1)
-        self.state('start sweep')
-        # *wait for the sweep time since it'll anyway take that long (saves processor resources)
-        time.sleep(duration) 
-
-        while self.state() == 'sweeping':
-            time.sleep(0.5)
-        # should have some check here to see if the sweep is done and error handling
-        x = self.getsweep()['AO_wfm'][sweep_channel - 1]['Y']
-        y = self.getsweep()['X_wfm'][measure_channel - 1]['Y']
+        handle = SweepHandle()
+        self._submit(self._run_sweep, handle, config, select, on_chunk, chunk_interval)
+        return handle
+
+    def _run_sweep(self, handle: 'SweepHandle', config: dict, select: Callable[[dict], Any],
+                   on_chunk: Optional[Callable[..., None]],
+                   chunk_interval: Optional[float]) -> None:
+        if not handle.set_running_or_notify_cancel():
+            return
+        try:
+            sent = 0
+
+            def waveforms() -> Any:
+                nonlocal sent
+                selected = select(self.getsweep())
+                if on_chunk is not None:
+                    n = min(len(wave) for wave in selected)
+                    if n > sent:
+                        on_chunk(*(wave[sent:n] for wave in selected))
+                        sent = n
+                return selected
+
+            self._send_command('setSweep', config)
+            self.state('start sweep')
+            waiter = self._sweep_waiter(config)
+            streaming = on_chunk is not None and chunk_interval
+            wait = chunk_interval if streaming else waiter.update(None)
+            while wait is not None:
+                time.sleep(wait)
+                if streaming:
+                    waveforms()
+                wait = waiter.update(self._get_state())
+                if streaming and wait is not None:
+                    wait = chunk_interval
+            handle.set_result(waveforms())
+        except BaseException as e:
+            handle.set_exception(e)
+
+    def _sweep_waiter(self, config: dict) -> 'SweepWaiter':
+        min_interval, max_interval = self.sweep_poll_interval()
+        return SweepWaiter(config["Initial Wait (s)"] + config["Sweep Time (s)"],
+                           self.sweep_timeout(), min_interval, max_interval)
+
+    def _get_sweep_setpoints(self) -> np.ndarray:
+        if self._sweep_data is None:
+            # Nothing recorded yet, return the planned values
+            table = np.asarray(self.sweep_table(), dtype=float)
+            if len(table):
+                return _resample(table, self.sweep_npts())
+            return np.linspace(self.sweep_start(), self.sweep_stop(), self.sweep_npts())
+        return self._sweep_waveform('AO', self.sweep_channel())
+
+    def _get_buffered(self, value: str, channel: int, consumer: str) -> np.ndarray:
+        # Every buffered parameter reads each sweep once: the first parameter
+        # that asks again starts the sweep of the next setpoint.
+        if self._sweep_data is None or consumer in self._sweep_consumers:
+            self.acquire_sweep()
+        self._sweep_consumers.add(consumer)
+        return self._sweep_waveform(value, channel)
+
+    def acquire_sweep(self) -> None:
+        '''
+        Runs the sweep configured by the sweep_* parameters and stores its
+        waveforms for the buffered sweep parameters. They call it themselves,
+        once per setpoint of the outer loops.
+        '''
+        handle = self._start_sweep(self._configured_sweep(), lambda wfm: wfm)
+        self._sweep_data = handle.result()
+        self._sweep_npts_acquired = self.sweep_npts()
+        self._sweep_consumers = set()
+
+    def _sweep_waveform(self, value: str, channel: int) -> np.ndarray:
+        wave = np.asarray(self._sweep_data[f'{value}_wfm'][channel - 1]['Y'], dtype=float)
+        return _resample(wave, self._sweep_npts_acquired)
+
+
+_UNKNOWN = object()
+
+
+def _same_setting(cached: Any, value: Any, tolerance: float) -> bool:
+    if cached is _UNKNOWN or cached is None:
+        return False
+    if isinstance(value, str) or isinstance(cached, str):
+        return cached == value
+    return abs(cached - value) <= tolerance
+
+
+def _resample(wave: np.ndarray, npts: int) -> np.ndarray:
+    """
+    Resamples a waveform to npts points evenly spread over its samples.
+    """
+    if len(wave) == npts:
+        return wave
+    if len(wave) == 0:
+        return np.full(npts, np.nan)
+    return np.interp(np.linspace(0, len(wave) - 1, npts), np.arange(len(wave)), wave)
+
+
+class SweepWaiter:
+    """
+    Schedules the getStatus polls that wait for a sweep to finish.
+
+    Nothing is polled before the expected end of the sweep, so a state that
+    has not switched to 'sweeping' yet is never mistaken for a finished
+    sweep. After that the poll interval starts short and doubles up to
+    max_interval. A sweep still running timeout seconds after its expected
+    end raises TimeoutError, an error state reported by the lock-in raises
+    RuntimeError.
+
+    Args:
+        expected: Seconds the sweep should take, including the initial wait.
+        timeout: Seconds past the expected end before giving up.
+        min_interval: First poll interval after the expected end, in s.
+        max_interval: Longest poll interval, in s.
+    """
+
+    def __init__(self, expected: float, timeout: float,
+                 min_interval: float = 0.02, max_interval: float = 0.5) -> None:
+        self.end = time.monotonic() + expected
+        self.deadline = self.end + timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._interval = min_interval
+
+    def update(self, state: Optional[str]) -> Optional[float]:
+        """
+        Takes the lock-in state (None before the first poll) and returns the
+        seconds to wait before the next poll, or None once the sweep is done.
+        """
+        now = time.monotonic()
+        if isinstance(state, str) and 'error' in state.lower():
+            raise RuntimeError(f'Lock-in reported {state!r} during the sweep')
+        if now < self.end:
+            return max(self.end - now, self.min_interval)
+        if state is not None and state != 'sweeping':
+            return None
+        if now >= self.deadline:
+            raise TimeoutError(f'Sweep still running {now - self.end:.1f} s after its '
+                               f'expected end')
+        wait = min(self._interval, self.deadline - now)
+        self._interval = min(self._interval * 2, self.max_interval)
+        return wait
+
+
+class SweepHandle(Future):
+    """
+    Future of a sweep started with MCLockin.sweep1d_async.
+
+    Its result is the (x, y) pair of waveform arrays. Besides the usual
+    concurrent.futures API it can be awaited directly from asyncio code.
+    """
+
+    def __await__(self):
+        return asyncio.wrap_future(self).__await__()
+
+
+class AsyncMCLockin(MCLockin, AsyncZMQInstrument):
+    """
+    MCLockin with coroutine versions of its sweeps, for use from one asyncio
+    event loop together with other async instruments. The QCoDeS parameters
+    keep working as in MCLockin.
+    """
+
+    async def asweep1d(self, sweep_channel: int, start: float, stop: float, duration: float,
+                       measure_channel: int) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Coroutine version of sweep1d; waits with asyncio.sleep instead of blocking.
+        '''
+        state = (await self.send_command('getStatus'))['result']
+        if state == 'sweeping':
+            raise Exception('Request Denied! Already sweeping')
+        elif state == 'idle':
+            await self.send_command('setState', 'start')
+        config = self._sweepconfig(sweep_channel, start, stop, duration)
+        await self.send_command('setSweep', config)
+        await self.send_command('setState', 'start sweep')
+        self.invalidate_results()
+        self.invalidate_ao_cache()
+        waiter = self._sweep_waiter(config)
+        wait = waiter.update(None)
+        while wait is not None:
+            await asyncio.sleep(wait)
+            wait = waiter.update((await self.send_command('getStatus'))['result'])
+        wfm = (await self.send_command('getSweepWaveforms', binary=True))['result']
+        x = np.asarray(wfm['AO_wfm'][sweep_channel - 1]['Y'], dtype=float)
+        y = np.asarray(wfm['X_wfm'][measure_channel - 1]['Y'], dtype=float)
         return x, y
 
+
 if __name__ == '__main__':
     """
     Test the Lockin class
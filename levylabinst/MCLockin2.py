@@ -1,14 +1,6 @@
-import json
-import warnings
-from functools import partial
-from time import sleep
-from typing import Any, Callable, ClassVar, Literal, Optional, Union, cast
-import zmq
-import numpy as np
+from typing import Any, Optional
 from .ZMQInstrument import ZMQInstrument
-import qcodes.validators as vals
-from qcodes.utils import DelayedKeyboardInterrupt
-import time
+from .MCLockin import ResultsIndex
 
 class MCLockin2(ZMQInstrument):
     """
@@ -30,6 +22,8 @@ class MCLockin2(ZMQInstrument):
         self.drain_channel = 1
         self.drain_ref = 1
         self.drain_measurement = 'X'
+        self._drain_index: Optional[ResultsIndex] = None
+        self._drain_source: Optional[tuple] = None
 
         # We can probably configure the lockin at the class instantiation
         # define I+ and I- channels etc.
@@ -76,12 +70,18 @@ class MCLockin2(ZMQInstrument):
         self._send_command('DC (V)', param)    
 
     def _drain_getter(self):
-        key = f"AI{self.drain_channel}.Mean" if self.drain_measurement == 'Mean' else f"AI{self.drain_channel}.Ref{self.drain_ref}.{self.drain_measurement}"
+        source = (self.drain_channel, self.drain_ref, self.drain_measurement)
+        if source != self._drain_source:
+            # The key is only formatted again when the drain selection changes
+            key = f"AI{self.drain_channel}.Mean" if self.drain_measurement == 'Mean' else f"AI{self.drain_channel}.Ref{self.drain_ref}.{self.drain_measurement}"
+            self._drain_index = ResultsIndex([key])
+            self._drain_source = source
 
         response = self._send_command('getResults')
         results = response['result']['Results (Dictionary)']
-        results_dict = {item['key']: item['value'] for item in results}
-        return results_dict.get(key)
+        value = self._drain_index.values(results)[0]
+        # None, not NaN, for a key the server did not report
+        return float(value) if self._drain_index.found(self._drain_index.keys[0]) else None
 
     def _drain_setter(self, value) -> None:
         pass
@@ -0,0 +1,252 @@
+"""Request metrics of ZMQInstrument: latency histograms, traffic and error counts."""
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterable, Sequence
+
+log = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from sub-millisecond local replies up to slow sweeps
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CODEC_BUCKETS = (1e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 0.1, 1.0)
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+class Histogram:
+    """
+    Counts of observations per bucket, plus their sum and maximum.
+
+    Args:
+        buckets: Increasing upper bounds of the buckets. Larger values go
+            to an extra +Inf bucket.
+    """
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """
+        Returns (upper bound, observations up to it) pairs, ending with +Inf.
+        """
+        total = 0
+        pairs = []
+        for bound, count in zip((*map(repr, self.buckets), '+Inf'), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def snapshot(self) -> dict[str, Any]:
+        return {'count': self.count,
+                'sum': self.sum,
+                'mean': self.sum / self.count if self.count else None,
+                'max': self.max,
+                'buckets': dict(self.cumulative())}
+
+
+class Metrics:
+    """
+    Thread-safe counters and histograms of the requests of one instrument.
+
+    ZMQInstrument records into these on every request, so the numbers are
+    always there to look at when a run is slower than expected:
+
+        lockin.metrics.snapshot()['requests']['getResults']['mean']
+
+    Args:
+        instrument: Name used as the instrument label of the exported metrics.
+    """
+
+    def __init__(self, instrument: str = '') -> None:
+        self.instrument = instrument
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Drops everything recorded so far.
+        """
+        with self._lock:
+            self._requests: dict[str, Histogram] = {}
+            self._encode = Histogram(CODEC_BUCKETS)
+            self._decode = Histogram(CODEC_BUCKETS)
+            self._bytes_sent = 0
+            self._bytes_received = 0
+            self._timeouts: dict[str, int] = {}
+            self._retries: dict[str, int] = {}
+
+    def observe_request(self, method: str, seconds: float) -> None:
+        """
+        Records the round trip time of a request.
+        """
+        with self._lock:
+            histogram = self._requests.get(method)
+            if histogram is None:
+                histogram = self._requests[method] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def observe_encode(self, seconds: float, nbytes: int) -> None:
+        """
+        Records the time spent serializing a request of nbytes bytes.
+        """
+        with self._lock:
+            self._encode.observe(seconds)
+            self._bytes_sent += nbytes
+
+    def observe_decode(self, seconds: float, nbytes: int) -> None:
+        """
+        Records the time spent parsing a reply of nbytes bytes.
+        """
+        with self._lock:
+            self._decode.observe(seconds)
+            self._bytes_received += nbytes
+
+    def count_timeout(self, method: str) -> None:
+        with self._lock:
+            self._timeouts[method] = self._timeouts.get(method, 0) + 1
+
+    def count_retry(self, method: str) -> None:
+        with self._lock:
+            self._retries[method] = self._retries.get(method, 0) + 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Returns everything recorded so far as a JSON-compatible dict.
+        """
+        with self._lock:
+            return {'instrument': self.instrument,
+                    'requests': {method: histogram.snapshot()
+                                 for method, histogram in self._requests.items()},
+                    'encode': self._encode.snapshot(),
+                    'decode': self._decode.snapshot(),
+                    'bytes_sent': self._bytes_sent,
+                    'bytes_received': self._bytes_received,
+                    'timeouts': dict(self._timeouts),
+                    'retries': dict(self._retries)}
+
+    def samples(self) -> dict[str, list[tuple[str, dict[str, str], Any]]]:
+        """
+        Returns the OpenMetrics samples as (sample name, labels, value) per family.
+        """
+        labels = {'instrument': self.instrument}
+        with self._lock:
+            families: dict[str, list] = {
+                'levylab_request_seconds': [],
+                'levylab_encode_seconds': _histogram_samples('levylab_encode_seconds',
+                                                             self._encode, labels),
+                'levylab_decode_seconds': _histogram_samples('levylab_decode_seconds',
+                                                             self._decode, labels),
+                'levylab_sent_bytes': [('levylab_sent_bytes_total', labels,
+                                        self._bytes_sent)],
+                'levylab_received_bytes': [('levylab_received_bytes_total', labels,
+                                            self._bytes_received)],
+                'levylab_timeouts': [('levylab_timeouts_total', {**labels, 'method': method},
+                                      count) for method, count in self._timeouts.items()],
+                'levylab_retries': [('levylab_retries_total', {**labels, 'method': method},
+                                     count) for method, count in self._retries.items()],
+            }
+            for method, histogram in self._requests.items():
+                families['levylab_request_seconds'] += _histogram_samples(
+                    'levylab_request_seconds', histogram, {**labels, 'method': method})
+        return families
+
+    def openmetrics(self) -> str:
+        """
+        Returns the metrics in the OpenMetrics text format.
+        """
+        return render_openmetrics([self])
+
+
+_FAMILIES = {
+    'levylab_request_seconds': ('histogram', 'seconds', 'Round trip time of requests.'),
+    'levylab_encode_seconds': ('histogram', 'seconds', 'Time spent serializing requests.'),
+    'levylab_decode_seconds': ('histogram', 'seconds', 'Time spent parsing replies.'),
+    'levylab_sent_bytes': ('counter', 'bytes', 'Bytes of requests sent.'),
+    'levylab_received_bytes': ('counter', 'bytes', 'Bytes of replies received.'),
+    'levylab_timeouts': ('counter', None, 'Requests that got no reply in time.'),
+    'levylab_retries': ('counter', None, 'Requests sent again after a failure.'),
+}
+
+
+def _histogram_samples(name: str, histogram: Histogram,
+                       labels: dict[str, str]) -> list[tuple[str, dict[str, str], Any]]:
+    samples = [(f'{name}_bucket', {**labels, 'le': bound}, count)
+               for bound, count in histogram.cumulative()]
+    samples.append((f'{name}_count', labels, histogram.count))
+    samples.append((f'{name}_sum', labels, histogram.sum))
+    return samples
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_openmetrics(metrics: Iterable[Metrics]) -> str:
+    """
+    Renders the metrics of several instruments as one OpenMetrics exposition.
+    """
+    families: dict[str, list] = {name: [] for name in _FAMILIES}
+    for instrument_metrics in metrics:
+        for name, samples in instrument_metrics.samples().items():
+            families[name] += samples
+    lines = []
+    for name, (kind, unit, help_text) in _FAMILIES.items():
+        lines.append(f'# TYPE {name} {kind}')
+        if unit is not None:
+            lines.append(f'# UNIT {name} {unit}')
+        lines.append(f'# HELP {name} {help_text}')
+        for sample, labels, value in families[name]:
+            label_text = ','.join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+            lines.append(f'{sample}{{{label_text}}} {value}')
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(metrics: Iterable[Metrics], port: int = 0,
+                  host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """
+    Serves the metrics in the OpenMetrics text format at http://host:port/metrics
+    from a daemon thread, e.g. for Prometheus to scrape.
+
+    Args:
+        metrics: The Metrics to export, e.g. [lockin.metrics, ppms.metrics].
+        port: The port to listen on, a free one if 0.
+        host: The interface to listen on. Default localhost only.
+
+    Returns:
+        The server; server.server_address has the port, server.shutdown() stops it.
+    """
+    exported = list(metrics)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = render_openmetrics(exported).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            log.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics_server', daemon=True).start()
+    return server
@@ -1,14 +1,89 @@
-import json
-import warnings
+import asyncio
+from concurrent.futures import Future
 from functools import partial
-from time import sleep
-from typing import Any, Callable, ClassVar, Literal, Optional, Union, cast
-import zmq
-import numpy as np
+import threading
+from typing import Any, Callable, Literal, Optional, Union
 from .ZMQInstrument import ZMQInstrument
+from .AsyncZMQInstrument import AsyncZMQInstrument
 import qcodes.validators as vals
-from qcodes.utils import DelayedKeyboardInterrupt
 import time
+import zmq
+
+
+class RampSuperseded(RuntimeError):
+    """
+    Raised by the wait for a ramp that was replaced by a new set point of the
+    same quantity before it settled.
+    """
+
+
+class RampMonitor:
+    """
+    Decides when a PPMS ramp has settled and when to take the next reading.
+
+    A ramp has settled once the readings stayed within tolerance of the
+    target for settle_time seconds. Far from the target the next reading is
+    scheduled from the remaining distance and the ramp rate, so polling gets
+    faster as the ramp approaches the target.
+
+    The first reading sets a deadline: the time the ramp needs at its rate
+    from there, plus settle_time and timeout_margin. A reading after the
+    deadline raises TimeoutError, so a target the PPMS never reaches doesn't
+    keep the wait going forever.
+
+    Args:
+        target: The set point.
+        rate: The ramp rate per minute.
+        tolerance: How close to the target counts as reached.
+        settle_time: How long the readings must stay within tolerance, in s.
+        min_interval: Shortest time between readings, in s.
+        max_interval: Longest time between readings, in s.
+        timeout_margin: Time allowed on top of the expected ramp and settle
+            time, in s. None waits without a deadline.
+    """
+
+    def __init__(self, target: float, rate: float, tolerance: float, settle_time: float,
+                 min_interval: float, max_interval: float,
+                 timeout_margin: Optional[float] = None) -> None:
+        self.target = target
+        self.rate = abs(rate) / 60
+        self.tolerance = tolerance
+        self.settle_time = settle_time
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout_margin = timeout_margin
+        self.deadline: Optional[float] = None
+        self._inside_since: Optional[float] = None
+
+    def update(self, value: Optional[float], now: float) -> Optional[float]:
+        """
+        Takes a reading and returns the seconds to wait before the next one,
+        or None once the ramp has settled.
+
+        Raises:
+            TimeoutError: If the ramp hasn't settled by the deadline.
+        """
+        if self.deadline is None and self.timeout_margin is not None and value is not None:
+            distance = abs(value - self.target)
+            ramp_time = distance / self.rate if self.rate else 0
+            self.deadline = now + ramp_time + self.settle_time + self.timeout_margin
+        if self.deadline is not None and now > self.deadline:
+            raise TimeoutError(f'Ramp to {self.target} not settled in time, '
+                               f'last reading {value}')
+        if value is not None and abs(value - self.target) <= self.tolerance:
+            if self._inside_since is None:
+                self._inside_since = now
+            remaining = self.settle_time - (now - self._inside_since)
+            return None if remaining <= 0 else self._clamp(remaining)
+        self._inside_since = None
+        if value is None or not self.rate:
+            return self.max_interval
+        eta = (abs(value - self.target) - self.tolerance) / self.rate
+        return self._clamp(eta / 2)
+
+    def _clamp(self, interval: float) -> float:
+        return min(max(interval, self.min_interval), self.max_interval)
+
 
 class PPMSSim(ZMQInstrument):
     """
@@ -17,15 +92,45 @@ class PPMSSim(ZMQInstrument):
 
     This driver talks to the PPMS Monitor and Control software via ZMQ.
 
+    Setting temperature or field starts the ramp and, with ramp_blocking
+    True (the default), waits until it has settled. ramp_temperature and
+    ramp_field start a ramp and return a future instead, so e.g. the next
+    field ramp can run while the data of the previous point is saved.
+    temperature and field take [set point, rate]; temperature_target and
+    field_target take the set point alone and ramp at temperature_rate and
+    field_rate, so they can be swept with LinSweep in dond.
+    A new set point of the same quantity ends the wait for the previous
+    ramp with RampSuperseded, and a ramp that doesn't settle within
+    distance/rate plus ramp_timeout_margin raises TimeoutError.
+
     Args:
         name: The name used internally by QCoDeS for this driver
         address: The ZMQ server address.
           E.g. 'tcp://localhost:29270' for simulated PPMS
     """
 
+    # Temperature and field ramps are waited for side by side
+    _worker_threads = 2
+
     def __init__(self, name: str, address: str, **kwargs: Any) -> None:
         super().__init__(name=name, address=address, **kwargs)
 
+        self.ramps: dict[str, Future] = {}
+        # Set when the ramp of a quantity is replaced, to end the wait for it
+        self._ramp_superseded: dict[str, threading.Event] = {}
+        # Last reply of each status command with the time it was received
+        self._status_cache: dict[str, tuple[float, dict]] = {}
+
+        self.add_parameter('status_max_age',
+                           label='Status Max Age',
+                           unit='s',
+                           initial_value=0.1,
+                           vals=vals.Numbers(min_value=0),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='How long a Get Temperature/Get Magnet reply is '
+                                     'reused by the parameters read from it. 0 fetches '
+                                     'on every read.')
 
         self.add_parameter('temperature',
                            label='Temperature',
@@ -50,68 +155,306 @@ class PPMSSim(ZMQInstrument):
                            label='Magnet State',
                            get_cmd=partial(self._field_getter, 'Magnet Status'))
 
-        self.print_readable_snapshot(update=True)
+        # Scalar counterparts of temperature and field, e.g. for LinSweep in dond
+        self.add_parameter('temperature_rate',
+                           label='Temperature Rate',
+                           unit='K/min',
+                           initial_value=10,
+                           vals=vals.Numbers(min_value=0),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='Ramp rate used by temperature_target.')
+
+        self.add_parameter('temperature_target',
+                           label='Temperature',
+                           unit='K',
+                           vals=vals.Numbers(),
+                           set_cmd=lambda value: self._temp_setter(
+                               [value, self.temperature_rate()]),
+                           get_cmd=partial(self._temp_getter, 'Temperature (K)'),
+                           docstring='Ramps to the set temperature at temperature_rate.')
+
+        self.add_parameter('field_rate',
+                           label='Field Rate',
+                           unit='T/min',
+                           initial_value=0.1,
+                           vals=vals.Numbers(min_value=0),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='Ramp rate used by field_target.')
+
+        self.add_parameter('field_target',
+                           label='B Field',
+                           unit='T',
+                           vals=vals.Numbers(),
+                           set_cmd=lambda value: self._field_setter([value, self.field_rate()]),
+                           get_cmd=partial(self._field_getter, 'Field (T)'),
+                           docstring='Ramps to the set field at field_rate.')
+
+        self.add_parameter('temperature_tolerance',
+                           label='Temperature Tolerance',
+                           unit='K',
+                           initial_value=0.01,
+                           vals=vals.Numbers(min_value=0),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('field_tolerance',
+                           label='Field Tolerance',
+                           unit='T',
+                           initial_value=1e-4,
+                           vals=vals.Numbers(min_value=0),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('settle_time',
+                           label='Settle Time',
+                           unit='s',
+                           initial_value=0,
+                           vals=vals.Numbers(min_value=0),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='How long a reading must stay within tolerance '
+                                     'before a ramp counts as finished.')
+
+        self.add_parameter('ramp_poll_interval',
+                           label='Ramp Poll Interval',
+                           unit='s',
+                           initial_value=(0.05, 1),
+                           vals=vals.Sequence(vals.Numbers(min_value=0), length=2),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='Shortest and longest time between readings '
+                                     'while waiting for a ramp.')
+
+        self.add_parameter('ramp_timeout_margin',
+                           label='Ramp Timeout Margin',
+                           unit='s',
+                           initial_value=60,
+                           vals=vals.MultiType(vals.Numbers(min_value=0), vals.Enum(None)),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='Time allowed on top of distance/rate and the settle '
+                                     'time before a ramp raises TimeoutError. None waits '
+                                     'without a deadline.')
+
+        self.add_parameter('ramp_blocking',
+                           label='Ramp Blocking',
+                           initial_value=True,
+                           vals=vals.Bool(),
+                           get_cmd=None,
+                           set_cmd=None,
+                           docstring='Whether the temperature and field setters wait '
+                                     'for the ramp to finish.')
+
+        # A dead server costs one timeout here, not one per parameter and retry:
+        # if the first status read fails, the snapshot shows the cached values
+        try:
+            with self.zmq_retries.set_to(0):
+                self._status('Get Temperature')
+        except zmq.Again:
+            self.log.warning('No reply from %s, printing the snapshot without update',
+                             address)
+            self.print_readable_snapshot(update=False)
+        else:
+            self.print_readable_snapshot(update=True)
         self.connect_message()
 
+    def _status(self, cmd: str, max_age: Optional[float] = None) -> dict:
+        """
+        Returns the result of a status command, reusing a reply younger than max_age.
+
+        Args:
+            cmd: The status command, e.g. 'Get Temperature'.
+            max_age: Seconds a cached reply stays valid. status_max_age if None.
+        """
+        if max_age is None:
+            max_age = self.status_max_age()
+        cached = self._status_cache.get(cmd)
+        if cached is not None and time.monotonic() - cached[0] < max_age:
+            return cached[1]
+        result = self._send_command(cmd)['result']
+        self._status_cache[cmd] = (time.monotonic(), result)
+        return result
+
+    def invalidate_status(self, cmd: Optional[str] = None) -> None:
+        """
+        Drops the cached reply of cmd, or of every status command if None.
+        """
+        if cmd is None:
+            self._status_cache.clear()
+        else:
+            self._status_cache.pop(cmd, None)
+
     def _temp_getter(
         self,
         param_name: Literal[
             "Temperature (K)", "Temperature Status",
         ],
+        max_age: Optional[float] = None,
     ) -> Union[int, float]:
-        raw_response = self._send_command('Get Temperature')
-        response = raw_response['result'][param_name]
-        return response
+        return self._status('Get Temperature', max_age)[param_name]
 
     def _temp_setter(
         self,
         temp_params,
     ) -> None:
-        param = {'Temperature (K)': temp_params[0], 
-                 'Rate (K/min)': temp_params[1]}
-        self._send_command('Set Temperature', param)
+        ramp = self.ramp_temperature(temp_params[0], temp_params[1])
         print(f"Setting temperature to {temp_params[0]} K at {temp_params[1]} K/min")
-        # feedback
-        while not self._is_temperature_set(temp_params[0]):
-            sleep(1)
-        print(f"Temperature set to {temp_params[0]} K")
+        if self.ramp_blocking():
+            ramp.result()
+            print(f"Temperature set to {temp_params[0]} K")
 
-    def _is_temperature_set(self, target_temp):
-        current_temp = self._temp_getter('Temperature (K)')
-        if current_temp is not None:
-            return current_temp == target_temp
-        return False
+    def ramp_temperature(self, temperature: float, rate: float) -> Future:
+        """
+        Starts a temperature ramp and returns a future of its settled reading.
+
+        Args:
+            temperature: The target temperature in K.
+            rate: The ramp rate in K/min.
+        """
+        param = {'Temperature (K)': temperature, 
+                 'Rate (K/min)': rate}
+        superseded = self._supersede_ramp('temperature')
+        self._send_command('Set Temperature', param)
+        self.invalidate_status('Get Temperature')
+        monitor = self._ramp_monitor(temperature, rate, self.temperature_tolerance())
+        ramp = self._submit(self._wait_for_ramp, partial(self._temp_getter, 'Temperature (K)', 0),
+                            monitor, superseded)
+        self.ramps['temperature'] = ramp
+        return ramp
 
     def _field_getter(
         self,
         param_name: Literal[
             "Field (T)", "Magnet Status",
         ],
+        max_age: Optional[float] = None,
     ) -> Union[int, float]:
-        raw_response = self._send_command('Get Magnet')
-        response = raw_response['result'][param_name]
-        return response
+        return self._status('Get Magnet', max_age)[param_name]
 
     def _field_setter(
         self,
         field_params,
     ) -> None:
-        param = {'Field (T)': field_params[0], 
-                 'Rate (T/min)': field_params[1]}
+        ramp = self.ramp_field(field_params[0], field_params[1])
+        print(f"Setting B field to {field_params[0]} T at {field_params[1]} T/min")
+        if self.ramp_blocking():
+            ramp.result()
+            print(f"B Field set to {field_params[0]} K")
+
+    def ramp_field(self, field: float, rate: float) -> Future:
+        """
+        Starts a field ramp and returns a future of its settled reading.
+
+        Args:
+            field: The target field in T.
+            rate: The ramp rate in T/min.
+        """
+        param = {'Field (T)': field, 
+                 'Rate (T/min)': rate}
+        superseded = self._supersede_ramp('field')
         self._send_command('Set Magnet', param)
+        self.invalidate_status('Get Magnet')
+        monitor = self._ramp_monitor(field, rate, self.field_tolerance())
+        ramp = self._submit(self._wait_for_ramp, partial(self._field_getter, 'Field (T)', 0),
+                            monitor, superseded)
+        self.ramps['field'] = ramp
+        return ramp
+
+    def wait_for_ramps(self, timeout: Optional[float] = None) -> None:
+        """
+        Waits until the last temperature and field ramps have settled.
+        """
+        for ramp in list(self.ramps.values()):
+            ramp.result(timeout)
+
+    def _ramp_monitor(self, target: float, rate: float, tolerance: float) -> RampMonitor:
+        min_interval, max_interval = self.ramp_poll_interval()
+        return RampMonitor(target, rate, tolerance, self.settle_time(),
+                           min_interval, max_interval, self.ramp_timeout_margin())
+
+    def _supersede_ramp(self, quantity: str) -> threading.Event:
+        """
+        Ends the wait for the current ramp of quantity, if any, and returns
+        the event that ends the wait for the next one.
+        """
+        previous = self._ramp_superseded.get(quantity)
+        if previous is not None:
+            previous.set()
+        superseded = self._ramp_superseded[quantity] = threading.Event()
+        return superseded
+
+    @staticmethod
+    def _wait_for_ramp(getter: Callable[[], Optional[float]], monitor: RampMonitor,
+                       superseded: threading.Event) -> float:
+        while not superseded.is_set():
+            value = getter()
+            wait = monitor.update(value, time.monotonic())
+            if wait is None:
+                return value
+            superseded.wait(wait)
+        raise RampSuperseded(f'Ramp to {monitor.target} replaced by a new set point')
+
+
+class AsyncPPMSSim(PPMSSim, AsyncZMQInstrument):
+    """
+    PPMSSim with coroutine versions of the temperature and field ramps, so
+    one asyncio event loop can wait for a ramp while it drives other
+    instruments. The QCoDeS parameters keep working as in PPMSSim.
+    """
+
+    async def aramp_temperature(self, temperature: float, rate: float) -> float:
+        """
+        Sets the temperature and waits, without blocking the loop, until it has settled.
+        Tolerance, settle time and polling follow the same parameters as ramp_temperature.
+
+        Args:
+            temperature: The target temperature in K.
+            rate: The ramp rate in K/min.
+
+        Returns:
+            float: The settled temperature reading.
+        """
+        param = {'Temperature (K)': temperature,
+                 'Rate (K/min)': rate}
+        superseded = self._supersede_ramp('temperature')
+        await self.send_command('Set Temperature', param)
+        self.invalidate_status('Get Temperature')
+        monitor = self._ramp_monitor(temperature, rate, self.temperature_tolerance())
+        return await self._await_ramp('Get Temperature', 'Temperature (K)', monitor, superseded)
+
+    async def aramp_field(self, field: float, rate: float) -> float:
+        """
+        Sets the field and waits, without blocking the loop, until it has settled.
+        Tolerance, settle time and polling follow the same parameters as ramp_field.
+
+        Args:
+            field: The target field in T.
+            rate: The ramp rate in T/min.
+
+        Returns:
+            float: The settled field reading.
+        """
+        param = {'Field (T)': field,
+                 'Rate (T/min)': rate}
+        superseded = self._supersede_ramp('field')
+        await self.send_command('Set Magnet', param)
+        self.invalidate_status('Get Magnet')
+        monitor = self._ramp_monitor(field, rate, self.field_tolerance())
+        return await self._await_ramp('Get Magnet', 'Field (T)', monitor, superseded)
+
+    async def _await_ramp(self, cmd: str, key: str, monitor: RampMonitor,
+                          superseded: threading.Event) -> float:
+        while not superseded.is_set():
+            value = (await self.send_command(cmd))['result'][key]
+            wait = monitor.update(value, time.monotonic())
+            if wait is None:
+                return value
+            await asyncio.sleep(wait)
+        raise RampSuperseded(f'Ramp to {monitor.target} replaced by a new set point')
+
 
-        print(f"Setting B field to {field_params[0]} T at {field_params[1]} T/min")
-        # feedback
-        while not self._is_field_set(field_params[0]):
-            sleep(1)
-        print(f"B Field set to {field_params[0]} K")
-
-    def _is_field_set(self, target_field):
-        current_field = self._field_getter('Field (T)')
-        if current_field is not None:
-            return current_field == target_field
-        return False
-    
 if __name__ == '__main__':
     """
     Test the PPMS class
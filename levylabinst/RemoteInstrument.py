@@ -0,0 +1,621 @@
+"""Instruments in worker processes, proxied in the main process for Measurement and dond."""
+import copy
+import itertools
+import logging
+import multiprocessing
+import pickle
+import threading
+import traceback
+from concurrent.futures import Future
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, NamedTuple, Optional, Sequence
+from weakref import finalize
+
+import numpy as np
+import qcodes.validators as vals
+from qcodes.instrument import Instrument, InstrumentBase, InstrumentChannel
+from qcodes.parameters import MultiParameter, ParameterBase, ParameterWithSetpoints
+
+log = logging.getLogger(__name__)
+
+# Arrays smaller than this are cheaper to pickle than to pass through shared memory
+SHARED_MIN_BYTES = 16384
+# Offsets of the arrays in the shared memory are aligned to this
+_ALIGNMENT = 64
+
+
+class _SharedArray(NamedTuple):
+    """Stands in for an array of a reply that was written to shared memory."""
+    offset: int
+    shape: tuple[int, ...]
+    dtype: str
+
+
+class _ParameterRef(NamedTuple):
+    """Stands in for parameter.get_latest in the shape of an Arrays validator."""
+    path: tuple[str, ...]
+
+
+class SharedArrays:
+    """
+    A block of shared memory that carries the NumPy arrays of the replies
+    from a worker process to the main process.
+
+    The worker writes the large arrays of a reply into the block and sends
+    only their offsets, shapes and dtypes through the pipe; the main process
+    copies them out. A semaphore hands the block back and forth, so the
+    worker waits for the previous reply to be copied before writing the next.
+    Arrays that don't fit are pickled instead.
+
+    Args:
+        size: Bytes of the block, when creating it.
+        name: Name of an existing block to attach to, e.g. in the worker.
+    """
+
+    def __init__(self, size: int = 0, name: Optional[str] = None) -> None:
+        if name is None:
+            self.memory = SharedMemory(create=True, size=size)
+        else:
+            self.memory = SharedMemory(name=name)
+        self.name = self.memory.name
+        self.size = self.memory.size
+
+    def pack(self, obj: Any, free: Any) -> tuple[Any, bool]:
+        """
+        Writes the large arrays of obj to the block, acquiring free first.
+        Returns obj with the arrays replaced and whether the block was used.
+        """
+        cursor = [0, False]
+
+        def place(item: Any) -> Any:
+            if isinstance(item, np.ndarray):
+                if item.nbytes < SHARED_MIN_BYTES or item.dtype.hasobject:
+                    return item
+                offset = -(-cursor[0] // _ALIGNMENT) * _ALIGNMENT
+                if offset + item.nbytes > self.size:
+                    return item
+                if not cursor[1]:
+                    free.acquire()
+                    cursor[1] = True
+                target = np.ndarray(item.shape, item.dtype, self.memory.buf, offset)
+                target[...] = item
+                cursor[0] = offset + item.nbytes
+                return _SharedArray(offset, item.shape, item.dtype.str)
+            if type(item) in (list, tuple):
+                return type(item)(place(element) for element in item)
+            if type(item) is dict:
+                return {key: place(value) for key, value in item.items()}
+            return item
+
+        packed = place(obj)
+        return packed, cursor[1]
+
+    def unpack(self, obj: Any) -> Any:
+        """
+        Returns obj with copies of the arrays it refers to in the block.
+        """
+        if isinstance(obj, _SharedArray):
+            return np.ndarray(obj.shape, np.dtype(obj.dtype), self.memory.buf,
+                              obj.offset).copy()
+        if type(obj) in (list, tuple):
+            return type(obj)(self.unpack(element) for element in obj)
+        if type(obj) is dict:
+            return {key: self.unpack(value) for key, value in obj.items()}
+        return obj
+
+    def close(self, unlink: bool = False) -> None:
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+class RemoteMultiParameter(MultiParameter):
+    """
+    Proxy of a MultiParameter of the instrument in a RemoteInstrument worker.
+    """
+
+    def get_raw(self) -> Any:
+        return _remote_root(self)._get_remote(_path(self))
+
+    def set_raw(self, value: Any) -> None:
+        _remote_root(self)._set_remote(_path(self), value)
+
+
+class RemoteChannel(InstrumentChannel):
+    """
+    Proxy of a submodule of the instrument in a RemoteInstrument worker, with
+    a proxy of each of its parameters and submodules.
+    """
+
+    def __getattr__(self, key: str) -> Any:
+        try:
+            return super().__getattr__(key)
+        except AttributeError:
+            if key.startswith('_') or _remote_root(self)._building:
+                raise
+            return _remote_root(self)._remote_attribute(_path(self), key)
+
+
+class RemoteInstrument(Instrument):
+    """
+    Runs an instrument driver in a worker process and stands in for it in
+    the main process.
+
+    Each worker does the ZMQ I/O and the JSON parsing of its instrument, so
+    several lock-ins and the PPMS use as many cores instead of sharing the
+    GIL of the process that runs the Measurement and its DataSaver. Large
+    NumPy arrays in the replies (sweep waveforms) come back through shared
+    memory (see SharedArrays), everything else is pickled through a pipe.
+
+    The proxy has a parameter for every parameter of the instrument, with
+    the same names, labels, units and validators, and a RemoteChannel for
+    every submodule, so it can be registered in a Measurement or swept and
+    measured with dond like the instrument itself. Lazily created
+    attributes of the instrument (e.g. lockin.drain_X of MCLockin) are
+    resolved in the worker on first access. Other attributes are fetched
+    from the worker and methods are called there, e.g. lockin.sweep1d(...);
+    call() does the same explicitly.
+
+    Requests to one worker run one after the other; requests to different
+    workers run at the same time. prefetch() sends the gets of several
+    parameters at once, so a dond point waits for the slowest instrument
+    instead of all of them in turn:
+
+        lockin = RemoteInstrument('lockin', MCLockin, 'tcp://localhost:29170',
+                                  config={'drain': 1, 'gate': 2})
+        lockin2 = RemoteInstrument('lockin2', MCLockin, 'tcp://localhost:29171',
+                                   config={'drain': 1})
+        dond(LinSweep(lockin.gate_DC, 0, 0.1, 101,
+                      post_actions=(partial(prefetch, lockin.results, lockin2.results),)),
+             lockin.results, lockin2.results)
+
+    The instrument class must be importable from the worker, i.e. defined
+    at module level, and args/kwargs must be picklable.
+
+    Args:
+        name: The name of the proxy and of the instrument in the worker.
+        instrument_class: The driver, e.g. MCLockin or PPMSSim.
+        *args: Positional arguments of the driver after its name.
+        start_method: How the worker is started, see multiprocessing.
+            Default 'spawn', which doesn't inherit sockets or threads.
+        shared_memory_size: Bytes of shared memory for the arrays of the
+            replies. Default 16 MiB.
+        start_timeout: Seconds to wait for the driver to connect. Default 60.
+        **kwargs: Keyword arguments of the driver.
+    """
+
+    def __init__(self, name: str, instrument_class: type[Instrument], *args: Any,
+                 start_method: Optional[str] = 'spawn',
+                 shared_memory_size: int = 16 * 2**20,
+                 start_timeout: float = 60,
+                 **kwargs: Any) -> None:
+        super().__init__(name)
+        self.instrument_class = instrument_class
+        self._ids = itertools.count()
+        self._pending: dict[int, Future] = {}
+        self._prefetched: dict[tuple[str, ...], Future] = {}
+        self._send_lock = threading.Lock()
+        # While proxies are added, missing attributes are not asked from the worker
+        self._building = True
+
+        context = multiprocessing.get_context(start_method)
+        self._arena = SharedArrays(shared_memory_size)
+        self._arena_free = context.Semaphore(1)
+        self._conn, worker_conn = context.Pipe()
+        self._process = context.Process(
+            target=_serve,
+            args=(worker_conn, self._arena.name, self._arena_free,
+                  instrument_class, name, args, kwargs),
+            name=f'{name}_worker',
+            daemon=True)
+        self._process.start()
+        worker_conn.close()
+        self._stop_worker = finalize(self, _stop_worker, self._process, self._conn,
+                                     self._send_lock, self._arena)
+
+        try:
+            if not self._conn.poll(start_timeout):
+                raise TimeoutError(f'{instrument_class.__name__} {name} did not start '
+                                   f'within {start_timeout} s')
+            _, ok, description, _ = self._conn.recv()
+        except BaseException:
+            self.close()
+            raise
+        if not ok:
+            self.close()
+            raise description
+
+        self._reader = threading.Thread(target=self._read_replies,
+                                        name=f'{name}_replies', daemon=True)
+        self._reader.start()
+        _build(self, description)
+        self._building = False
+        self.connect_message()
+
+    def __getattr__(self, key: str) -> Any:
+        try:
+            return super().__getattr__(key)
+        except AttributeError:
+            if key.startswith('_') or self.__dict__.get('_building', True):
+                raise
+            return self._remote_attribute((), key)
+
+    def get_idn(self) -> dict[str, Optional[str]]:
+        return self.call('get_idn')
+
+    def call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """
+        Calls a method of the instrument in the worker and returns its result,
+        e.g. call('sweep1d', 2, 0, 1, 0.2, 2) or call('drain.DC.get').
+        """
+        return self.call_async(method, *args, **kwargs).result()
+
+    def call_async(self, method: str, *args: Any, **kwargs: Any) -> Future:
+        """
+        Like call(), but returns the future of the result right away.
+        """
+        self._prefetched.clear()
+        return self._request('call', tuple(method.split('.')), args, kwargs)
+
+    def prefetch(self, *parameters: ParameterBase) -> None:
+        """
+        Sends the gets of parameters of this instrument to the worker; their
+        next get() returns the reply instead of sending a request. Anything
+        set or called on the instrument in between drops the prefetched
+        replies, so they are never older than the last change.
+        """
+        for parameter in parameters:
+            path = _path(parameter)
+            if path not in self._prefetched:
+                self._prefetched[path] = self._request('get', path)
+
+    def snapshot_base(self, update: Optional[bool] = False,
+                      params_to_skip_update: Optional[Sequence[str]] = None) -> dict[Any, Any]:
+        """
+        Returns the snapshot of the instrument in the worker.
+        """
+        if '_reader' not in self.__dict__ or not self._process.is_alive():
+            return super().snapshot_base(update=False)
+        return self._request('snapshot', (), (update, params_to_skip_update)).result()
+
+    def close(self) -> None:
+        """Closes the instrument in the worker and stops the worker."""
+        self._building = True
+        try:
+            if getattr(self, '_reader', None) is not None and self._process.is_alive():
+                try:
+                    self._request('close', ()).result(timeout=10)
+                except Exception as e:
+                    log.warning('Closing %s in its worker failed: %s', self.name, e)
+            if getattr(self, '_stop_worker', None) is not None:
+                self._stop_worker()
+        finally:
+            super().close()
+
+    def _get_remote(self, path: tuple[str, ...]) -> Any:
+        future = self._prefetched.pop(path, None)
+        if future is None:
+            future = self._request('get', path)
+        return future.result()
+
+    def _set_remote(self, path: tuple[str, ...], value: Any) -> None:
+        self._prefetched.clear()
+        self._request('set', path, (value,)).result()
+
+    def _remote_attribute(self, module_path: tuple[str, ...], key: str) -> Any:
+        attribute = self._request('describe', (*module_path, key)).result()
+        kind = attribute['kind']
+        if kind == 'value':
+            return attribute['value']
+        if kind == 'method':
+            return partial(self.call, '.'.join((*module_path, key)))
+        path = attribute['path']
+        if attribute['module'] is not None and path[0] not in self.submodules:
+            self._building = True
+            try:
+                _add_channel(self, path[0], attribute['module'])
+            finally:
+                self._building = False
+        value = _resolve(self, path)
+        # Cached like MCLockin does, so the next access doesn't ask the worker
+        _resolve(self, module_path).__dict__[key] = value
+        return value
+
+    def _request(self, op: str, path: tuple[str, ...], args: tuple = (),
+                 kwargs: Optional[dict] = None) -> Future:
+        future: Future = Future()
+        request_id = next(self._ids)
+        self._pending[request_id] = future
+        try:
+            with self._send_lock:
+                self._conn.send((request_id, op, path, args, kwargs or {}))
+        except (OSError, ValueError) as e:
+            self._pending.pop(request_id, None)
+            raise RuntimeError(f'The worker of {self.name} is not running') from e
+        return future
+
+    def _read_replies(self) -> None:
+        while True:
+            try:
+                request_id, ok, payload, shared = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            if shared:
+                try:
+                    payload = self._arena.unpack(payload)
+                finally:
+                    self._arena_free.release()
+            future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(payload)
+        for future in list(self._pending.values()):
+            if not future.done():
+                future.set_exception(RuntimeError(f'The worker of {self.name} exited'))
+        self._pending.clear()
+
+
+def prefetch(*parameters: ParameterBase) -> None:
+    """
+    Sends the gets of remote parameters to their workers at once, e.g. as a
+    post action of the innermost sweep of dond. Other parameters are ignored.
+    """
+    for parameter in parameters:
+        root = parameter.root_instrument
+        if isinstance(root, RemoteInstrument):
+            root.prefetch(parameter)
+
+
+# Main process side
+
+
+def _remote_root(node: Any) -> RemoteInstrument:
+    return node.root_instrument
+
+
+def _remote_get(node: InstrumentBase, name: str) -> Any:
+    return _remote_root(node)._get_remote((*_path(node), name))
+
+
+def _remote_set(node: InstrumentBase, name: str, value: Any) -> None:
+    _remote_root(node)._set_remote((*_path(node), name), value)
+
+
+def _build(node: InstrumentBase, description: dict) -> None:
+    """
+    Adds proxies of the parameters and submodules of a description to node.
+    """
+    # Setpoints are plain parameters, so these go first
+    specs = sorted(description['parameters'].items(),
+                   key=lambda item: item[1]['kind'] == 'setpoints')
+    for name, spec in specs:
+        if name in node.parameters:
+            continue
+        kwargs: dict[str, Any] = {'label': spec['label'], 'unit': spec['unit']}
+        if spec['kind'] == 'multi':
+            node.add_parameter(name, parameter_class=RemoteMultiParameter,
+                               snapshot_get=False, **spec['multi'])
+            continue
+        validator = spec['vals']
+        if isinstance(validator, vals.Arrays):
+            validator._shape = tuple(_resolve(node.root_instrument, dim.path).get_latest
+                                     if isinstance(dim, _ParameterRef) else dim
+                                     for dim in validator._shape or ()) or None
+        if validator is not None:
+            kwargs['vals'] = validator
+        if spec['kind'] == 'setpoints':
+            kwargs['parameter_class'] = ParameterWithSetpoints
+            kwargs['setpoints'] = tuple(_resolve(node.root_instrument, path)
+                                        for path in spec['setpoints'])
+        node.add_parameter(name,
+                           get_cmd=partial(_remote_get, node, name) if spec['gettable'] else False,
+                           set_cmd=partial(_remote_set, node, name) if spec['settable'] else False,
+                           **kwargs)
+    for name, module in description['submodules'].items():
+        if name not in node.submodules:
+            _add_channel(node, name, module)
+
+
+def _add_channel(node: InstrumentBase, name: str, description: dict) -> None:
+    channel = RemoteChannel(node, name)
+    node.add_submodule(name, channel)
+    _build(channel, description)
+
+
+# Both sides
+
+
+def _path(node: Any) -> tuple[str, ...]:
+    """
+    Names leading from the root instrument to a parameter or submodule.
+    """
+    names = []
+    if isinstance(node, ParameterBase):
+        names.append(node.short_name)
+        node = node.instrument
+    while node is not None and node is not node.root_instrument:
+        names.append(node.short_name)
+        node = node.parent
+    return tuple(reversed(names))
+
+
+def _resolve(node: Any, path: Sequence[str]) -> Any:
+    for name in path:
+        node = getattr(node, name)
+    return node
+
+
+# Worker side
+
+
+def _serve(conn: Any, arena_name: str, arena_free: Any, instrument_class: type[Instrument],
+           name: str, args: tuple, kwargs: dict) -> None:
+    """
+    Main loop of a worker: creates the instrument, then answers requests
+    until the main process asks to close it or goes away.
+    """
+    arena = SharedArrays(name=arena_name)
+    instrument = None
+    try:
+        try:
+            instrument = instrument_class(name, *args, **kwargs)
+            conn.send((None, True, _describe(instrument), False))
+        except Exception as e:
+            conn.send((None, False, _portable_error(e, name), False))
+            return
+        while True:
+            try:
+                request_id, op, path, op_args, op_kwargs = conn.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                result, ok = _OPS[op](instrument, path, *op_args, **op_kwargs), True
+                result, shared = arena.pack(result, arena_free)
+            except Exception as e:
+                result, ok, shared = _portable_error(e, name), False, False
+            if op == 'close':
+                instrument = None
+            try:
+                conn.send((request_id, ok, result, shared))
+            except OSError:
+                # The main process hung up
+                break
+            except Exception as e:
+                # The result couldn't be pickled
+                if shared:
+                    arena_free.release()
+                conn.send((request_id, False, _portable_error(e, name), False))
+            if instrument is None:
+                break
+    finally:
+        if instrument is not None:
+            instrument.close()
+        arena.close()
+        conn.close()
+
+
+def _describe(node: InstrumentBase) -> dict:
+    """
+    What the main process needs to build proxies of the parameters and
+    submodules of node.
+    """
+    parameters = {name: _describe_parameter(parameter)
+                  for name, parameter in node.parameters.items()}
+    submodules = {name: _describe(module) for name, module in node.submodules.items()
+                  if isinstance(module, InstrumentBase)}
+    return {'parameters': parameters, 'submodules': submodules}
+
+
+def _describe_parameter(parameter: ParameterBase) -> dict:
+    spec: dict[str, Any] = {'label': getattr(parameter, 'label', parameter.name),
+                            'unit': getattr(parameter, 'unit', ''),
+                            'gettable': parameter.gettable,
+                            'settable': parameter.settable,
+                            'vals': _portable_vals(parameter.vals),
+                            'kind': 'parameter'}
+    if isinstance(parameter, MultiParameter):
+        spec['kind'] = 'multi'
+        spec['multi'] = {key: getattr(parameter, key)
+                         for key in ('names', 'shapes', 'labels', 'units', 'setpoints',
+                                     'setpoint_names', 'setpoint_labels', 'setpoint_units')}
+    elif isinstance(parameter, ParameterWithSetpoints):
+        spec['kind'] = 'setpoints'
+        spec['setpoints'] = [_path(setpoint) for setpoint in parameter.setpoints]
+    return spec
+
+
+def _portable_vals(validator: Optional[vals.Validator]) -> Optional[vals.Validator]:
+    """
+    A copy of validator that can be pickled, or None. Shapes of Arrays that
+    follow another parameter are replaced by references to it.
+    """
+    if validator is None:
+        return None
+    if isinstance(validator, vals.Arrays) and validator._shape is not None:
+        validator = copy.copy(validator)
+        shape = []
+        for dim in validator._shape:
+            if callable(dim):
+                parameter = getattr(dim, 'parameter', None)
+                if not isinstance(parameter, ParameterBase):
+                    return None
+                dim = _ParameterRef(_path(parameter))
+            shape.append(dim)
+        validator._shape = tuple(shape)
+    try:
+        pickle.dumps(validator)
+    except Exception:
+        return None
+    return validator
+
+
+def _describe_attribute(instrument: Instrument, path: tuple[str, ...]) -> dict:
+    value = _resolve(instrument, path)
+    if isinstance(value, (ParameterBase, InstrumentBase)):
+        target = _path(value)
+        module = _resolve(instrument, target[:1])
+        return {'kind': 'proxy', 'path': target,
+                'module': _describe(module) if isinstance(module, InstrumentBase) else None}
+    if callable(value):
+        return {'kind': 'method'}
+    return {'kind': 'value', 'value': value}
+
+
+def _snapshot(instrument: Instrument, path: tuple[str, ...], update: Optional[bool],
+              params_to_skip_update: Optional[Sequence[str]]) -> dict:
+    return instrument.snapshot_base(update=update, params_to_skip_update=params_to_skip_update)
+
+
+def _close(instrument: Instrument, path: tuple[str, ...]) -> None:
+    instrument.close()
+
+
+_OPS = {
+    'get': lambda instrument, path: _resolve(instrument, path).get(),
+    'set': lambda instrument, path, value: _resolve(instrument, path).set(value),
+    'call': lambda instrument, path, *args, **kwargs: _resolve(instrument, path)(*args, **kwargs),
+    'describe': _describe_attribute,
+    'snapshot': _snapshot,
+    'close': _close,
+}
+
+
+def _portable_error(error: Exception, name: str) -> Exception:
+    """
+    error, or a RuntimeError if it can't be pickled, with the traceback of
+    the worker attached: as a note where notes exist (Python 3.11+), in the
+    message of the RuntimeError.
+    """
+    context = (f'Raised in the worker of {name}:\n'
+               + ''.join(traceback.format_exception(type(error), error, error.__traceback__)))
+    try:
+        pickle.loads(pickle.dumps(error))
+    except Exception:
+        return RuntimeError(f'{type(error).__name__}: {error}\n\n{context}')
+    if hasattr(error, 'add_note'):
+        error.add_note(context)
+    return error
+
+
+def _stop_worker(process: multiprocessing.process.BaseProcess, conn: Any,
+                 send_lock: threading.Lock, arena: SharedArrays) -> None:
+    # Ask the worker to close the instrument, then hang up; a worker that
+    # still holds the other end of the pipe only stops on the message.
+    try:
+        with send_lock:
+            conn.send((None, 'close', (), (), {}))
+    except (OSError, ValueError):
+        pass
+    conn.close()
+    process.join(timeout=2)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+    try:
+        arena.close(unlink=True)
+    except FileNotFoundError:
+        pass
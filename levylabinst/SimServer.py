@@ -0,0 +1,324 @@
+"""Local stand-in for the LabVIEW Instrument Framework servers of the lock-in and PPMS."""
+import argparse
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Optional
+
+import numpy as np
+import zmq
+
+from .ZMQTransport import encode_binary_frames
+
+log = logging.getLogger(__name__)
+
+AO_DEFAULTS = {'Amplitude (V)': 0.0, 'DC (V)': 0.0, 'Frequency (Hz)': 17.77,
+               'Phase (deg)': 0.0, 'Function': 'Sine'}
+SET_AO = {'setAO_Amplitude': 'Amplitude (V)',
+          'setAO_DC': 'DC (V)',
+          'setAO_Frequency': 'Frequency (Hz)',
+          'setAO_Phase': 'Phase (deg)',
+          'setAO_Function': 'Function'}
+
+
+class Ramp:
+    """
+    A setpoint approached linearly at a rate per minute, like the PPMS does.
+
+    Args:
+        value: The starting value.
+        speedup: How many times faster than its rate the ramp runs.
+    """
+
+    def __init__(self, value: float, speedup: float = 1) -> None:
+        self.start = self.target = value
+        self.rate = 0.0
+        self.t0 = time.monotonic()
+        self.speedup = speedup
+
+    def set(self, target: float, rate: float) -> None:
+        self.start = self.value()
+        self.target = target
+        self.rate = abs(rate)
+        self.t0 = time.monotonic()
+
+    def value(self) -> float:
+        if self.rate == 0:
+            return self.target
+        step = self.rate / 60 * self.speedup * (time.monotonic() - self.t0)
+        if step >= abs(self.target - self.start):
+            return self.target
+        return self.start + np.sign(self.target - self.start) * step
+
+    def status(self) -> str:
+        return 'Stable' if self.value() == self.target else 'Ramping'
+
+
+class SimServer:
+    """
+    ZMQ REP server that answers the JSON-RPC requests of MCLockin and PPMSSim,
+    so the drivers can be tested and benchmarked without the LabVIEW servers.
+
+    It implements getResults, getAOConfig, setAO_*, setState, getStatus,
+    setSweep, setSweepTime and getSweepWaveforms of the lock-in and
+    Get/Set Temperature and Get/Set Magnet of the PPMS, including JSON-RPC
+    batches and binary framing of the waveforms. Sweeps take their
+    configured time; the recorded waveforms grow while they run. Unknown
+    methods get a JSON-RPC "Method not found" error, bad params "Invalid
+    params" and any other failure of a method "Internal error"; the server
+    keeps running either way.
+
+    E.g.
+        with SimServer(delay=0.001) as server:
+            lockin = MCLockin('lockin', server.address, config={'drain': 1})
+
+    Or from a shell, in place of the lock-in server:
+        python -m levylabinst.SimServer --port 29170
+
+    Args:
+        address: Where to bind. A free port on localhost by default.
+        delay: Seconds added to every reply, to mimic the LabVIEW server.
+        waveform_points: Points of each sweep waveform, i.e. the payload size
+            of getSweepWaveforms.
+        channels: Number of AI and AO channels of the lock-in.
+        ramp_speedup: How many times faster than their rate the PPMS ramps run.
+    """
+
+    def __init__(self, address: str = 'tcp://127.0.0.1:*', delay: float = 0,
+                 waveform_points: int = 1000, channels: int = 4,
+                 ramp_speedup: float = 1) -> None:
+        self.delay = delay
+        self.waveform_points = waveform_points
+        self.channels = channels
+        # Number of requests per method, e.g. to check what a driver sent
+        self.calls: Counter = Counter()
+
+        self.ao = {channel: dict(AO_DEFAULTS) for channel in range(1, channels + 1)}
+        self.state = 'idle'
+        self.sweep_config: dict = {'Sweep Time (s)': 1, 'Initial Wait (s)': 0, 'Channels': []}
+        self._sweep_started: Optional[float] = None
+        self.temperature = Ramp(300.0, ramp_speedup)
+        self.field = Ramp(0.0, ramp_speedup)
+
+        self._methods: dict[str, Callable[[Any], Any]] = {
+            'getResults': self._get_results,
+            'getAOConfig': self._get_ao_config,
+            'setState': self._set_state,
+            'getStatus': self._get_status,
+            'setSweep': self._set_sweep,
+            'setSweepTime': self._set_sweep_time,
+            'getSweepWaveforms': self._get_sweep_waveforms,
+            'Get Temperature': self._get_temperature,
+            'Set Temperature': self._set_temperature,
+            'Get Magnet': self._get_magnet,
+            'Set Magnet': self._set_magnet,
+        }
+        for method, key in SET_AO.items():
+            self._methods[method] = lambda params, key=key: self._set_ao(key, params)
+
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.REP)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(address)
+        self.address = self.socket.getsockopt_string(zmq.LAST_ENDPOINT)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'SimServer':
+        """
+        Serves requests from a daemon thread until stop() is called.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name='sim_server',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            self.socket.close()
+            self.context.term()
+
+    def __enter__(self) -> 'SimServer':
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def serve_forever(self) -> None:
+        try:
+            while not self._stop.is_set():
+                if not self.socket.poll(50):
+                    continue
+                try:
+                    request = json.loads(self.socket.recv())
+                except ValueError as e:
+                    self.socket.send_string(json.dumps(_error({}, -32700, f'Parse error: {e}')))
+                    continue
+                if self.delay:
+                    time.sleep(self.delay)
+                if isinstance(request, list) and request:
+                    self.socket.send_string(json.dumps([self.handle(item) for item in request],
+                                                      default=_tolist))
+                    continue
+                response = self.handle(request)
+                if isinstance(request, dict) and request.get('encoding') == 'binary':
+                    self.socket.send_multipart(encode_binary_frames(response))
+                else:
+                    self.socket.send_string(json.dumps(response, default=_tolist))
+        finally:
+            self.socket.close()
+            self.context.term()
+
+    def handle(self, request: Any) -> dict:
+        """
+        Returns the JSON-RPC response to a single request.
+        """
+        if not isinstance(request, dict):
+            return _error({}, -32600, f'Invalid Request: {request!r}')
+        method = request.get('method')
+        self.calls[method] += 1
+        handler = self._methods.get(method)
+        if handler is None:
+            return _error(request, -32601, f'Method not found: {method}')
+        try:
+            result = handler(request.get('params'))
+        except (KeyError, TypeError, ValueError) as e:
+            return _error(request, -32602, f'Invalid params for {method}: {e!r}')
+        except Exception as e:
+            log.exception('%s failed', method)
+            return _error(request, -32603, f'Internal error in {method}: {e!r}')
+        return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+
+    # Lock-in
+
+    def _get_results(self, params: Any) -> dict:
+        results = []
+        for channel in range(1, self.channels + 1):
+            ao = self.ao[channel]
+            amplitude = ao['Amplitude (V)']
+            phase = np.deg2rad(ao['Phase (deg)'])
+            x, y = amplitude * np.cos(phase), amplitude * np.sin(phase)
+            for ref in (1, 2):
+                values = {'X': x / ref, 'Y': y / ref, 'R': abs(amplitude) / ref,
+                          'Theta': ao['Phase (deg)'], 'Mean': ao['DC (V)']}
+                results += [{'key': f'AI{channel}.Ref{ref}.{name}', 'value': value}
+                            for name, value in values.items()]
+            results.append({'key': f'AI{channel}.Mean', 'value': ao['DC (V)']})
+        return {'Results (Dictionary)': results}
+
+    def _get_ao_config(self, params: Any) -> dict:
+        return {'AO Config': [{'AO Channel': channel, **settings}
+                              for channel, settings in self.ao.items()]}
+
+    def _set_ao(self, key: str, params: dict) -> None:
+        self.ao[int(params['AO Channel'])][key] = params[key]
+
+    def _set_state(self, state: str) -> None:
+        if state == 'start sweep':
+            self._sweep_started = time.monotonic()
+            self.state = 'sweeping'
+        elif state == 'start':
+            self.state = 'running'
+        elif state == 'stop':
+            self.state = 'idle'
+
+    def _get_status(self, params: Any) -> str:
+        if self.state == 'sweeping' and self._sweep_progress() >= 1:
+            self._finish_sweep()
+        return self.state
+
+    def _set_sweep(self, config: dict) -> None:
+        self.sweep_config = config
+
+    def _set_sweep_time(self, sweep_time: float) -> None:
+        self.sweep_config['Sweep Time (s)'] = sweep_time
+
+    def _sweep_progress(self) -> float:
+        if self._sweep_started is None:
+            return 0.0
+        elapsed = (time.monotonic() - self._sweep_started
+                   - self.sweep_config.get('Initial Wait (s)', 0))
+        sweep_time = self.sweep_config.get('Sweep Time (s)', 0)
+        return 1.0 if sweep_time <= 0 else min(max(elapsed / sweep_time, 0.0), 1.0)
+
+    def _finish_sweep(self) -> None:
+        self.state = 'running'
+        for channel in self.sweep_config.get('Channels', []):
+            end = channel['Start'] if self.sweep_config.get('Return to Start') else channel['End']
+            self.ao[int(channel['Channel'])]['DC (V)'] = end
+
+    def _get_sweep_waveforms(self, params: Any) -> dict:
+        n = int(self._sweep_progress() * self.waveform_points)
+        swept = {int(channel['Channel']): channel
+                 for channel in self.sweep_config.get('Channels', [])}
+        t = np.linspace(0, 1, self.waveform_points)[:n]
+        ao, x, y = [], [], []
+        for channel in range(1, self.channels + 1):
+            sweep = swept.get(channel)
+            if sweep is None:
+                wave = np.full(n, self.ao[channel]['DC (V)'])
+            elif sweep.get('Table'):
+                table = np.asarray(sweep['Table'], dtype=float)
+                wave = np.interp(t, np.linspace(0, 1, len(table)), table)
+            else:
+                wave = sweep['Start'] + (sweep['End'] - sweep['Start']) * t
+            ao.append({'Y': wave})
+            x.append({'Y': np.tanh(wave * channel)})
+            y.append({'Y': np.sin(wave * channel)})
+        return {'AO_wfm': ao, 'X_wfm': x, 'Y_wfm': y}
+
+    # PPMS
+
+    def _get_temperature(self, params: Any) -> dict:
+        return {'Temperature (K)': self.temperature.value(),
+                'Temperature Status': self.temperature.status()}
+
+    def _set_temperature(self, params: dict) -> None:
+        self.temperature.set(params['Temperature (K)'], params['Rate (K/min)'])
+
+    def _get_magnet(self, params: Any) -> dict:
+        return {'Field (T)': self.field.value(), 'Magnet Status': self.field.status()}
+
+    def _set_magnet(self, params: dict) -> None:
+        self.field.set(params['Field (T)'], params['Rate (T/min)'])
+
+
+def _error(request: dict, code: int, message: str) -> dict:
+    return {'jsonrpc': '2.0', 'id': request.get('id'),
+            'error': {'code': code, 'message': message}}
+
+
+def _tolist(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description=SimServer.__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=29170)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--delay', type=float, default=0)
+    parser.add_argument('--waveform-points', type=int, default=1000)
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--ramp-speedup', type=float, default=1)
+    args = parser.parse_args(argv)
+    server = SimServer(f'tcp://{args.host}:{args.port}', delay=args.delay,
+                       waveform_points=args.waveform_points, channels=args.channels,
+                       ramp_speedup=args.ramp_speedup)
+    print(f'Simulating the lock-in and PPMS servers at {server.address}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Background telemetry: latest values and short histories of instrument readings."""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional, Sequence
+
+import numpy as np
+import zmq
+
+if TYPE_CHECKING:
+    from qcodes.parameters import Parameter
+
+log = logging.getLogger(__name__)
+
+
+class Telemetry:
+    """
+    Latest value and a bounded history of timestamped samples per name.
+
+    Samples are written by the telemetry threads and read by anyone else
+    without locking: the latest value of a name is replaced with a single
+    dict store, and the histories are deques with a maximum length, so old
+    samples fall out on their own and memory stays bounded.
+
+    Args:
+        history: Number of samples kept per name. Default 10000.
+    """
+
+    def __init__(self, history: int = 10000) -> None:
+        self.history_length = history
+        self._latest: dict[str, tuple[float, Any]] = {}
+        self._history: dict[str, deque] = {}
+
+    def record(self, name: str, value: Any, timestamp: Optional[float] = None) -> None:
+        """
+        Stores a sample. timestamp is a time.time() value, now if None.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self._latest[name] = (timestamp, value)
+        samples = self._history.get(name)
+        if samples is None:
+            samples = self._history.setdefault(name, deque(maxlen=self.history_length))
+        samples.append((timestamp, value))
+
+    def latest(self, name: str, max_age: Optional[float] = None, default: Any = None) -> Any:
+        """
+        Returns the latest value of name, or default if there is none or it
+        is older than max_age seconds.
+        """
+        sample = self._latest.get(name)
+        if sample is None or (max_age is not None and time.time() - sample[0] > max_age):
+            return default
+        return sample[1]
+
+    def history(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the timestamps and values of the stored samples of name.
+        """
+        samples = list(self._history.get(name, ()))
+        if not samples:
+            return np.array([]), np.array([])
+        timestamps, values = zip(*samples)
+        return np.array(timestamps), np.array(values)
+
+    def names(self) -> list[str]:
+        return list(self._latest)
+
+
+class TelemetrySubscriber(threading.Thread):
+    """
+    Consumes a server-side PUB stream and records every value it carries.
+
+    Each message is either [topic, JSON] or a single JSON frame. The JSON is
+    an object of name: value pairs and may carry the time of the sample
+    under "timestamp".
+
+    Args:
+        context: The ZMQ context to create the SUB socket in.
+        address: The address of the PUB socket.
+        topics: The topic prefixes to subscribe to, all by default.
+        on_sample: Called with (name, value, timestamp) for every sample.
+    """
+
+    def __init__(self, context: zmq.Context, address: str,
+                 on_sample: Callable[[str, Any, float], None],
+                 topics: Sequence[str] = ('',)) -> None:
+        super().__init__(name=f"telemetry_sub_{address}", daemon=True)
+        self.context = context
+        self.address = address
+        self.topics = topics
+        self.on_sample = on_sample
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        socket = self.context.socket(zmq.SUB)
+        socket.setsockopt(zmq.LINGER, 0)
+        for topic in self.topics:
+            socket.setsockopt_string(zmq.SUBSCRIBE, topic)
+        socket.connect(self.address)
+        try:
+            while not self._stop_event.is_set():
+                if not socket.poll(100, zmq.POLLIN):
+                    continue
+                frames = socket.recv_multipart()
+                try:
+                    sample = json.loads(frames[-1])
+                except ValueError:
+                    log.debug("Ignoring telemetry message that is not JSON from %s",
+                              self.address)
+                    continue
+                timestamp = sample.pop("timestamp", None) or time.time()
+                for name, value in sample.items():
+                    self.on_sample(name, value, timestamp)
+        finally:
+            socket.close()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+class TelemetryPoller(threading.Thread):
+    """
+    Reads a set of parameters at a fixed interval and records their values.
+
+    One poller serves any number of dashboards: they read the recorded
+    values or the parameter caches instead of querying the instrument.
+
+    Args:
+        parameters: The parameters to read.
+        telemetry: Where the readings are recorded, by parameter full name,
+            so parameters of different channels (lockin_drain_X,
+            lockin_gate_X) don't collide.
+        interval: Seconds between readings.
+    """
+
+    def __init__(self, parameters: Iterable['Parameter'], telemetry: Telemetry,
+                 interval: float) -> None:
+        super().__init__(name="telemetry_poller", daemon=True)
+        self.parameters = list(parameters)
+        self.telemetry = telemetry
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            start = time.monotonic()
+            for parameter in self.parameters:
+                try:
+                    self.telemetry.record(parameter.full_name, parameter.get())
+                except Exception as e:
+                    log.warning("Telemetry reading of %s failed: %s", parameter.full_name, e)
+            self._stop_event.wait(max(self.interval - (time.monotonic() - start), 0))
+
+    def stop(self) -> None:
+        self._stop_event.set()
@@ -1,11 +1,11 @@
 """ZMQ Communication driver based on pyzmq."""
-import time
-import json
 import logging
-import warnings
+import threading
+import time
 import zmq
-from importlib.resources import as_file, files
-from typing import TYPE_CHECKING, Any, Union, Sequence, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Union, Sequence, Optional
 from weakref import finalize
 from functools import partial
 import qcodes.validators as vals
@@ -14,18 +14,22 @@ from qcodes.utils import DelayedKeyboardInterrupt
 
 from qcodes.instrument import Instrument
 from qcodes.instrument.base import InstrumentBase
+from qcodes.parameters import ParameterBase
 
-if TYPE_CHECKING:
-    from collections.abc import Sequence
+from .Codec import Codec, get_codec
+from .Metrics import Metrics
+from .Telemetry import Telemetry, TelemetryPoller, TelemetrySubscriber
+from .ZMQTransport import (DealerTransport, ReqTransport, RequestTracker, acquire_context,
+                           decode_binary_frames, encode_binary_frames, release_context)
 
 ZMQ_LOGGER = '.'.join((InstrumentBase.__module__, 'com', 'visa'))
 
 log = logging.getLogger(__name__)
 
 
-def _close_zmq_socket(socket: zmq.Socket, name: str) -> None:
+def _close_zmq_transport(transport: Union[ReqTransport, DealerTransport], name: str) -> None:
     try:
-        socket.close()
+        transport.close()
         log.info("Closed ZMQ socket for %s", name)
     except Exception as e:
         log.error("Error closing ZMQ socket for %s: %s", name, str(e))
@@ -36,13 +40,59 @@ class ZMQInstrument(Instrument):
     Base class for all instruments using ZMQ communication.
     Used for communication with Levylab Instrument Framework.
 
+    Commands sent with binary=True (e.g. sweep waveforms) ask the server for
+    binary framing when binary_arrays is enabled: the request carries
+    "encoding": "binary" and the server may answer with a multipart message
+    made of a JSON header plus raw array frames (see encode_binary_frames).
+    A plain single-frame JSON reply is still accepted, so servers without
+    binary support keep working.
+
+    The default 'req' transport allows one request at a time. The 'dealer'
+    transport lets several threads share the instrument with requests in
+    flight at the same time, matches replies by JSON-RPC id and recovers
+    from timeouts by dropping the late reply.
+
+    A request without reply in time raises zmq.Again, and the REQ socket is
+    replaced so the next request goes through. Requests to idempotent
+    methods (get*/Get ...) are first sent again up to zmq_retries times,
+    waiting zmq_retry_backoff seconds, doubled on every retry. With
+    zmq_lazy_pirate every request is retried this way, including sets and
+    batches, for servers that tolerate receiving a command twice. Once a
+    request went unanswered through all its retries, the server counts as
+    down and requests are not retried until it answers again, so reading a
+    snapshot from a dead server costs one timeout per parameter.
+
+    All instruments of a process share one ZMQ context, and with it the I/O
+    threads (see configure_context); it is terminated when the last of them
+    is closed.
+
+    Messages are encoded with the fastest installed JSON codec (see Codec).
+    Commands without params are sent from pre-serialized byte templates,
+    with only the request id filled in.
+
+    Every request is timed and counted in the metrics attribute: round trip
+    latency per method, JSON encode and decode time, bytes sent and
+    received, timeouts and retries (see Metrics and serve_metrics).
+
     Args:
         name: What the instrument is called locally.
         address: The ZMQ resource name to use to connect.
         timeout: Seconds to allow for responses. Default 5.
+        binary_arrays: Request binary framing for array replies. Default False.
+        transport: 'req' or 'dealer'. Default 'req'.
+        retries: Initial value of zmq_retries. Default 2.
+        lazy_pirate: Initial value of zmq_lazy_pirate. Default False.
+        codec: JSON library for the messages, 'orjson', 'ujson' or 'json'.
+            The fastest installed one by default.
         metadata: Additional static metadata to add to this
             instrument's JSON snapshot.
     """
+
+    # Number of threads that run the jobs passed to _submit
+    _worker_threads = 1
+    # Methods starting with these only read state and are safe to send again
+    _idempotent_prefixes: tuple[str, ...] = ('get', 'Get ')
+
 # TODO: Give an option to change the data_source in the constructor
     def __init__(
         self,
@@ -51,6 +101,11 @@ class ZMQInstrument(Instrument):
         data_source: str = None,
         timeout: float = 5,
         metadata: dict[str, Any] = None,
+        binary_arrays: bool = False,
+        transport: str = 'req',
+        retries: int = 2,
+        lazy_pirate: bool = False,
+        codec: Optional[str] = None,
         **kwargs: Any,
     ):
         super().__init__(name, **kwargs)
@@ -69,15 +124,69 @@ class ZMQInstrument(Instrument):
             vals=vals.MultiType(vals.Numbers(min_value=0), vals.Enum(None)),
         )
 
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect(address)
-        finalize(self, _close_zmq_socket, self.socket, str(self.name))
+        self.add_parameter(
+            "zmq_retries",
+            initial_value=retries,
+            get_cmd=None,
+            set_cmd=None,
+            vals=vals.Ints(min_value=0),
+            docstring="How often a timed out idempotent request is sent again.",
+        )
+
+        self.add_parameter(
+            "zmq_retry_backoff",
+            initial_value=0.1,
+            get_cmd=None,
+            set_cmd=None,
+            unit="s",
+            vals=vals.Numbers(min_value=0),
+            docstring="Wait before the first retry, doubled for every further one.",
+        )
+
+        self.add_parameter(
+            "zmq_lazy_pirate",
+            initial_value=lazy_pirate,
+            get_cmd=None,
+            set_cmd=None,
+            vals=vals.Bool(),
+            docstring="Retry every timed out request, not only idempotent ones.",
+        )
+
+        transports = {'req': ReqTransport, 'dealer': DealerTransport}
+        if transport not in transports:
+            raise ValueError(f"Unknown transport {transport!r}, "
+                             f"expected one of {list(transports)}")
+        # One context, and so one set of I/O threads, for all instruments
+        # of the process; configure_context sets its number of I/O threads
+        self.context = acquire_context()
+        # Request ids and response matching, shared with the transport
+        self._requests = RequestTracker()
+        # Set when a request went unanswered through all its retries
+        self._server_down = False
+        # Latency, traffic and error counts of the requests
+        self.metrics = Metrics(self.full_name)
+        self._codec: Codec = get_codec(codec)
+        # Encoded commands without params up to the id, per (method, binary)
+        self._templates: dict[tuple[str, bool], bytes] = {}
+        self._transport = transports[transport](self.context, address, timeout,
+                                                self._requests, self.metrics, self._codec)
+        finalize(self, _close_zmq_transport, self._transport, str(self.name))
 
         self._address = address
         self._timeout = timeout
-        self.socket.setsockopt(zmq.RCVTIMEO, int(timeout * 1000))
-        self.socket.setsockopt(zmq.SNDTIMEO, int(timeout * 1000))
+        self._binary_arrays = binary_arrays
+        # Commands queued by batch(), per thread
+        self._batch = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._telemetry: Optional[Telemetry] = None
+        self._telemetry_threads: list[threading.Thread] = []
+
+    @property
+    def socket(self) -> zmq.Socket:
+        """
+        The socket of the transport. A REQ socket is replaced after a timeout.
+        """
+        return self._transport.socket
 
     def get_idn(self) -> dict[str, Optional[str]]:
         """
@@ -106,43 +215,253 @@ class ZMQInstrument(Instrument):
             return None
 
     def _set_zmq_timeout(self, timeout: Union[float, None]) -> None:
-        if timeout is None:
-            self.socket.setsockopt(zmq.RCVTIMEO, -1)
-            self.socket.setsockopt(zmq.SNDTIMEO, -1)
-        else:
-            self.socket.setsockopt(zmq.RCVTIMEO, int(timeout * 1000))
-            self.socket.setsockopt(zmq.SNDTIMEO, int(timeout * 1000))
+        self._transport.set_timeout(timeout)
         self._timeout = timeout
 
     def _get_zmq_timeout(self) -> Union[float, None]:
-        timeout = self.socket.getsockopt(zmq.RCVTIMEO)
-        if timeout == -1:
-            return None
-        else:
-            return timeout / 1000.0
+        return self._transport.timeout
+
+    def _submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """
+        Runs fn in this instrument's background workers and returns its future.
+        With the default single worker, jobs of one instrument run one after
+        the other.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._worker_threads, thread_name_prefix=f"{self.name}_worker")
+        return self._executor.submit(fn, *args, **kwargs)
+
+    @property
+    def telemetry(self) -> Telemetry:
+        """
+        Latest values and recent history of the readings recorded by the
+        telemetry subscriber and poller of this instrument.
+        """
+        if self._telemetry is None:
+            self._telemetry = Telemetry()
+        return self._telemetry
+
+    def subscribe_telemetry(self, address: str, topics: Sequence[str] = ('',)) -> None:
+        """
+        Records the samples of a server-side PUB stream in the background.
+
+        Samples named like a parameter of this instrument, e.g. temperature
+        or drain_X, are recorded under its full name and update its cache,
+        so get_latest() returns them without a round trip. Other samples are
+        recorded under their own name.
+
+        Args:
+            address: The address of the PUB socket.
+            topics: The topic prefixes to subscribe to, all by default.
+        """
+        subscriber = TelemetrySubscriber(self.context, address, self._record_telemetry, topics)
+        self._telemetry_threads.append(subscriber)
+        subscriber.start()
+
+    def start_telemetry_poller(self, parameters: Optional[Sequence[Any]] = None,
+                               interval: float = 1) -> None:
+        """
+        Reads parameters every interval seconds in the background and records them.
+
+        Monitors can then use get_latest() or the telemetry history instead
+        of querying the instrument themselves.
+
+        Args:
+            parameters: The parameters to read, by object or attribute name
+                (e.g. 'drain_X'). Every gettable parameter of the instrument
+                itself except IDN and commands if None. They are recorded
+                under their full names.
+            interval: Seconds between readings.
+        """
+        if parameters is None:
+            parameters = [p for name, p in self.parameters.items()
+                          if p.gettable and name not in ('IDN', 'commands')]
+        parameters = [getattr(self, p) if isinstance(p, str) else p for p in parameters]
+        poller = TelemetryPoller(parameters, self.telemetry, interval)
+        self._telemetry_threads.append(poller)
+        poller.start()
+
+    def stop_telemetry(self) -> None:
+        """Stops the telemetry subscriber and poller threads."""
+        threads, self._telemetry_threads = self._telemetry_threads, []
+        for thread in threads:
+            thread.stop()
+        for thread in threads:
+            thread.join(timeout=5)
+
+    def _record_telemetry(self, name: str, value: Any, timestamp: float) -> None:
+        # Channel parameters (drain_X) are attributes, not entries of self.parameters
+        parameter = getattr(self, name, None)
+        if not isinstance(parameter, ParameterBase):
+            self.telemetry.record(name, value, timestamp)
+            return
+        self.telemetry.record(parameter.full_name, value, timestamp)
+        try:
+            parameter.cache.set(value)
+        except Exception as e:
+            self.log.debug("Telemetry value %r rejected by %s: %s", value, name, e)
 
     def close(self) -> None:
         """Disconnect and irreversibly tear down the instrument."""
         print('Closing server connection...')  
         try:   
-            if getattr(self, 'socket', None):
-                self.socket.close()
-                self.context.term()
+            if getattr(self, '_telemetry_threads', None):
+                self.stop_telemetry()
+            if getattr(self, '_executor', None):
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            if getattr(self, '_transport', None):
+                self._transport.close()
+                context, self.context = self.context, None
+                if context is not None:
+                    release_context(context)
             super().close()
         except:
             self.log.info('Could not close connection to server, perhaps the '
                           'server is down?')
     
-    def _send_command(self, cmd: str, params: dict = {}, *args: Any) -> str:
-        command: dict = {"jsonrpc": "2.0", 
-            "method": cmd,
-            "params": params,
-            "id": str(int(time.time()))} 
-        cmd: str = json.dumps(command)
-        response = self.ask_raw(cmd)
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Sends the commands issued inside the block as one JSON-RPC batch.
+
+        Inside the block _send_command queues its command and returns a
+        Future instead of the response; the futures get their responses when
+        the batch reply arrives at the end of the block. Setters therefore
+        work unchanged, while getters would return futures and should stay
+        outside. Nested blocks join the outermost one. If the block raises,
+        nothing is sent and the futures are cancelled.
+
+        E.g.
+            with lockin.batch():
+                lockin.source_Amp(0.1)
+                lockin.source_Freq(17.77)
+        """
+        if getattr(self._batch, 'commands', None) is not None:
+            yield
+            return
+        commands: list[tuple[dict, Future]] = []
+        self._batch.commands = commands
+        try:
+            yield
+        except BaseException:
+            for _, future in commands:
+                future.cancel()
+            raise
+        finally:
+            self._batch.commands = None
+        if commands:
+            self._send_batch(commands)
+
+    def _send_batch(self, commands: list[tuple[dict, Future]]) -> None:
+        request_ids = [command["id"] for command, _ in commands]
+        try:
+            start = time.perf_counter()
+            payload = self._codec.dumps([command for command, _ in commands])
+            self.metrics.observe_encode(time.perf_counter() - start, len(payload))
+            responses = self._request('batch', payload, request_id=request_ids)
+        except BaseException as e:
+            for _, future in commands:
+                future.set_exception(e)
+            raise
+        if not isinstance(responses, list):
+            error = RuntimeError(f"Batch request failed: {responses}")
+            for _, future in commands:
+                future.set_exception(error)
+            raise error
+        by_id = {str(response.get("id")): response for response in responses
+                 if isinstance(response, dict)}
+        for command, future in commands:
+            if command["id"] in by_id:
+                future.set_result(by_id[command["id"]])
+            else:
+                future.set_exception(RuntimeError(
+                    f"No response to batched request {command['id']} ({command['method']})"))
+
+    def _send_command(self, cmd: str, params: dict = {}, *args: Any, binary: bool = False) -> str:
+        request_id = self._requests.next_id()
+        commands = getattr(self._batch, 'commands', None)
+        if commands is not None:
+            command: dict = {"jsonrpc": "2.0",
+                "method": cmd,
+                "params": params,
+                "id": request_id}
+            future: Future = Future()
+            commands.append((command, future))
+            return future
+        binary = binary and self._binary_arrays
+        payload = self._encode_command(cmd, params, request_id, binary)
+        return self._request(cmd, payload, binary=binary, request_id=request_id)
+
+    def _encode_command(self, method: str, params: Any, request_id: str,
+                        binary: bool = False) -> bytes:
+        """
+        Returns the JSON-RPC request as bytes. Commands without params are
+        built from a cached template, everything else goes through the codec.
+        """
+        start = time.perf_counter()
+        if isinstance(params, dict) and not params:
+            template = self._templates.get((method, binary))
+            if template is None:
+                template = self._templates[method, binary] = self._command_template(method,
+                                                                                    binary)
+            # Request ids are decimal strings and never need escaping
+            payload = b'%s%s"}' % (template, request_id.encode())
+        else:
+            command: dict = {"jsonrpc": "2.0", "method": method, "params": params,
+                             "id": request_id}
+            if binary:
+                command["encoding"] = "binary"
+            payload = self._codec.dumps(command)
+        self.metrics.observe_encode(time.perf_counter() - start, len(payload))
+        return payload
+
+    def _command_template(self, method: str, binary: bool) -> bytes:
+        command: dict = {"jsonrpc": "2.0", "method": method, "params": {}}
+        if binary:
+            command["encoding"] = "binary"
+        # Drop the closing brace and leave the id value open
+        return self._codec.dumps(command)[:-1] + b',"id":"'
+
+    def _request(self, method: str, payload: bytes, binary: bool = False,
+                 request_id: Union[str, Sequence[str], None] = None) -> Any:
+        """
+        Sends an encoded request with ask_raw, retrying as configured, and
+        records the metrics of the round trip under method.
+        """
+        sent = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                response = self.ask_raw(payload, binary=binary, request_id=request_id)
+                break
+            except zmq.Again:
+                self.metrics.count_timeout(method)
+                if attempt >= self._retries_for(method):
+                    if attempt:
+                        self.log.warning("No reply to %s after %d retries, not retrying "
+                                         "until the server answers again", method, attempt)
+                        self._server_down = True
+                    raise
+            backoff = self.zmq_retry_backoff() * 2 ** attempt
+            attempt += 1
+            self.log.warning("No reply to %s within %s s, retry %d in %.3g s",
+                             method, self._timeout, attempt, backoff)
+            self.metrics.count_retry(method)
+            time.sleep(backoff)
+            sent = time.perf_counter()
+        self._server_down = False
+        self.metrics.observe_request(method, time.perf_counter() - sent)
         return response
 
-    def write_raw(self, cmd: str) -> None:
+    def _retries_for(self, method: str) -> int:
+        if self._server_down:
+            return 0
+        if self.zmq_lazy_pirate() or method.startswith(self._idempotent_prefixes):
+            return self.zmq_retries()
+        return 0
+
+    def write_raw(self, cmd: Union[str, bytes]) -> None:
         """
         Low-level interface to send a command to the ZMQ socket.
 
@@ -150,23 +469,24 @@ class ZMQInstrument(Instrument):
             cmd: The command to send to the instrument.
         """
         with DelayedKeyboardInterrupt():
-            self.zmq_log.debug(f"Writing: {cmd}")
-            self.socket.send_string(cmd)
+            self.zmq_log.debug("Writing: %s", cmd)
+            self._transport.send(cmd)
 
-    def ask_raw(self, cmd: str) -> str:
+    def ask_raw(self, cmd: Union[str, bytes], binary: bool = False,
+                request_id: Optional[str] = None) -> str:
         """
         Low-level interface to send a command to the ZMQ socket and receive a response.
 
         Args:
             cmd: The command to send to the instrument.
+            binary: Accept a multipart reply with raw array frames.
+            request_id: The JSON-RPC id of cmd, read from cmd if not given.
 
         Returns:
             str: The instrument's response.
         """
         with DelayedKeyboardInterrupt():
-            self.zmq_log.debug(f"Querying: {cmd}")
-            self.socket.send_string(cmd)
-            response = self.socket.recv_string()
-            self.zmq_log.debug(f"Response: {response}")
-            response: dict = json.loads(response)
+            self.zmq_log.debug("Querying: %s", cmd)
+            response: dict = self._transport.request(cmd, request_id, binary)
+            self.zmq_log.debug("Response: %s", response)
         return response
\ No newline at end of file
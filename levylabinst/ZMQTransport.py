@@ -0,0 +1,431 @@
+"""Socket transports used by ZMQInstrument."""
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import zmq
+import numpy as np
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional, Sequence, Union
+
+from .Codec import Codec
+
+if TYPE_CHECKING:
+    from .Metrics import Metrics
+
+# Parses replies when the caller doesn't pass a codec of its own
+_STDLIB_CODEC = Codec()
+
+log = logging.getLogger(__name__)
+
+# How long a waiting thread polls the DEALER socket before letting others in
+_POLL_SLICE_MS = 5
+
+# Process-wide context shared by all instruments, see acquire_context
+_context_lock = threading.Lock()
+_context: Optional[zmq.Context] = None
+_context_users = 0
+_io_threads = 1
+
+
+def configure_context(io_threads: int) -> None:
+    """
+    Sets the number of ZMQ I/O threads of the shared context.
+
+    The context is created with this setting when the first instrument
+    opens; while instruments are open the change waits until all of them
+    are closed.
+    """
+    global _io_threads
+    if io_threads < 1:
+        raise ValueError(f"io_threads must be at least 1, got {io_threads}")
+    with _context_lock:
+        _io_threads = io_threads
+        if _context is not None:
+            log.warning("The shared ZMQ context is in use, io_threads=%d applies once "
+                        "all instruments are closed", io_threads)
+
+
+def acquire_context() -> zmq.Context:
+    """
+    Returns the process-wide ZMQ context, creating it for the first user.
+
+    Every call must be paired with release_context once the caller has
+    closed its sockets.
+    """
+    global _context, _context_users
+    with _context_lock:
+        if _context is None:
+            _context = zmq.Context(io_threads=_io_threads)
+        _context_users += 1
+        return _context
+
+
+def release_context(context: zmq.Context) -> None:
+    """
+    Gives back a context from acquire_context and terminates the shared
+    context when its last user is gone. Contexts inherited across fork are
+    ignored, they belong to the parent process.
+    """
+    global _context, _context_users
+    with _context_lock:
+        if context is not _context:
+            return
+        _context_users -= 1
+        if _context_users > 0:
+            return
+        _context = None
+    context.term()
+
+
+def _forget_context_after_fork() -> None:
+    # The parent's context and its I/O threads don't exist in the child, and
+    # terminating it there could hang, so the child starts a context of its own
+    global _context, _context_lock, _context_users
+    _context_lock = threading.Lock()
+    _context = None
+    _context_users = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_context_after_fork)
+
+
+def encode_binary_frames(response: Any) -> list:
+    """
+    Splits a JSON-RPC response into a JSON header and raw array frames.
+
+    Every NumPy array in the response is replaced in the header by a
+    {"$frame": i, "dtype": ..., "shape": [...]} marker, and its bytes are sent
+    as frame i + 1 of the multipart message.
+
+    Args:
+        response: The response object, possibly containing NumPy arrays.
+
+    Returns:
+        list: The frames of the multipart reply, header first.
+    """
+    buffers: list = []
+
+    def strip(obj: Any) -> Any:
+        if isinstance(obj, np.ndarray):
+            buffers.append(np.ascontiguousarray(obj))
+            return {"$frame": len(buffers) - 1,
+                    "dtype": obj.dtype.str,
+                    "shape": list(obj.shape)}
+        if isinstance(obj, dict):
+            return {key: strip(value) for key, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [strip(value) for value in obj]
+        return obj
+
+    header = json.dumps(strip(response)).encode()
+    return [header, *buffers]
+
+
+def decode_binary_frames(frames: Sequence[Any],
+                         loads: Callable[[Any], Any] = _STDLIB_CODEC.loads) -> Any:
+    """
+    Rebuilds a response sent by encode_binary_frames.
+
+    The arrays are wrapped around the received frames with np.frombuffer, so
+    no copy is made and they are read-only.
+
+    Args:
+        frames: The received frames (bytes or zmq.Frame), header first.
+        loads: Parses the JSON header.
+
+    Returns:
+        The response with every frame marker replaced by its array.
+    """
+    header = frames[0]
+    header = loads(header.buffer if isinstance(header, zmq.Frame) else header)
+    buffers = frames[1:]
+
+    def restore(obj: Any) -> Any:
+        if isinstance(obj, dict):
+            if "$frame" in obj:
+                array = np.frombuffer(buffers[obj["$frame"]], dtype=obj.get("dtype", "<f8"))
+                return array.reshape(obj["shape"]) if "shape" in obj else array
+            return {key: restore(value) for key, value in obj.items()}
+        if isinstance(obj, list):
+            return [restore(value) for value in obj]
+        return obj
+
+    return restore(header)
+
+
+def decode_reply(frames: Sequence[Any], metrics: Optional['Metrics'] = None,
+                 codec: Codec = _STDLIB_CODEC) -> Any:
+    """
+    Decodes a reply that is either one JSON frame or a binary multipart message.
+
+    Args:
+        frames: The frames of the reply, bytes or zmq.Frame.
+        metrics: Records the decode time and reply size, if given.
+        codec: Parses the JSON.
+    """
+    start = time.perf_counter()
+    if len(frames) == 1:
+        frame = frames[0]
+        response = codec.loads(frame.buffer if isinstance(frame, zmq.Frame) else frame)
+    else:
+        response = decode_binary_frames(frames, codec.loads)
+    if metrics is not None:
+        metrics.observe_decode(time.perf_counter() - start,
+                               sum(len(frame) for frame in frames))
+    return response
+
+
+class RequestTracker:
+    """
+    Hands out JSON-RPC request ids and matches responses to their requests.
+
+    Ids come from a counter, so they are unique and increasing for the life
+    of the tracker. Transports that keep several requests in flight register
+    a future per id and resolve it when the response with that id arrives;
+    lockstep transports only check that the one response they get answers
+    the request they sent.
+    """
+
+    def __init__(self) -> None:
+        self._ids = itertools.count(1)
+        self._pending: dict[str, Future] = {}
+
+    def next_id(self) -> str:
+        return str(next(self._ids))
+
+    def register(self, request_id: str, future: Optional[Any] = None) -> Future:
+        """
+        Returns the future that the response to request_id will be handed to.
+
+        Args:
+            request_id: The id of the request.
+            future: The future to use, e.g. an asyncio one. A new
+                concurrent.futures.Future by default.
+        """
+        if future is None:
+            future = Future()
+        self._pending[str(request_id)] = future
+        return future
+
+    def discard(self, request_id: str) -> None:
+        """
+        Forgets a request, e.g. after a timeout. Its response will be dropped.
+        """
+        self._pending.pop(str(request_id), None)
+
+    def fail(self, request_ids: Iterable[str], error: BaseException) -> None:
+        """
+        Fails the futures of request_ids that are still pending, e.g. when
+        their responses can no longer arrive.
+        """
+        for request_id in list(request_ids):
+            future = self._pending.pop(str(request_id), None)
+            if future is not None and not future.done():
+                future.set_exception(error)
+
+    def resolve(self, response: Any) -> bool:
+        """
+        Hands a response, or each response of a batch, to the future of its request.
+
+        Returns:
+            bool: False if no pending request has the response's id.
+        """
+        if isinstance(response, list):
+            return any([self.resolve(item) for item in response])
+        request_id = response.get("id") if isinstance(response, dict) else None
+        future = self._pending.pop(str(request_id), None)
+        if future is None or future.done():
+            log.debug("Dropping reply to unknown or expired request %s", request_id)
+            return False
+        future.set_result(response)
+        return True
+
+    @staticmethod
+    def check(response: Any, request_id: Union[str, Sequence[str], None]) -> None:
+        """
+        Raises if a response carries an id other than the one of its request.
+        Responses without id (e.g. parse errors) can't be checked and pass.
+        Batches are matched by their callers, since the server may answer
+        them in any order.
+        """
+        if not isinstance(request_id, str) or not isinstance(response, dict):
+            return
+        response_id = response.get("id")
+        if response_id is not None and str(response_id) != str(request_id):
+            raise RuntimeError(f"Response id {response_id!r} does not match "
+                               f"request id {request_id!r}")
+
+
+class ReqTransport:
+    """
+    Classic REQ socket: one request in flight, send and receive in lockstep.
+
+    A REQ socket that missed a reply refuses to send again, so after a
+    timeout or any other socket error the socket is closed without lingering
+    and a fresh one connected, ready for the next request (the lazy pirate
+    pattern). The failed request is not sent again here; retries are up to
+    the caller.
+
+    Args:
+        context: The ZMQ context to create the socket in.
+        address: The ZMQ resource name to connect to.
+        timeout: Seconds to allow for responses, None waits forever.
+        tracker: Checks that each response answers its request.
+        metrics: Records decode times and reply sizes, if given.
+        codec: Parses the replies. The standard library json by default.
+    """
+
+    def __init__(self, context: zmq.Context, address: str, timeout: Optional[float],
+                 tracker: RequestTracker, metrics: Optional['Metrics'] = None,
+                 codec: Codec = _STDLIB_CODEC) -> None:
+        self.tracker = tracker
+        self.metrics = metrics
+        self.codec = codec
+        self.context = context
+        self.address = address
+        self.timeout = timeout
+        self.socket = self._connect()
+        # The REQ socket is not thread safe and needs send/recv in lockstep,
+        # so every round trip holds this lock.
+        self._lock = threading.RLock()
+
+    def _connect(self) -> zmq.Socket:
+        socket = self.context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.address)
+        self.socket = socket
+        self.set_timeout(self.timeout)
+        return socket
+
+    def reset(self) -> None:
+        """
+        Replaces the socket with a new one, dropping the request in flight.
+        """
+        with self._lock:
+            self.socket.close(linger=0)
+            self._connect()
+        log.info("Reconnected REQ socket to %s", self.address)
+
+    def set_timeout(self, timeout: Optional[float]) -> None:
+        timeout_ms = -1 if timeout is None else int(timeout * 1000)
+        self.socket.setsockopt(zmq.RCVTIMEO, timeout_ms)
+        self.socket.setsockopt(zmq.SNDTIMEO, timeout_ms)
+        self.timeout = timeout
+
+    def send(self, payload: Union[bytes, str]) -> None:
+        with self._lock:
+            try:
+                self.socket.send(_as_bytes(payload))
+            except zmq.ZMQError:
+                self.reset()
+                raise
+
+    def request(self, payload: Union[bytes, str], request_id: Optional[str] = None,
+                binary: bool = False) -> Any:
+        with self._lock:
+            try:
+                self.socket.send(_as_bytes(payload))
+                if binary:
+                    frames = self.socket.recv_multipart(copy=False)
+                else:
+                    frames = [self.socket.recv()]
+            except zmq.ZMQError:
+                self.reset()
+                raise
+            response = decode_reply(frames, self.metrics, self.codec)
+        self.tracker.check(response, request_id)
+        return response
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+class DealerTransport:
+    """
+    DEALER socket that lets several threads have requests in flight at once.
+
+    Replies are matched to their requests by JSON-RPC id. A thread waiting for
+    its reply takes turns with the other waiters reading the socket and hands
+    every reply it reads to the request it belongs to. A request that times
+    out is simply forgotten: its late reply is dropped when it arrives, so the
+    socket never gets stuck the way a REQ socket does.
+
+    Args:
+        context: The ZMQ context to create the socket in.
+        address: The ZMQ resource name to connect to.
+        timeout: Seconds to allow for responses, None waits forever.
+        tracker: Matches the responses to the pending requests.
+        metrics: Records decode times and reply sizes, if given.
+        codec: Parses the replies. The standard library json by default.
+    """
+
+    def __init__(self, context: zmq.Context, address: str, timeout: Optional[float],
+                 tracker: RequestTracker, metrics: Optional['Metrics'] = None,
+                 codec: Codec = _STDLIB_CODEC) -> None:
+        self.tracker = tracker
+        self.metrics = metrics
+        self.codec = codec
+        self.socket = context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(address)
+        self.set_timeout(timeout)
+        self._socket_lock = threading.Lock()
+
+    def set_timeout(self, timeout: Optional[float]) -> None:
+        self.socket.setsockopt(zmq.SNDTIMEO, -1 if timeout is None else int(timeout * 1000))
+        self.timeout = timeout
+
+    def send(self, payload: Union[bytes, str]) -> None:
+        # The empty delimiter frame makes the DEALER look like REQ to a REP server
+        with self._socket_lock:
+            self.socket.send_multipart([b"", _as_bytes(payload)])
+
+    def request(self, payload: Union[bytes, str],
+                request_id: Union[str, Sequence[str], None] = None,
+                binary: bool = False) -> Any:
+        if request_id is None:
+            command = self.codec.loads(payload)
+            request_id = ([item["id"] for item in command] if isinstance(command, list)
+                          else command["id"])
+        # A batch waits for the responses to all of its ids
+        request_ids = [request_id] if isinstance(request_id, str) else list(request_id)
+        futures = [self.tracker.register(i) for i in request_ids]
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        try:
+            self.send(payload)
+            for future in futures:
+                self._wait(future, deadline)
+        finally:
+            for i in request_ids:
+                self.tracker.discard(i)
+        if isinstance(request_id, str):
+            return futures[0].result()
+        return [future.result() for future in futures]
+
+    def _wait(self, future: Future, deadline: Optional[float]) -> None:
+        while not future.done():
+            if deadline is not None and time.monotonic() >= deadline:
+                raise zmq.Again()
+            with self._socket_lock:
+                if future.done():
+                    break
+                if self.socket.poll(_POLL_SLICE_MS, zmq.POLLIN):
+                    self._dispatch(self.socket.recv_multipart())
+
+    def _dispatch(self, frames: list) -> None:
+        while frames and not frames[0]:
+            frames = frames[1:]
+        if not frames:
+            return
+        self.tracker.resolve(decode_reply(frames, self.metrics, self.codec))
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+def _as_bytes(payload: Union[bytes, str]) -> bytes:
+    return payload.encode() if isinstance(payload, str) else payload
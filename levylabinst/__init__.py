@@ -1,14 +1,77 @@
 # levylabinst package
+#
+# The drivers are imported on first use (PEP 562), so `import levylabinst`
+# stays cheap and free of side effects on headless nodes and in workers.
+import sys
+from importlib import import_module
+from types import ModuleType
+from typing import TYPE_CHECKING, Any
 
-print("Initializing LevyLab Drivers...")
+if TYPE_CHECKING:
+    from .ZMQInstrument import ZMQInstrument
+    from .AsyncZMQInstrument import AsyncZMQInstrument
+    from .PPMSSim import PPMSSim, AsyncPPMSSim
+    from .MCLockin import MCLockin, AsyncMCLockin
+    from .MCLockin2 import MCLockin2
+    from .DataSaverStream import DataSaverStream
+    from .Metrics import Metrics, serve_metrics
+    from .ZMQTransport import configure_context
+    from .RemoteInstrument import RemoteInstrument, prefetch
 
-from .ZMQInstrument import ZMQInstrument 
-from .PPMSSim import PPMSSim
-from .MCLockin import MCLockin
-from .MCLockin2 import MCLockin2
+# Public name -> submodule that defines it
+_LAZY_IMPORTS = {
+    "ZMQInstrument": "ZMQInstrument",
+    "AsyncZMQInstrument": "AsyncZMQInstrument",
+    "PPMSSim": "PPMSSim",
+    "AsyncPPMSSim": "PPMSSim",
+    "MCLockin": "MCLockin",
+    "AsyncMCLockin": "MCLockin",
+    "MCLockin2": "MCLockin2",
+    "DataSaverStream": "DataSaverStream",
+    "Metrics": "Metrics",
+    "serve_metrics": "Metrics",
+    "configure_context": "ZMQTransport",
+    "RemoteInstrument": "RemoteInstrument",
+    "prefetch": "RemoteInstrument",
+}
 
 __all__ = [
     "ZMQInstrument",
+    "AsyncZMQInstrument",
     "PPMSSim",
-    "MCLockin"
+    "AsyncPPMSSim",
+    "MCLockin",
+    "AsyncMCLockin",
+    "DataSaverStream",
+    "Metrics",
+    "serve_metrics",
+    "configure_context",
+    "RemoteInstrument",
+    "prefetch",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
+
+
+class _Package(ModuleType):
+    # Importing a submodule binds it on the package under its own name, which
+    # would hide the class of that name. Bind the class instead; the modules
+    # stay reachable with `from levylabinst.MCLockin import ...`.
+    def __setattr__(self, name: str, value: Any) -> None:
+        if isinstance(value, ModuleType) and _LAZY_IMPORTS.get(name) == name:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
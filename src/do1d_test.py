@@ -59,6 +59,15 @@ jobs = bg.BackgroundJobManager()
 # %% do1d Measurement
 do1d(lockin.gate_DC, 0, 0.1, 500, 0.01, lockin.drain_X, measurement_name='do1d_measurement', exp=test_exp, write_period=0.1, show_progress=True, do_plot=True)
 
+# %% Buffered hardware sweep: the lock-in sweeps the gate, Python only loops the field
+lockin.sweep_channel(2)
+lockin.sweep_start(0)
+lockin.sweep_stop(0.1)
+lockin.sweep_time(10)
+lockin.sweep_npts(500)
+ppms.field_rate(0.1)
+dond(LinSweep(ppms.field_target, 0, 0.1, 2), lockin.drain_X_sweep, measurement_name='buffered_sweep', exp=test_exp, show_progress=True, do_plot=True)
+
 # %% Explore Experiments and Datasets
 experiments()
 test_exp.data_sets()
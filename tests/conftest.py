@@ -0,0 +1,105 @@
+"""Fixtures shared by the driver tests."""
+import json
+import socket
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+import pytest
+import zmq
+
+from levylabinst.SimServer import SimServer
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "sim_server(**options): SimServer options of the sim_server fixture")
+
+
+class StandInServer:
+    """
+    JSON-RPC server on a free local port that answers from a dict of handlers.
+
+    A handler takes the params of a request and returns its result; methods
+    without a handler get a "Method not found" error, and a handler that
+    raises ValueError an "Invalid params" error. JSON-RPC batches get one
+    response per request. Requests are counted by method in calls and
+    listed in order in methods.
+    """
+
+    def __init__(self) -> None:
+        self.handlers: Dict[str, Callable[[Any], Any]] = {}
+        self.calls: Counter = Counter()
+        self.methods: List[str] = []
+        self._stop = threading.Event()
+        self.socket = zmq.Context.instance().socket(zmq.REP)
+        self.address = f"tcp://127.0.0.1:{self.socket.bind_to_random_port('tcp://127.0.0.1')}"
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self) -> None:
+        while not self._stop.is_set():
+            if not self.socket.poll(20):
+                continue
+            request = json.loads(self.socket.recv())
+            if isinstance(request, list):
+                response = [self._handle(item) for item in request]
+            else:
+                response = self._handle(request)
+            self.socket.send_string(json.dumps(response))
+        self.socket.close(linger=0)
+
+    def _handle(self, request: dict) -> dict:
+        method = request["method"]
+        self.calls[method] += 1
+        self.methods.append(method)
+        if method not in self.handlers:
+            return {"jsonrpc": "2.0", "id": request["id"],
+                    "error": {"code": -32601, "message": f"Method not found: {method}"}}
+        try:
+            result = self.handlers[method](request.get("params"))
+        except ValueError as e:
+            return {"jsonrpc": "2.0", "id": request["id"],
+                    "error": {"code": -32602, "message": f"Invalid params: {e}"}}
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+
+@pytest.fixture
+def stand_in_server():
+    server = StandInServer()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def sim_server(request):
+    """SimServer on a free local port, with the options of the sim_server marker."""
+    marker = request.node.get_closest_marker("sim_server")
+    with SimServer(**(marker.kwargs if marker else {})) as server:
+        yield server
+
+
+@pytest.fixture
+def free_address():
+    """A local address that nothing listens on, for instruments that send nothing."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return f"tcp://127.0.0.1:{probe.getsockname()[1]}"
+
+
+@pytest.fixture
+def open_instrument():
+    """Opens instruments as cls(*args, **kwargs) and closes them after the test."""
+    instruments = []
+
+    def open_(cls, *args, **kwargs):
+        instruments.append(cls(*args, **kwargs))
+        return instruments[-1]
+
+    yield open_
+    for inst in reversed(instruments):
+        inst.close()
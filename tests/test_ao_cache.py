@@ -0,0 +1,93 @@
+"""AO setting cache of MCLockin against a local stand-in server."""
+import pytest
+
+from levylabinst.MCLockin import MCLockin
+
+AO_CONFIG = [{"AO Channel": channel, "Amplitude (V)": 0.1, "DC (V)": 0.0,
+              "Frequency (Hz)": 17.0, "Phase (deg)": 0.0, "Function": "Sine"}
+             for channel in (1, 2, 3, 4)]
+
+
+@pytest.fixture
+def server(stand_in_server):
+    # Values the server answers with a JSON-RPC error
+    stand_in_server.rejected = set()
+
+    def set_dc(params):
+        if params["DC (V)"] in stand_in_server.rejected:
+            raise ValueError(params["DC (V)"])
+        return "ok"
+
+    stand_in_server.handlers.update({"getAOConfig": lambda params: {"AO Config": AO_CONFIG},
+                                     "setAO_DC": set_dc, "setState": lambda params: "ok"})
+    return stand_in_server
+
+
+@pytest.fixture
+def lockin(server, open_instrument):
+    return open_instrument(MCLockin, "ao_lockin", server.address, config={"gate": 2}, timeout=2)
+
+
+def test_getters_are_seeded_from_one_config_read(lockin, server):
+    assert lockin.gate_Freq() == 17.0
+    assert lockin.gate.Function() == "Sine"
+    assert server.methods == ["getAOConfig"]
+
+
+def test_unchanged_sets_are_skipped(lockin, server):
+    for value in (0.0, 0.5, 0.5, 0.5 + 1e-12, 0.6):
+        lockin.gate_DC(value)
+    lockin.gate_Function("Sine")
+    assert server.methods == ["getAOConfig", "setAO_DC", "setAO_DC"]
+    assert lockin.gate_DC() == 0.6
+
+    lockin.ao_skip_unchanged(False)
+    lockin.gate_DC(0.6)
+    assert server.methods[-1] == "setAO_DC"
+
+
+def test_sweeps_invalidate_the_cache(lockin, server):
+    lockin.gate_DC(0.5)
+    lockin.state("start sweep")
+    lockin.gate_DC(0.5)
+    assert server.methods[-2:] == ["getAOConfig", "setAO_DC"]
+
+
+def test_batched_sets_are_written_through(lockin, server):
+    with lockin.batch():
+        lockin.gate_DC(0.5)
+    assert server.methods == ["setAO_DC"]
+
+
+def test_failed_batches_leave_the_cache_alone(lockin, server):
+    lockin.gate_DC(0.2)
+    with pytest.raises(ValueError):
+        with lockin.batch():
+            lockin.gate_DC(0.7)
+            raise ValueError("abort")
+    assert lockin.gate_DC() == 0.2
+    lockin.gate_DC(0.7)
+    assert server.methods[-1] == "setAO_DC"
+
+
+def test_rejected_sets_are_not_cached(lockin, server):
+    server.rejected.add(0.9)
+    lockin.gate_DC(0.9)
+    # Invalidated, so the next get reads the config again
+    assert lockin.gate_DC() == 0.0
+    assert server.methods[-1] == "getAOConfig"
+
+    with lockin.batch():
+        lockin.gate_DC(0.9)
+    assert lockin.gate_DC() == 0.0
+    assert server.methods[-2:] == ["setAO_DC", "getAOConfig"]
+
+
+def test_a_rejected_config_read_is_not_repeated(lockin, server):
+    del server.handlers["getAOConfig"]
+    assert lockin.gate_DC() is None
+    lockin.gate_DC(0.5)
+    lockin.invalidate_ao_cache()
+    lockin.gate_DC()
+    lockin.gate_DC(0.6)
+    assert server.methods == ["getAOConfig", "setAO_DC", "setAO_DC"]
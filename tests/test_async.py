@@ -0,0 +1,146 @@
+"""AsyncZMQInstrument, AsyncPPMSSim and AsyncMCLockin on one event loop."""
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+import zmq
+
+from levylabinst.AsyncZMQInstrument import AsyncZMQInstrument
+from levylabinst.MCLockin import AsyncMCLockin
+from levylabinst.PPMSSim import AsyncPPMSSim
+
+POINTS = 100
+
+
+@pytest.fixture
+def server(stand_in_server):
+    state = {"lockin": "idle", "temperature": 300.0, "target": 300.0}
+    sweep = {}
+
+    def set_state(params):
+        state["lockin"] = "sweeping" if params == "start sweep" else "running"
+
+    def get_status(params):
+        status = state["lockin"]
+        if status == "sweeping":
+            # The sweep is over once it was seen running
+            state["lockin"] = "running"
+        return status
+
+    def get_waveforms(params):
+        channel = sweep["Channels"][0]
+        ao = np.linspace(channel["Start"], channel["End"], POINTS)
+        return {"AO_wfm": [{"Y": ao.tolist()}] * 4, "X_wfm": [{"Y": np.tanh(2 * ao).tolist()}] * 4}
+
+    def get_temperature(params):
+        # Every reading steps half a kelvin towards the target
+        step = np.clip(state["target"] - state["temperature"], -0.5, 0.5)
+        state["temperature"] += step
+        return {"Temperature (K)": state["temperature"],
+                "Temperature Status": "Stable" if step == 0 else "Ramping"}
+
+    def set_temperature(params):
+        state["target"] = params["Temperature (K)"]
+
+    stand_in_server.handlers.update({
+        "getStatus": get_status,
+        "setState": set_state,
+        "setSweep": sweep.update,
+        "getSweepWaveforms": get_waveforms,
+        "Get Temperature": get_temperature,
+        "Set Temperature": set_temperature,
+        "Get Magnet": lambda params: {"Field (T)": 0.0, "Magnet Status": "Holding"},
+    })
+    return stand_in_server
+
+
+@pytest.fixture
+def lockin(server, open_instrument):
+    return open_instrument(AsyncMCLockin, "async_lockin", server.address, config={"gate": 2},
+                           timeout=2)
+
+
+@pytest.fixture
+def ppms(server, open_instrument):
+    inst = open_instrument(AsyncPPMSSim, "async_ppms", server.address, timeout=2)
+    inst.ramp_poll_interval((0.01, 0.05))
+    return inst
+
+
+def test_concurrent_commands_get_their_own_replies(lockin):
+    async def main():
+        return await asyncio.gather(*(lockin.send_command("getStatus") for _ in range(20)),
+                                    lockin.send_command("noSuchMethod"))
+
+    *statuses, unknown = asyncio.run(main())
+    assert [status["result"] for status in statuses] == ["idle"] * 20
+    assert unknown["error"]["code"] == -32601
+    assert len({status["id"] for status in statuses}) == 20
+
+
+def test_ramp_and_sweep_side_by_side(lockin, ppms, server):
+    async def main():
+        return await asyncio.gather(ppms.aramp_temperature(301, 10),
+                                    lockin.asweep1d(2, 0, 1, 0.1, 2))
+
+    temperature, (ao, x) = asyncio.run(main())
+    assert temperature == pytest.approx(301)
+    assert server.calls["Get Temperature"] > 2
+    np.testing.assert_allclose(ao, np.linspace(0, 1, POINTS))
+    np.testing.assert_allclose(x, np.tanh(2 * ao))
+    # The blocking parameters still work next to the async socket
+    assert lockin.state() == "running"
+
+
+def test_event_loops_get_their_own_socket(lockin):
+    for _ in range(2):
+        assert asyncio.run(lockin.send_command("getStatus"))["result"] == "idle"
+
+
+def test_unreadable_replies_are_dropped():
+    router = zmq.Context.instance().socket(zmq.ROUTER)
+    address = f"tcp://127.0.0.1:{router.bind_to_random_port('tcp://127.0.0.1')}"
+
+    def serve():
+        for _ in range(2):
+            *route, payload = router.recv_multipart()
+            request = json.loads(payload)
+            for junk in (b"not json", b"42", b'{"result": "no id"}',
+                         b'{"id": "-1", "result": "unknown id"}'):
+                router.send_multipart([*route, junk])
+            reply = {"jsonrpc": "2.0", "result": "ok", "id": request["id"]}
+            router.send_multipart([*route, json.dumps(reply).encode()])
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    inst = AsyncZMQInstrument("junk_inst", address, timeout=2)
+
+    async def main():
+        return [(await inst.send_command("getStatus"))["result"] for _ in range(2)]
+
+    try:
+        assert asyncio.run(main()) == ["ok", "ok"]
+    finally:
+        inst.close()
+        thread.join(timeout=1)
+        router.close(linger=0)
+
+
+def test_a_dead_reader_fails_the_waiting_requests(lockin):
+    async def broken_recv(*args, **kwargs):
+        raise zmq.ZMQError(zmq.ENOTSOCK)
+
+    async def main():
+        lockin._get_async_socket().recv_multipart = broken_recv
+        with pytest.raises(RuntimeError):
+            await lockin.send_command("getStatus")
+        # The next command gets a new socket and reader
+        return await lockin.send_command("getStatus")
+
+    start = time.monotonic()
+    assert asyncio.run(main())["result"] == "idle"
+    # Failed right away, not after the 2 s timeout
+    assert time.monotonic() - start < 1
@@ -0,0 +1,58 @@
+"""JSON-RPC batches of ZMQInstrument.batch() against a local stand-in server."""
+import pytest
+import zmq
+
+from levylabinst.ZMQInstrument import ZMQInstrument
+
+
+@pytest.fixture
+def server(stand_in_server):
+    stand_in_server.dc = {}
+
+    def set_dc(params):
+        stand_in_server.dc[params["AO Channel"]] = params["DC (V)"]
+
+    stand_in_server.handlers.update({"setAO_DC": set_dc, "getStatus": lambda params: "idle"})
+    return stand_in_server
+
+
+@pytest.fixture
+def instrument(server, open_instrument):
+    return open_instrument(ZMQInstrument, "batch_inst", server.address, timeout=2)
+
+
+def test_commands_are_sent_as_one_batch(instrument, server):
+    with instrument.batch():
+        first = instrument._send_command("setAO_DC", {"AO Channel": 1, "DC (V)": 0.5})
+        with instrument.batch():
+            second = instrument._send_command("setAO_DC", {"AO Channel": 2, "DC (V)": 0.25})
+        assert not first.done() and not second.done()
+        unknown = instrument._send_command("noSuchMethod")
+    assert "result" in first.result() and "result" in second.result()
+    assert unknown.result()["error"]["code"] == -32601
+    assert server.dc == {1: 0.5, 2: 0.25}
+    assert server.calls["setAO_DC"] == 2
+
+
+def test_raising_block_cancels_the_futures(instrument, server):
+    with pytest.raises(ValueError):
+        with instrument.batch():
+            future = instrument._send_command("setAO_DC", {"AO Channel": 1, "DC (V)": 0.5})
+            raise ValueError("abort")
+    assert future.cancelled()
+    assert server.calls["setAO_DC"] == 0
+    # Outside the block commands go out on their own again
+    assert instrument._send_command("getStatus")["result"] == "idle"
+
+
+def test_failed_batch_fails_the_futures(server):
+    server.stop()
+    # A DEALER socket doesn't linger on the unanswered request when closed
+    inst = ZMQInstrument("batch_dead", server.address, timeout=0.2, transport="dealer")
+    try:
+        with pytest.raises(zmq.Again):
+            with inst.batch():
+                future = inst._send_command("getStatus")
+        assert future.exception() is not None
+    finally:
+        inst.close()
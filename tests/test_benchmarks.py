@@ -0,0 +1,99 @@
+"""
+Latency and throughput benchmarks of the drivers against SimServer.
+
+Run with pytest-benchmark installed, e.g.
+    python -m pytest tests/test_benchmarks.py --benchmark-only
+and compare runs with --benchmark-autosave / --benchmark-compare.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from qcodes.dataset import (LinSweep, dond, initialise_or_create_database_at,
+                            load_or_create_experiment)
+
+from levylabinst.MCLockin import MCLockin
+from levylabinst.PPMSSim import PPMSSim
+from levylabinst.SimServer import SimServer
+from levylabinst.ZMQInstrument import ZMQInstrument
+
+
+@pytest.fixture(scope="module")
+def server():
+    with SimServer(waveform_points=100_000, ramp_speedup=1e6) as server:
+        yield server
+
+
+@pytest.fixture(params=["req", "dealer"])
+def instrument(server, request):
+    inst = ZMQInstrument(f"bench_{request.param}", server.address, transport=request.param)
+    yield inst
+    inst.close()
+
+
+@pytest.fixture
+def lockin(server):
+    inst = MCLockin("bench_lockin", server.address, config={"drain": 1, "gate": 2},
+                    binary_arrays=True)
+    yield inst
+    inst.close()
+
+
+@pytest.fixture
+def ppms(server):
+    inst = PPMSSim("bench_ppms", server.address)
+    inst.status_max_age(0)
+    yield inst
+    inst.close()
+
+
+@pytest.fixture
+def experiment(tmp_path):
+    initialise_or_create_database_at(str(tmp_path / "bench.db"))
+    return load_or_create_experiment("benchmarks", sample_name="SimServer")
+
+
+@pytest.fixture
+def sweep(lockin):
+    ao, _ = lockin.sweep1d(1, 0, 1, 0, 1)
+    assert len(ao) == 100_000
+    return lockin
+
+
+def test_round_trip(benchmark, instrument):
+    response = benchmark(instrument._send_command, "getStatus")
+    assert "result" in response
+
+
+def test_lockin_get(benchmark, lockin):
+    lockin.drain_Amp(0.1)
+    assert benchmark(lockin.drain_X) == pytest.approx(0.1)
+
+
+def test_lockin_results(benchmark, lockin):
+    results = benchmark(lockin.results)
+    assert results[0].shape == (2,)
+
+
+def test_ppms_get(benchmark, ppms):
+    assert benchmark(ppms.temperature) == pytest.approx(300)
+
+
+def test_dond_per_point(benchmark, lockin, experiment):
+    def run():
+        return dond(LinSweep(lockin.gate_DC, 0, 1, 50), lockin.drain_X, lockin.drain_Y,
+                    exp=experiment, show_progress=False, do_plot=False)
+
+    dataset = benchmark.pedantic(run, rounds=5)[0]
+    benchmark.extra_info["points"] = 50
+    assert len(dataset.get_parameter_data()["bench_lockin_drain_X"]["bench_lockin_drain_X"]) == 50
+
+
+@pytest.mark.parametrize("binary", [False, True], ids=["json", "binary"])
+def test_waveform_decode(benchmark, sweep, binary):
+    sweep._binary_arrays = binary
+    waveforms = benchmark(sweep.getsweep)
+    benchmark.extra_info["points"] = 100_000 * 12
+    assert len(waveforms["X_wfm"][0]["Y"]) == 100_000
+    assert isinstance(waveforms["X_wfm"][0]["Y"], np.ndarray) == binary
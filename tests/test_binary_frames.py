@@ -0,0 +1,61 @@
+"""Binary waveform framing of ZMQInstrument against a local stand-in server."""
+import json
+import threading
+
+import numpy as np
+import pytest
+import zmq
+
+from levylabinst.ZMQInstrument import (ZMQInstrument, decode_binary_frames,
+                                       encode_binary_frames)
+
+WAVEFORM = np.linspace(0, 1, 10001)
+
+
+def _serve(socket: zmq.Socket, requests: int, binary_support: bool) -> None:
+    for _ in range(requests):
+        request = json.loads(socket.recv())
+        result = {"AO_wfm": [{"Y": WAVEFORM}], "X_wfm": [{"Y": 2 * WAVEFORM}]}
+        response = {"jsonrpc": "2.0", "result": result, "id": request["id"]}
+        if binary_support and request.get("encoding") == "binary":
+            socket.send_multipart(encode_binary_frames(response))
+        else:
+            result["AO_wfm"][0]["Y"] = WAVEFORM.tolist()
+            result["X_wfm"][0]["Y"] = (2 * WAVEFORM).tolist()
+            socket.send_string(json.dumps(response))
+
+
+@pytest.fixture(params=[True, False], ids=["binary_server", "json_server"])
+def server(request):
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.REP)
+    port = socket.bind_to_random_port("tcp://127.0.0.1")
+    thread = threading.Thread(target=_serve, args=(socket, 2, request.param), daemon=True)
+    thread.start()
+    yield f"tcp://127.0.0.1:{port}"
+    thread.join(timeout=1)
+    socket.close(linger=0)
+
+
+@pytest.fixture
+def instrument(server):
+    inst = ZMQInstrument("binary_test", server, binary_arrays=True, timeout=2)
+    yield inst
+    inst.close()
+
+
+def test_roundtrip_frames():
+    response = {"result": {"a": np.arange(6.0).reshape(2, 3), "b": [1, "x"]}, "id": "1"}
+    decoded = decode_binary_frames(encode_binary_frames(response))
+    np.testing.assert_array_equal(decoded["result"]["a"], response["result"]["a"])
+    assert decoded["result"]["b"] == [1, "x"]
+
+
+def test_binary_request_with_fallback(instrument):
+    response = instrument._send_command("getSweepWaveforms", binary=True)
+    np.testing.assert_allclose(response["result"]["AO_wfm"][0]["Y"], WAVEFORM)
+    np.testing.assert_allclose(response["result"]["X_wfm"][0]["Y"], 2 * WAVEFORM)
+
+    # Commands that don't ask for binary framing still get JSON lists
+    response = instrument._send_command("getSweepWaveforms")
+    assert isinstance(response["result"]["AO_wfm"][0]["Y"], list)
@@ -0,0 +1,54 @@
+"""JSON codecs and the pre-serialized command templates of ZMQInstrument."""
+import json
+import math
+
+import numpy as np
+import pytest
+
+from levylabinst.Codec import get_codec, installed_codecs
+from levylabinst.ZMQInstrument import ZMQInstrument
+
+
+@pytest.fixture(params=installed_codecs())
+def codec(request):
+    return get_codec(request.param)
+
+
+@pytest.fixture
+def instrument(codec, free_address, open_instrument):
+    return open_instrument(ZMQInstrument, f"codec_{codec.name}", free_address, codec=codec.name)
+
+
+def test_roundtrip(codec):
+    message = {"jsonrpc": "2.0", "method": "setSweep", "params": {"Table": np.arange(3.0),
+               "Channel": np.int64(2), "Name": "gäte"}, "id": "7"}
+    decoded = codec.loads(codec.dumps(message))
+    assert decoded["params"] == {"Table": [0.0, 1.0, 2.0], "Channel": 2, "Name": "gäte"}
+    assert codec.loads(memoryview(codec.dumps([1, 2]))) == [1, 2]
+
+
+def test_non_finite_numbers_are_accepted(codec):
+    assert math.isnan(codec.loads(b'{"result": NaN}')["result"])
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_templates_match_encoded_commands(instrument, binary):
+    for _ in range(2):  # the second call comes from the cached template
+        payload = instrument._encode_command("getResults", {}, "42", binary)
+        expected = {"jsonrpc": "2.0", "method": "getResults", "params": {}, "id": "42"}
+        if binary:
+            expected["encoding"] = "binary"
+        assert json.loads(payload) == expected
+    assert list(instrument._templates) == [("getResults", binary)]
+
+
+def test_commands_with_params_skip_the_templates(instrument):
+    payload = instrument._encode_command("setSweepTime", 0, "1")
+    assert json.loads(payload)["params"] == 0
+    assert instrument._templates == {}
+
+
+def test_default_is_the_fastest_installed():
+    assert get_codec().name == installed_codecs()[0]
+    with pytest.raises(ValueError):
+        get_codec("yaml")
@@ -0,0 +1,53 @@
+"""
+Micro-benchmarks of the JSON codecs on the hot messages of the lock-in.
+
+Run with pytest-benchmark installed, e.g.
+    python -m pytest tests/test_codec_benchmarks.py --benchmark-only
+"""
+import json
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from levylabinst.Codec import get_codec, installed_codecs
+from levylabinst.SimServer import SimServer
+from levylabinst.ZMQInstrument import ZMQInstrument
+
+
+@pytest.fixture(scope="module")
+def results_reply():
+    server = SimServer(channels=16)
+    try:
+        reply = server.handle({"jsonrpc": "2.0", "method": "getResults", "id": "1"})
+    finally:
+        server.stop()
+    return json.dumps(reply).encode()
+
+
+@pytest.fixture(params=installed_codecs())
+def instrument(request, free_address, open_instrument):
+    return open_instrument(ZMQInstrument, f"codec_bench_{request.param}", free_address,
+                           codec=request.param)
+
+
+def test_encode_template(benchmark, instrument):
+    benchmark.group = "encode getResults"
+    benchmark(instrument._encode_command, "getResults", {}, "12345")
+
+
+def test_encode_dict(benchmark, instrument):
+    benchmark.group = "encode getResults"
+    command = {"jsonrpc": "2.0", "method": "getResults", "params": {}, "id": "12345"}
+    benchmark(instrument._codec.dumps, command)
+
+
+def test_encode_with_params(benchmark, instrument):
+    benchmark.group = "encode setAO_DC"
+    benchmark(instrument._encode_command, "setAO_DC", {"AO Channel": 1, "DC (V)": 0.25}, "1")
+
+
+def test_decode_results(benchmark, instrument, results_reply):
+    benchmark.group = "decode getResults (16 channels)"
+    reply = benchmark(instrument._codec.loads, results_reply)
+    assert len(reply["result"]["Results (Dictionary)"]) == 16 * 11
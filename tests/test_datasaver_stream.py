@@ -0,0 +1,81 @@
+"""DataSaverStream batching and error propagation, with a stand-in and a real DataSaver."""
+import threading
+
+import numpy as np
+import pytest
+import qcodes as qc
+from qcodes.dataset import (Measurement, initialise_or_create_database_at,
+                            load_or_create_experiment)
+from qcodes.parameters import Parameter
+
+from levylabinst.DataSaverStream import DataSaverStream
+
+
+class RecordingDataSaver:
+    def __init__(self, fail=False):
+        self.results = []
+        self.threads = set()
+        self.fail = fail
+
+    def add_result(self, *results):
+        if self.fail:
+            raise ValueError("database is gone")
+        self.threads.add(threading.get_ident())
+        self.results.append(dict(results))
+
+
+def test_chunks_are_written_in_batches():
+    datasaver = RecordingDataSaver()
+    with DataSaverStream(datasaver, ("x", "y"), static=(("T", 4.2),), batch_size=4,
+                         write_in_background=True) as stream:
+        stream.put(np.arange(10), 2 * np.arange(10))
+        stream.put([10, 11], [20, 22])
+
+    assert stream.points_written == 12
+    assert [len(result["x"]) for result in datasaver.results] == [4, 4, 2, 2]
+    assert all(result["T"] == 4.2 for result in datasaver.results)
+    np.testing.assert_array_equal(np.concatenate([r["y"] for r in datasaver.results]),
+                                  2 * np.arange(12))
+    assert threading.get_ident() not in datasaver.threads
+
+
+def test_writer_errors_are_raised():
+    stream = DataSaverStream(RecordingDataSaver(fail=True), ("x", "y"), write_in_background=True)
+    stream.put([1], [2])
+    with pytest.raises(RuntimeError):
+        stream.close()
+    with pytest.raises(RuntimeError):
+        stream.put([1], [2])
+
+
+@pytest.fixture
+def measurement(tmp_path):
+    initialise_or_create_database_at(str(tmp_path / "stream.db"))
+    experiment = load_or_create_experiment("stream", sample_name="none")
+    x = Parameter("x", set_cmd=None)
+    y = Parameter("y", get_cmd=None)
+    meas = Measurement(exp=experiment)
+    meas.register_parameter(x)
+    meas.register_parameter(y, setpoints=(x,))
+    return meas, x, y
+
+
+def test_foreground_writing_is_refused(measurement, monkeypatch):
+    meas, x, y = measurement
+    monkeypatch.setitem(qc.config.dataset, "write_in_background", False)
+    with meas.run() as datasaver:
+        with pytest.raises(ValueError):
+            DataSaverStream(datasaver, (x, y), write_in_background=False)
+        # Like Measurement.run(), None follows the QCoDeS config
+        with pytest.raises(ValueError):
+            DataSaverStream(datasaver, (x, y))
+
+
+def test_streams_into_a_measurement(measurement):
+    meas, x, y = measurement
+    with meas.run(write_in_background=True) as datasaver:
+        with DataSaverStream(datasaver, (x, y), batch_size=8,
+                             write_in_background=True) as stream:
+            stream.put(np.arange(20.0), np.arange(20.0) ** 2)
+    data = datasaver.dataset.get_parameter_data()["y"]
+    np.testing.assert_array_equal(data["y"], np.arange(20.0) ** 2)
@@ -0,0 +1,82 @@
+"""Concurrent requests over the DEALER transport of ZMQInstrument."""
+import json
+import threading
+import time
+
+import pytest
+import zmq
+
+from levylabinst.ZMQInstrument import ZMQInstrument
+
+
+class ReorderingServer:
+    """
+    ROUTER server that collects `gather` requests and answers them in
+    reverse order, each with its own params as the result. A request to
+    "slow" is answered only after `delay` seconds.
+    """
+
+    def __init__(self, gather: int = 1, delay: float = 0):
+        self.gather = gather
+        self.delay = delay
+        self.stop = threading.Event()
+        self.socket = zmq.Context.instance().socket(zmq.ROUTER)
+        self.address = f"tcp://127.0.0.1:{self.socket.bind_to_random_port('tcp://127.0.0.1')}"
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        waiting = []
+        while not self.stop.is_set():
+            if not self.socket.poll(20):
+                continue
+            *route, payload = self.socket.recv_multipart()
+            request = json.loads(payload)
+            if request["method"] == "slow":
+                time.sleep(self.delay)
+            waiting.append((route, request))
+            if len(waiting) < self.gather:
+                continue
+            for route, request in reversed(waiting):
+                reply = {"jsonrpc": "2.0", "result": request["params"], "id": request["id"]}
+                self.socket.send_multipart([*route, json.dumps(reply).encode()])
+            waiting = []
+        self.socket.close(linger=0)
+
+    def close(self):
+        self.stop.set()
+        self.thread.join(timeout=1)
+
+
+def test_threads_get_their_own_replies():
+    server = ReorderingServer(gather=8)
+    inst = ZMQInstrument("dealer_threads", server.address, timeout=5, transport="dealer")
+    results = {}
+
+    def ask(n):
+        results[n] = inst._send_command("echo", {"n": n})["result"]
+
+    try:
+        threads = [threading.Thread(target=ask, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+    finally:
+        inst.close()
+        server.close()
+    # The server only answered once all eight were in flight, last one first
+    assert results == {n: {"n": n} for n in range(8)}
+
+
+def test_late_replies_are_dropped():
+    server = ReorderingServer(delay=0.7)
+    inst = ZMQInstrument("dealer_late", server.address, timeout=0.5, transport="dealer")
+    try:
+        with pytest.raises(zmq.Again):
+            inst._send_command("slow", {"n": 1})
+        # The reply to "slow" arrives while this request waits, and is dropped
+        assert inst._send_command("echo", {"n": 2})["result"] == {"n": 2}
+    finally:
+        inst.close()
+        server.close()
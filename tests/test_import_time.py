@@ -0,0 +1,52 @@
+"""Guards the import cost of levylabinst; each check runs in a fresh interpreter."""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Generous bound for a bare `import levylabinst`, which should load no drivers
+IMPORT_BUDGET = 0.25
+
+
+def _run(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                          capture_output=True, text=True, timeout=60, check=True)
+
+
+def test_package_import_is_lazy_and_quiet():
+    result = _run(
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import levylabinst\n"
+        "elapsed = time.perf_counter() - start\n"
+        "heavy = [m for m in ('zmq', 'numpy', 'qcodes', 'tkinter') if m in sys.modules]\n"
+        "sys.stderr.write(json.dumps({'elapsed': elapsed, 'heavy': heavy}))\n"
+    )
+    assert result.stdout == ""
+    report = json.loads(result.stderr)
+    assert report["heavy"] == []
+    assert report["elapsed"] < IMPORT_BUDGET
+
+
+def test_drivers_load_without_tkinter():
+    result = _run(
+        "import sys\n"
+        "from levylabinst import MCLockin, PPMSSim, DataSaverStream\n"
+        "print('tkinter' in sys.modules)\n"
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_submodule_imports_keep_the_classes():
+    result = _run(
+        "import types\n"
+        "import levylabinst.MCLockin\n"
+        "import levylabinst\n"
+        "from levylabinst import *\n"
+        "print([n for n in levylabinst.__all__\n"
+        "       if isinstance(getattr(levylabinst, n), types.ModuleType)])\n"
+        "print(levylabinst.MCLockin is MCLockin, isinstance(MCLockin, type))\n"
+    )
+    assert result.stdout.split("\n")[:2] == ["[]", "True True"]
@@ -46,6 +46,12 @@ with meas.run() as datasaver:
     datasaver.add_result((lockin.drain_X, y),
                          (lockin.gate_DC, x))
 
+# %% Streamed measurement, the points are written while the sweep runs
+with meas.run(write_in_background=True) as datasaver, \
+        DataSaverStream(datasaver, (lockin.gate_DC, lockin.drain_X),
+                        write_in_background=True) as stream:
+    lockin.sweep1d_async(2, 0, 0.1, 10, 1, on_chunk=stream.put, chunk_interval=0.5).result()
+
 # %%
 ax, cbax = plot_by_id(datasaver.run_id)
 experiments_widget()
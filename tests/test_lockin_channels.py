@@ -0,0 +1,61 @@
+"""Lazy LockinChannel creation of MCLockin; only the telemetry poller needs a server."""
+import time
+
+import pytest
+
+from levylabinst.MCLockin import CHANNEL_PARAMETERS, LockinChannel, MCLockin
+
+CONFIG = {f"lead{i}": i % 4 + 1 for i in range(16)}
+
+
+@pytest.fixture
+def lockin(free_address, open_instrument):
+    return open_instrument(MCLockin, "lazy_lockin", free_address, config=CONFIG, timeout=1)
+
+
+def test_channels_are_created_on_first_access(lockin):
+    assert lockin.submodules == {}
+    assert "lead3" not in lockin.snapshot()["submodules"]
+
+    parameter = lockin.lead3_X
+    assert parameter is lockin.lead3.X
+    assert parameter.full_name == "lazy_lockin_lead3_X"
+    assert isinstance(lockin.lead3, LockinChannel)
+    assert lockin.lead3.channel == CONFIG["lead3"]
+    assert list(lockin.snapshot()["submodules"]) == ["lead3"]
+
+
+def test_unknown_names_still_raise(lockin):
+    with pytest.raises(AttributeError):
+        lockin.lead3_Nope
+    with pytest.raises(AttributeError):
+        lockin.nolead_X
+    assert lockin.submodules == {}
+
+
+def test_eager_channels(free_address, open_instrument):
+    inst = open_instrument(MCLockin, "eager_lockin", free_address, config=CONFIG,
+                           lazy_channels=False, timeout=1)
+    assert set(inst.submodules) == set(CONFIG)
+    assert set(inst.lead0.parameters) == set(CHANNEL_PARAMETERS)
+
+
+def test_telemetry_resolves_channel_parameters(lockin):
+    lockin._record_telemetry("lead1_X", 0.25, 1.0)
+    lockin._record_telemetry("lead2_X", 0.5, 1.0)
+    lockin._record_telemetry("fridge_pressure", 3.0, 1.0)
+    assert lockin.lead1_X.get_latest() == 0.25
+    assert sorted(lockin.telemetry.names()) == ["fridge_pressure", "lazy_lockin_lead1_X",
+                                                "lazy_lockin_lead2_X"]
+
+
+def test_telemetry_poller_by_name(sim_server, open_instrument):
+    inst = open_instrument(MCLockin, "poll_lockin", sim_server.address,
+                           config={"drain": 1, "gate": 2}, timeout=1)
+    inst.start_telemetry_poller(["drain_X", "gate_X"], interval=0.01)
+    assert inst._telemetry_threads[-1].parameters == [inst.drain.X, inst.gate.X]
+    deadline = time.monotonic() + 5
+    while len(inst.telemetry.names()) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    inst.stop_telemetry()
+    assert sorted(inst.telemetry.names()) == ["poll_lockin_drain_X", "poll_lockin_gate_X"]
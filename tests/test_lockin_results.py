@@ -0,0 +1,103 @@
+"""Shared getResults snapshots of MCLockin against a local stand-in server."""
+from functools import partial
+
+import numpy as np
+import pytest
+
+from levylabinst.MCLockin import MCLockin
+
+
+@pytest.fixture
+def server(stand_in_server):
+    ao = {channel: {"Amplitude (V)": 0.0, "Phase (deg)": 0.0} for channel in (1, 2)}
+
+    def set_ao(key, params):
+        ao[params["AO Channel"]][key] = params[key]
+
+    def get_results(params):
+        results = []
+        for channel, settings in ao.items():
+            amplitude, phase = settings["Amplitude (V)"], settings["Phase (deg)"]
+            values = {"X": amplitude * np.cos(np.deg2rad(phase)),
+                      "Y": amplitude * np.sin(np.deg2rad(phase)),
+                      "R": amplitude, "Theta": phase, "Mean": 0.0}
+            results += [{"key": f"AI{channel}.Ref1.{name}", "value": value}
+                        for name, value in values.items()]
+        return {"Results (Dictionary)": results}
+
+    stand_in_server.handlers.update({
+        "getResults": get_results,
+        "setAO_Amplitude": partial(set_ao, "Amplitude (V)"),
+        "setAO_Phase": partial(set_ao, "Phase (deg)"),
+    })
+    return stand_in_server
+
+
+@pytest.fixture
+def lockin(server, open_instrument):
+    return open_instrument(MCLockin, "results_lockin", server.address,
+                           config={"drain": 1, "gate": 2}, timeout=2)
+
+
+def test_every_read_fetches_by_default(lockin, server):
+    lockin.drain_X()
+    lockin.drain_Y()
+    assert server.calls["getResults"] == 2
+
+
+def test_getters_share_a_held_snapshot(lockin, server):
+    lockin.results_max_age(None)
+    lockin.drain_Amp(0.5)
+    assert lockin.drain_R() == pytest.approx(0.5)
+    lockin.drain_X(), lockin.gate_Y(), lockin.drain_Mean()
+    assert server.calls["getResults"] == 1
+
+    # The output changed, but the held snapshot is only replaced on request
+    lockin.drain_Amp(0.25)
+    assert lockin.drain_R() == pytest.approx(0.5)
+    lockin.invalidate_results()
+    assert lockin.drain_R() == pytest.approx(0.25)
+    lockin.acquire_results()
+    lockin.drain_R()
+    assert server.calls["getResults"] == 3
+
+
+def test_snapshot_expires_after_max_age(lockin, server):
+    lockin.results_max_age(10)
+    lockin.drain_X()
+    lockin.drain_Y()
+    assert server.calls["getResults"] == 1
+    lockin._results_timestamp -= 11
+    lockin.drain_X()
+    assert server.calls["getResults"] == 2
+
+
+def test_results_multiparameter(lockin, server):
+    lockin.drain_Amp(0.5)
+    lockin.gate_Phase(90)
+    lockin.gate_Amp(0.2)
+    x, y, r, theta, mean = lockin.results()
+    assert server.calls["getResults"] == 1
+    assert lockin.results.names == tuple(f"results_{m}" for m in ("X", "Y", "R", "Theta", "Mean"))
+    assert lockin.results.shapes == ((2,),) * 5
+    np.testing.assert_array_equal(lockin.results.setpoints[0][0], [1, 2])
+    np.testing.assert_allclose(r, [0.5, 0.2])
+    np.testing.assert_allclose(y, [0, 0.2], atol=1e-12)
+    np.testing.assert_allclose(theta, [0, 90])
+
+
+def test_unreported_keys_read_as_none(lockin, server):
+    get_results = server.handlers["getResults"]
+
+    def without_gate_x(params):
+        results = get_results(params)["Results (Dictionary)"]
+        return {"Results (Dictionary)": [item for item in results
+                                         if item["key"] != "AI2.Ref1.X"]}
+
+    server.handlers["getResults"] = without_gate_x
+    lockin.drain_Amp(0.5)
+    assert lockin.gate_X() is None
+    assert lockin.drain_X() == pytest.approx(0.5)
+    # The results arrays mark it with NaN
+    x = lockin.results()[0]
+    assert np.isnan(x[1])
@@ -0,0 +1,74 @@
+"""Request metrics of ZMQInstrument and their OpenMetrics export."""
+import urllib.request
+
+import pytest
+import zmq
+
+from levylabinst.Metrics import Histogram, Metrics, render_openmetrics, serve_metrics
+from levylabinst.ZMQInstrument import ZMQInstrument
+
+
+@pytest.fixture
+def instrument(stand_in_server, open_instrument):
+    stand_in_server.handlers.update({"getStatus": lambda params: "ok",
+                                     "setState": lambda params: "ok"})
+    return open_instrument(ZMQInstrument, "metrics_test", stand_in_server.address, timeout=2)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("0.1", 1), ("1.0", 3), ("+Inf", 4)]
+    assert histogram.snapshot()["max"] == 5.0
+
+
+def test_requests_are_recorded(instrument):
+    instrument._send_command("getStatus")
+    instrument._send_command("getStatus")
+    instrument._send_command("setState", "start")
+
+    snapshot = instrument.metrics.snapshot()
+    assert snapshot["requests"]["getStatus"]["count"] == 2
+    assert snapshot["requests"]["setState"]["count"] == 1
+    assert snapshot["encode"]["count"] == 3
+    assert snapshot["decode"]["count"] == 3
+    assert snapshot["bytes_sent"] > 0 and snapshot["bytes_received"] > 0
+
+
+def test_timeouts_are_counted():
+    # A server that never answers
+    socket = zmq.Context.instance().socket(zmq.REP)
+    port = socket.bind_to_random_port("tcp://127.0.0.1")
+    inst = ZMQInstrument("metrics_timeout", f"tcp://127.0.0.1:{port}", timeout=0.05,
+                         retries=0)
+    try:
+        with pytest.raises(zmq.Again):
+            inst._send_command("getStatus")
+        assert inst.metrics.snapshot()["timeouts"] == {"getStatus": 1}
+    finally:
+        inst.close()
+        socket.close(linger=0)
+
+
+def test_openmetrics_export():
+    metrics = Metrics("lockin")
+    metrics.observe_request("getResults", 0.002)
+    metrics.count_retry("getResults")
+    text = render_openmetrics([metrics, Metrics("ppms")])
+    assert text.endswith("# EOF\n")
+    assert text.count("# TYPE levylab_request_seconds histogram") == 1
+    assert ('levylab_request_seconds_bucket{instrument="lockin",method="getResults",'
+            'le="0.0025"} 1') in text
+    assert 'levylab_retries_total{instrument="lockin",method="getResults"} 1' in text
+    assert 'levylab_sent_bytes_total{instrument="ppms"} 0' in text
+
+    server = serve_metrics([metrics])
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.read().decode() == metrics.openmetrics()
+            assert response.headers["Content-Type"].startswith("application/openmetrics-text")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,62 @@
+"""PPMS ramp monitoring, superseded ramps and ramp timeouts against the simulated server."""
+import pytest
+
+from levylabinst.PPMSSim import PPMSSim, RampMonitor, RampSuperseded
+
+pytestmark = pytest.mark.sim_server(ramp_speedup=600)
+
+
+@pytest.fixture
+def ppms(sim_server, open_instrument):
+    inst = open_instrument(PPMSSim, "ramp_ppms", sim_server.address, timeout=2)
+    inst.ramp_poll_interval((0.01, 0.05))
+    inst.ramp_blocking(False)
+    return inst
+
+
+def test_monitor_settles_after_settle_time():
+    monitor = RampMonitor(10, rate=60, tolerance=0.1, settle_time=1,
+                          min_interval=0.01, max_interval=5)
+    # 5 K away at 1 K/s: polled again when about half of the way is left
+    assert monitor.update(5, now=0) == pytest.approx(2.45)
+    assert monitor.update(9.95, now=3) == pytest.approx(1)
+    assert monitor.update(10.2, now=3.5) == pytest.approx(0.05)
+    assert monitor.update(10, now=4) == pytest.approx(1)
+    assert monitor.update(10, now=5) is None
+
+
+def test_monitor_deadline():
+    monitor = RampMonitor(10, rate=60, tolerance=0.1, settle_time=1,
+                          min_interval=0.01, max_interval=5, timeout_margin=2)
+    monitor.update(5, now=0)
+    assert monitor.deadline == pytest.approx(8)
+    monitor.update(9, now=7.9)
+    with pytest.raises(TimeoutError):
+        monitor.update(9.5, now=8.1)
+
+
+def test_superseded_ramps_free_the_workers(ppms):
+    first = ppms.ramp_field(1, 0.01)
+    second = ppms.ramp_field(2, 0.01)
+    third = ppms.ramp_field(3, 0.01)
+    with pytest.raises(RampSuperseded):
+        first.result(timeout=5)
+    with pytest.raises(RampSuperseded):
+        second.result(timeout=5)
+    assert ppms.ramp_temperature(300, 10).result(timeout=5) == pytest.approx(300)
+    assert not third.done()
+    ppms.ramp_field(0, 1).result(timeout=5)
+
+
+def test_ramp_timeout(ppms):
+    ppms.ramp_timeout_margin(0.2)
+    # 1 K at 1 K/min, which the simulation runs 600 times faster: 0.1 s
+    assert ppms.ramp_temperature(301, 1).result(timeout=5) == pytest.approx(301)
+
+    # A reading stuck 5 K from the target at 6000 K/min: due after 0.05 s + 0.2 s
+    monitor = ppms._ramp_monitor(310, 6000, ppms.temperature_tolerance())
+    stuck = ppms._submit(ppms._wait_for_ramp, lambda: 305.0, monitor,
+                         ppms._supersede_ramp("temperature"))
+    with pytest.raises(TimeoutError):
+        stuck.result(timeout=5)
+
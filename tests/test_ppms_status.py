@@ -0,0 +1,46 @@
+"""Status reply cache of PPMSSim against a local stand-in server."""
+import pytest
+
+from levylabinst.PPMSSim import PPMSSim
+
+
+@pytest.fixture
+def server(stand_in_server):
+    temperature = {"Temperature (K)": 300.0, "Temperature Status": "Stable"}
+
+    def set_temperature(params):
+        # The stand-in gets there at once
+        temperature["Temperature (K)"] = params["Temperature (K)"]
+
+    stand_in_server.handlers.update({
+        "Get Temperature": lambda params: dict(temperature),
+        "Set Temperature": set_temperature,
+        "Get Magnet": lambda params: {"Field (T)": 0.0, "Magnet Status": "Holding"},
+    })
+    return stand_in_server
+
+
+@pytest.fixture
+def ppms(server, open_instrument):
+    inst = open_instrument(PPMSSim, "status_ppms", server.address, timeout=2)
+    inst.ramp_poll_interval((0.01, 0.05))
+    return inst
+
+
+def test_status_replies_are_shared(ppms, server):
+    calls = server.calls
+    ppms.status_max_age(10)
+    ppms.invalidate_status()
+    start = calls["Get Temperature"]
+    ppms.temperature(), ppms.temperature_state(), ppms.temperature()
+    assert calls["Get Temperature"] - start == 1
+
+    # Starting a ramp drops the reply, so the next read sees the new temperature
+    ramp = ppms.ramp_temperature(290, 1)
+    assert ppms.temperature() == 290
+    assert ramp.result(timeout=5) == 290
+
+    ppms.status_max_age(0)
+    start = calls["Get Temperature"]
+    ppms.temperature(), ppms.temperature()
+    assert calls["Get Temperature"] - start == 2
@@ -0,0 +1,137 @@
+"""RemoteInstrument proxies of MCLockin in a worker process, against the simulated server."""
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+from qcodes.dataset import (LinSweep, dond, initialise_or_create_database_at,
+                            load_or_create_experiment)
+from qcodes.parameters import ParameterWithSetpoints
+
+from levylabinst.MCLockin import MCLockin
+from levylabinst.RemoteInstrument import (SHARED_MIN_BYTES, RemoteInstrument, SharedArrays,
+                                          _portable_error, prefetch)
+from levylabinst.SimServer import SimServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    with SimServer(waveform_points=5000) as server:
+        yield server
+
+
+@pytest.fixture(scope="module")
+def lockin(server):
+    inst = RemoteInstrument("remote_lockin", MCLockin, server.address,
+                            config={"drain": 1, "gate": 2}, binary_arrays=True, timeout=2)
+    yield inst
+    inst.close()
+
+
+def test_shared_arrays_roundtrip():
+    arena = SharedArrays(2**20)
+    try:
+        free = threading.Semaphore(1)
+        large = np.arange(SHARED_MIN_BYTES, dtype=float)
+        reply = {"AO_wfm": [{"Y": large}], "small": np.arange(3), "too_large": np.zeros(2**18)}
+        packed, shared = arena.pack(reply, free)
+        assert shared and not free.acquire(blocking=False)
+        assert not isinstance(packed["AO_wfm"][0]["Y"], np.ndarray)
+        assert isinstance(packed["small"], np.ndarray)
+        assert isinstance(packed["too_large"], np.ndarray)
+
+        unpacked = arena.unpack(packed)
+        np.testing.assert_array_equal(unpacked["AO_wfm"][0]["Y"], large)
+        assert unpacked["AO_wfm"][0]["Y"].flags.owndata
+    finally:
+        arena.close(unlink=True)
+
+
+def test_parameters_are_proxied(lockin, server):
+    assert lockin.sweep_npts.unit == "" and lockin.sweep_setpoints.unit == "V"
+    # Lazy channels are created in the worker on first access
+    assert "drain" not in lockin.submodules
+    lockin.drain_Amp(0.5)
+    assert server.ao[1]["Amplitude (V)"] == 0.5
+    assert lockin.drain_R() == pytest.approx(0.5)
+    assert lockin.drain_R is lockin.drain.R
+    assert lockin.drain_R.full_name == "remote_lockin_drain_R"
+    assert isinstance(lockin.gate.X_sweep, ParameterWithSetpoints)
+    assert lockin.gate.X_sweep.setpoints == (lockin.sweep_setpoints,)
+
+
+def test_errors_are_raised_in_the_main_process(lockin):
+    with pytest.raises(ValueError):
+        lockin.drain_Function("Sawtooth")
+    with pytest.raises(AttributeError):
+        lockin.no_such_attribute
+
+
+def test_methods_and_attributes(lockin, server):
+    assert lockin.config == {"drain": 1, "gate": 2}
+    ao, x = lockin.sweep1d(2, 0, 1, 0.1, 2)
+    # 40 kB per waveform, so these came through shared memory
+    np.testing.assert_allclose(ao, np.linspace(0, 1, 5000))
+    np.testing.assert_allclose(x, np.tanh(2 * ao))
+
+
+def test_prefetch(lockin, server):
+    lockin.gate_Amp(0.25)
+    calls = server.calls["getResults"]
+    prefetch(lockin.results, lockin.gate_R)
+    x, y, r, theta, mean = lockin.results()
+    assert r[1] == pytest.approx(0.25)
+    assert lockin.gate_R() == pytest.approx(0.25)
+    assert server.calls["getResults"] - calls <= 2
+
+    # A set in between drops the prefetched reply
+    prefetch(lockin.gate_R)
+    lockin.gate_Amp(0.5)
+    assert lockin.gate_R() == pytest.approx(0.5)
+
+
+def test_dond(lockin, tmp_path):
+    initialise_or_create_database_at(str(tmp_path / "remote.db"))
+    experiment = load_or_create_experiment("remote", sample_name="sim")
+    lockin.drain_Amp(1)
+    dataset, _, _ = dond(LinSweep(lockin.drain_Phase, 0, 90, 4,
+                                  post_actions=(lambda: prefetch(lockin.drain_X),)),
+                         lockin.drain_X, exp=experiment, do_plot=False)
+    data = dataset.get_parameter_data()["remote_lockin_drain_X"]
+    np.testing.assert_allclose(data["remote_lockin_drain_X"],
+                               np.cos(np.deg2rad(data["remote_lockin_drain_Phase"])), atol=1e-9)
+
+
+def test_unpicklable_errors_keep_the_worker_traceback():
+    class LocalError(Exception):
+        # Local classes can't be pickled
+        pass
+
+    try:
+        raise LocalError("boom")
+    except LocalError as e:
+        error = _portable_error(e, "remote_lockin")
+    assert isinstance(error, RuntimeError)
+    assert "LocalError: boom" in str(error)
+    assert "Raised in the worker of remote_lockin" in str(error)
+
+
+def test_unclosed_proxies_stop_their_worker_at_exit():
+    script = (
+        "import time\n"
+        "from levylabinst.MCLockin import MCLockin\n"
+        "from levylabinst.RemoteInstrument import RemoteInstrument\n"
+        "from levylabinst.SimServer import SimServer\n"
+        "server = SimServer().start()\n"
+        "lockin = RemoteInstrument('exit_lockin', MCLockin, server.address,\n"
+        "                          config={'drain': 1}, timeout=2)\n"
+        "lockin.drain_Amp(0.1)\n"
+        "print('done', time.time())\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            timeout=60, check=True)
+    done = next(float(line.split()[1]) for line in result.stdout.splitlines()
+                if line.startswith("done"))
+    assert time.time() - done < 5
@@ -0,0 +1,80 @@
+"""JSON-RPC ids and response matching of RequestTracker."""
+import json
+import threading
+
+import pytest
+import zmq
+
+from levylabinst.ZMQTransport import ReqTransport, RequestTracker
+
+
+def test_ids_are_unique_and_increasing():
+    tracker = RequestTracker()
+    ids = [tracker.next_id() for _ in range(1000)]
+    assert all(isinstance(i, str) for i in ids)
+    numbers = [int(i) for i in ids]
+    assert numbers == sorted(set(numbers))
+
+
+def test_responses_resolve_their_own_futures():
+    tracker = RequestTracker()
+    first, second = tracker.register("1"), tracker.register("2")
+    assert tracker.resolve({"id": "2", "result": "b"})
+    assert tracker.resolve({"id": 1, "result": "a"})
+    assert first.result() == {"id": 1, "result": "a"}
+    assert second.result() == {"id": "2", "result": "b"}
+    # Each future is resolved once; later and unknown replies are dropped
+    assert not tracker.resolve({"id": "1", "result": "again"})
+    assert not tracker.resolve({"id": "3", "result": "c"})
+
+
+def test_batches_and_discarded_requests():
+    tracker = RequestTracker()
+    kept, dropped = tracker.register("1"), tracker.register("2")
+    tracker.discard("2")
+    assert tracker.resolve([{"id": "2", "result": "late"}, {"id": "1", "result": "ok"}])
+    assert kept.result()["result"] == "ok"
+    assert not dropped.done()
+
+
+def test_check():
+    RequestTracker.check({"id": "7"}, "7")
+    # Parse errors carry no id, and batches are matched by their callers
+    RequestTracker.check({"id": None, "error": {}}, "7")
+    RequestTracker.check([{"id": "8"}], ["7"])
+    with pytest.raises(RuntimeError):
+        RequestTracker.check({"id": "8"}, "7")
+
+
+def test_lockstep_transport_rejects_a_mismatched_id():
+    context = zmq.Context.instance()
+    server = context.socket(zmq.REP)
+    address = f"tcp://127.0.0.1:{server.bind_to_random_port('tcp://127.0.0.1')}"
+
+    def answer_with_another_id():
+        request = json.loads(server.recv())
+        server.send_string(json.dumps({"jsonrpc": "2.0", "result": "ok",
+                                       "id": str(int(request["id"]) + 1)}))
+
+    thread = threading.Thread(target=answer_with_another_id, daemon=True)
+    thread.start()
+    tracker = RequestTracker()
+    transport = ReqTransport(context, address, 2, tracker)
+    try:
+        request_id = tracker.next_id()
+        payload = json.dumps({"jsonrpc": "2.0", "method": "getStatus", "id": request_id})
+        with pytest.raises(RuntimeError):
+            transport.request(payload, request_id)
+    finally:
+        thread.join(timeout=1)
+        transport.close()
+        server.close(linger=0)
+
+
+def test_fail_only_touches_pending_requests():
+    tracker = RequestTracker()
+    waiting, answered = tracker.register("1"), tracker.register("2")
+    tracker.resolve({"id": "2", "result": "ok"})
+    tracker.fail(["1", "2", "3"], RuntimeError("reader stopped"))
+    assert isinstance(waiting.exception(), RuntimeError)
+    assert answered.result()["result"] == "ok"
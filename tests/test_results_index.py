@@ -0,0 +1,33 @@
+"""ResultsIndex key-position learning of getResults replies."""
+import numpy as np
+
+from levylabinst.MCLockin import ResultsIndex
+
+
+def _reply(*keys):
+    return [{"key": key, "value": float(i)} for i, key in enumerate(keys)]
+
+
+def test_values_in_the_order_of_the_keys():
+    index = ResultsIndex(["b", "a"])
+    np.testing.assert_array_equal(index.values(_reply("a", "x", "b")), [2, 0])
+    # Same layout: read by position
+    np.testing.assert_array_equal(index.values(_reply("a", "x", "b")), [2, 0])
+
+
+def test_layout_changes_are_learned():
+    index = ResultsIndex(["a", "b"])
+    index.values(_reply("a", "b"))
+    np.testing.assert_array_equal(index.values(_reply("b", "a")), [1, 0])
+    np.testing.assert_array_equal(index.values(_reply("x", "b", "a")), [2, 1])
+
+
+def test_missing_keys_are_nan_until_they_appear():
+    index = ResultsIndex(["a", "b"])
+    np.testing.assert_array_equal(index.values(_reply("a", "x")), [0, np.nan])
+    assert index.found("a") and not index.found("b")
+    # b takes the place of x, with the reply length unchanged
+    np.testing.assert_array_equal(index.values(_reply("a", "b")), [0, 1])
+    assert index.found("b")
+    np.testing.assert_array_equal(index.values(_reply("q", "r")), [np.nan, np.nan])
+    assert not index.found("a")
@@ -0,0 +1,55 @@
+"""The process-wide ZMQ context shared by ZMQInstrument instances."""
+import multiprocessing
+import os
+
+import pytest
+import zmq
+
+from levylabinst.ZMQInstrument import ZMQInstrument
+from levylabinst.ZMQTransport import acquire_context, configure_context, release_context
+
+
+def test_instruments_share_one_context(free_address):
+    first = ZMQInstrument("shared_a", free_address, transport="req")
+    second = ZMQInstrument("shared_b", free_address, transport="dealer")
+    context = first.context
+    assert second.context is context
+
+    first.close()
+    assert not context.closed
+    second.close()
+    assert context.closed
+
+
+def test_io_threads_apply_to_the_next_context(free_address):
+    configure_context(2)
+    try:
+        inst = ZMQInstrument("io_threads", free_address)
+        assert inst.context.get(zmq.IO_THREADS) == 2
+        inst.close()
+    finally:
+        configure_context(1)
+    with pytest.raises(ValueError):
+        configure_context(0)
+
+
+def _child_context(parent_context_id, queue):
+    context = acquire_context()
+    queue.put(id(context) != parent_context_id and not context.closed)
+    release_context(context)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_children_get_their_own_context(free_address):
+    inst = ZMQInstrument("fork_parent", free_address)
+    try:
+        fork = multiprocessing.get_context("fork")
+        queue = fork.Queue()
+        child = fork.Process(target=_child_context, args=(id(inst.context), queue))
+        child.start()
+        assert queue.get(timeout=10)
+        child.join(timeout=10)
+        assert child.exitcode == 0
+        assert not inst.context.closed
+    finally:
+        inst.close()
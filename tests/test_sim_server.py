@@ -0,0 +1,95 @@
+"""The drivers against the simulated lock-in and PPMS server."""
+import json
+
+import numpy as np
+import pytest
+import zmq
+from qcodes.dataset import (LinSweep, dond, initialise_or_create_database_at,
+                            load_or_create_experiment)
+
+from levylabinst.MCLockin import MCLockin
+from levylabinst.PPMSSim import PPMSSim
+
+pytestmark = pytest.mark.sim_server(waveform_points=200, ramp_speedup=600)
+
+
+@pytest.fixture
+def lockin(sim_server, open_instrument):
+    return open_instrument(MCLockin, "sim_lockin", sim_server.address,
+                           config={"drain": 1, "gate": 2}, binary_arrays=True, timeout=2)
+
+
+def test_lockin_results_follow_the_outputs(lockin, sim_server):
+    lockin.drain_Amp(0.5)
+    lockin.drain_Phase(90)
+    assert lockin.drain_R() == pytest.approx(0.5)
+    assert lockin.drain_Y() == pytest.approx(0.5)
+    assert sim_server.ao[1]["Amplitude (V)"] == 0.5
+
+
+def test_lockin_sweep(lockin, sim_server):
+    ao, x = lockin.sweep1d(2, 0, 1, 0.2, 2)
+    np.testing.assert_allclose(ao, np.linspace(0, 1, 200))
+    np.testing.assert_allclose(x, np.tanh(2 * ao))
+    assert lockin.state() == "running"
+    assert sim_server.ao[2]["DC (V)"] == 1
+
+
+def test_ppms_ramp(sim_server, open_instrument):
+    ppms = open_instrument(PPMSSim, "sim_ppms", sim_server.address, timeout=2)
+    ppms.temperature((299, 10))  # 1 K at 10 K/min, run 600 times faster
+    assert ppms.temperature() == pytest.approx(299)
+    assert ppms.temperature_state() == "Stable"
+
+
+def test_unknown_methods_get_an_error(lockin):
+    response = lockin._send_command("noSuchMethod")
+    assert response["error"]["code"] == -32601
+
+
+def test_buffered_sweep_in_dond(sim_server, lockin, open_instrument, tmp_path):
+    # The field x gate map of src/do1d_test.py, scaled down
+    initialise_or_create_database_at(str(tmp_path / "buffered.db"))
+    experiment = load_or_create_experiment("buffered", sample_name="sim")
+    ppms = open_instrument(PPMSSim, "dond_ppms", sim_server.address, timeout=2)
+    ppms.field_rate(1)
+    lockin.sweep_channel(2)
+    lockin.sweep_start(0)
+    lockin.sweep_stop(0.1)
+    lockin.sweep_time(0.1)
+    lockin.sweep_npts(20)
+    dataset, _, _ = dond(LinSweep(ppms.field_target, 0, 0.1, 2), lockin.drain_X_sweep,
+                         exp=experiment, do_plot=False)
+    data = dataset.get_parameter_data()["sim_lockin_drain_X_sweep"]
+    assert data["sim_lockin_drain_X_sweep"].shape == (2, 20)
+    np.testing.assert_allclose(data["dond_ppms_field_target"][:, 0], [0, 0.1])
+
+
+def test_handler_errors_are_replied(lockin, sim_server):
+    response = lockin._send_command("setAO_DC", {"DC (V)": 0.5})
+    assert response["error"]["code"] == -32602
+
+    def fail(params):
+        raise RuntimeError("simulated failure")
+
+    sim_server._methods["fail"] = fail
+    assert lockin._send_command("fail")["error"]["code"] == -32603
+    # The server is still there
+    assert lockin.state() == "idle"
+
+
+def test_requests_that_are_not_objects_are_invalid(lockin, sim_server):
+    socket = zmq.Context.instance().socket(zmq.REQ)
+    socket.connect(sim_server.address)
+    try:
+        for request in (b"42", b'"x"', b"[]", b"[1]"):
+            socket.send(request)
+            assert socket.poll(2000)
+            response = json.loads(socket.recv())
+            if request == b"[1]":
+                (response,) = response
+            assert response["error"]["code"] == -32600
+    finally:
+        socket.close(linger=0)
+    # The server is still there
+    assert lockin.state() == "idle"
@@ -0,0 +1,89 @@
+"""Multi-channel buffered sweeps, streamed async sweeps and SweepWaiter of MCLockin."""
+import time
+
+import numpy as np
+import pytest
+from qcodes.dataset import (LinSweep, dond, initialise_or_create_database_at,
+                            load_or_create_experiment)
+
+from levylabinst.MCLockin import MCLockin, SweepWaiter
+from levylabinst.PPMSSim import PPMSSim
+
+pytestmark = pytest.mark.sim_server(waveform_points=50, ramp_speedup=600)
+
+
+@pytest.fixture
+def lockin(sim_server, open_instrument):
+    inst = open_instrument(MCLockin, "sweep_lockin", sim_server.address,
+                           config={"drain": 1, "gate": 2, "back": 3}, timeout=2)
+    inst.sweep_npts(50)
+    return inst
+
+
+def test_set_sweep_configures_the_buffered_sweep(lockin, sim_server):
+    lockin.set_sweep([{"channel": 2, "start": 0, "end": 1},
+                      {"channel": 3, "start": 1, "end": 0}], sweep_time=0.1, initial_wait=0)
+    assert (lockin.sweep_channel(), lockin.sweep_start(), lockin.sweep_stop()) == (2, 0, 1)
+    assert lockin.sweep_extra_channels() == [{"channel": 3, "start": 1, "end": 0}]
+    assert [c["Channel"] for c in sim_server.sweep_config["Channels"]] == [2, 3]
+    assert lockin.swept_ao_parameters() == [lockin.back.AO_sweep]
+
+
+def test_unlabeled_swept_channels_are_reported(lockin):
+    lockin.set_sweep([{"channel": 2, "start": 0, "end": 1},
+                      {"channel": 4, "start": 1, "end": 0}], sweep_time=0.1, initial_wait=0)
+    with pytest.raises(ValueError, match="channel 4"):
+        lockin.swept_ao_parameters()
+
+
+def test_extra_swept_channels_in_dond(lockin, sim_server, open_instrument, tmp_path):
+    initialise_or_create_database_at(str(tmp_path / "sweeps.db"))
+    experiment = load_or_create_experiment("sweeps", sample_name="sim")
+    ppms = open_instrument(PPMSSim, "sweep_ppms", sim_server.address, timeout=2)
+    ppms.field_rate(1)
+    lockin.set_sweep([{"channel": 2, "start": 0, "end": 1},
+                      {"channel": 3, "start": 1, "end": 0}], sweep_time=0.1, initial_wait=0)
+    dataset, _, _ = dond(LinSweep(ppms.field_target, 0, 0.1, 2),
+                         lockin.drain_X_sweep, *lockin.swept_ao_parameters(),
+                         exp=experiment, do_plot=False)
+    data = dataset.get_parameter_data()
+    back = data["sweep_lockin_back_AO_sweep"]
+    np.testing.assert_allclose(back["sweep_lockin_sweep_setpoints"][0], np.linspace(0, 1, 50))
+    np.testing.assert_allclose(back["sweep_lockin_back_AO_sweep"][0], np.linspace(1, 0, 50))
+    # One sweep per field point, shared by both buffered parameters
+    assert sim_server.calls["getSweepWaveforms"] == 2
+
+
+def test_sweep1d_async_chunks_join_up(lockin):
+    chunks = []
+    handle = lockin.sweep1d_async(2, 0, 1, 0.3, 1, on_chunk=lambda *chunk: chunks.append(chunk),
+                                  chunk_interval=0.05)
+    x, y = handle.result(timeout=10)
+    # Streamed while the sweep ran, not only at the end
+    assert len(chunks) > 2
+    np.testing.assert_array_equal(np.concatenate([chunk[0] for chunk in chunks]), x)
+    np.testing.assert_array_equal(np.concatenate([chunk[1] for chunk in chunks]), y)
+    np.testing.assert_allclose(x, np.linspace(0, 1, 50))
+
+
+def test_sweep_waiter_timeout():
+    waiter = SweepWaiter(expected=0, timeout=0.05, min_interval=0.01, max_interval=0.01)
+    assert waiter.update(None) is not None
+    time.sleep(0.06)
+    with pytest.raises(TimeoutError):
+        waiter.update("sweeping")
+
+
+def test_sweep_waiter_error_state():
+    waiter = SweepWaiter(expected=10, timeout=1)
+    with pytest.raises(RuntimeError):
+        waiter.update("Error: AO overrange")
+
+
+def test_sweep_waiter_waits_for_the_expected_end():
+    waiter = SweepWaiter(expected=0.05, timeout=1, min_interval=0.01)
+    # A state that didn't switch to sweeping yet doesn't end the wait early
+    assert waiter.update("running") == pytest.approx(0.05, abs=0.01)
+    time.sleep(0.06)
+    assert waiter.update("sweeping") == pytest.approx(0.01)
+    assert waiter.update("running") is None
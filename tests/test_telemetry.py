@@ -0,0 +1,75 @@
+"""Telemetry store, PUB subscriber and poller of ZMQInstrument."""
+import json
+import time
+
+import pytest
+import zmq
+
+from levylabinst.PPMSSim import PPMSSim
+from levylabinst.Telemetry import Telemetry
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def server(stand_in_server):
+    stand_in_server.handlers.update({
+        "Get Temperature": lambda params: {"Temperature (K)": 300.0,
+                                           "Temperature Status": "Stable"},
+        "Get Magnet": lambda params: {"Field (T)": 0.0, "Magnet Status": "Holding"},
+    })
+    return stand_in_server
+
+
+@pytest.fixture
+def ppms(server, open_instrument):
+    return open_instrument(PPMSSim, "telemetry_ppms", server.address, timeout=2)
+
+
+def test_history_is_bounded():
+    telemetry = Telemetry(history=3)
+    for i in range(5):
+        telemetry.record("T", float(i), timestamp=100.0 + i)
+    timestamps, values = telemetry.history("T")
+    assert list(values) == [2, 3, 4] and list(timestamps) == [102, 103, 104]
+    assert telemetry.latest("T") == 4
+    # Recorded long ago
+    assert telemetry.latest("T", max_age=1, default="stale") == "stale"
+    assert telemetry.history("nothing")[0].size == 0
+
+
+def test_subscriber_updates_the_parameter_cache(ppms):
+    publisher = zmq.Context.instance().socket(zmq.PUB)
+    port = publisher.bind_to_random_port("tcp://127.0.0.1")
+    try:
+        ppms.subscribe_telemetry(f"tcp://127.0.0.1:{port}", topics=("ppms",))
+
+        def publish():
+            publisher.send_multipart([b"ppms", json.dumps({"temperature": 4.2,
+                                                            "pressure": 1e-6}).encode()])
+            publisher.send_multipart([b"other", json.dumps({"temperature": 300}).encode()])
+            return "pressure" in ppms.telemetry.names()
+
+        # PUB drops messages until the subscription has arrived
+        _wait_for(publish)
+        assert ppms.telemetry.latest("telemetry_ppms_temperature") == 4.2
+        assert ppms.temperature.get_latest() == 4.2
+    finally:
+        ppms.stop_telemetry()
+        publisher.close(linger=0)
+
+
+def test_poller_records_the_readings(ppms, server):
+    ppms.start_telemetry_poller(["temperature", ppms.field], interval=0.01)
+    try:
+        _wait_for(lambda: len(ppms.telemetry.history("telemetry_ppms_field")[0]) >= 3)
+    finally:
+        ppms.stop_telemetry()
+    assert ppms.telemetry.latest("telemetry_ppms_temperature") == pytest.approx(300)
+    assert ppms._telemetry_threads == []
@@ -0,0 +1,115 @@
+"""Timeout recovery and retries of ZMQInstrument against a server that drops requests."""
+import json
+import threading
+import time
+
+import pytest
+import zmq
+
+from levylabinst.PPMSSim import PPMSSim
+from levylabinst.ZMQInstrument import ZMQInstrument
+
+
+class FlakyServer:
+    """
+    ROUTER server that ignores the first `drop` requests it receives and
+    answers the rest, like a server that hiccups for a while.
+    """
+
+    def __init__(self, drop: int):
+        self.drop = drop
+        self.methods = []
+        self.stop = threading.Event()
+        self.socket = zmq.Context.instance().socket(zmq.ROUTER)
+        self.address = f"tcp://127.0.0.1:{self.socket.bind_to_random_port('tcp://127.0.0.1')}"
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while not self.stop.is_set():
+            if not self.socket.poll(20):
+                continue
+            *route, payload = self.socket.recv_multipart()
+            request = json.loads(payload)
+            self.methods.append(request["method"])
+            if len(self.methods) <= self.drop:
+                continue
+            reply = {"jsonrpc": "2.0", "result": "ok", "id": request["id"]}
+            self.socket.send_multipart([*route, json.dumps(reply).encode()])
+        self.socket.close(linger=0)
+
+
+@pytest.fixture
+def server(request):
+    server = FlakyServer(getattr(request, "param", 1))
+    yield server
+    server.stop.set()
+    server.thread.join(timeout=1)
+
+
+@pytest.fixture(params=["req", "dealer"])
+def instrument(server, request):
+    inst = ZMQInstrument(f"flaky_{request.param}", server.address, timeout=0.1,
+                         transport=request.param)
+    inst.zmq_retry_backoff(0.01)
+    yield inst
+    inst.close()
+
+
+def test_idempotent_requests_are_retried(instrument, server):
+    assert instrument._send_command("getStatus")["result"] == "ok"
+    assert server.methods == ["getStatus", "getStatus"]
+    snapshot = instrument.metrics.snapshot()
+    assert snapshot["timeouts"] == {"getStatus": 1}
+    assert snapshot["retries"] == {"getStatus": 1}
+
+
+def test_sets_fail_but_the_socket_recovers(instrument, server):
+    with pytest.raises(zmq.Again):
+        instrument._send_command("setState", "start")
+    # A REQ socket would refuse to send here if it had not been replaced
+    assert instrument._send_command("setState", "stop")["result"] == "ok"
+    assert server.methods == ["setState", "setState"]
+
+
+def test_lazy_pirate_retries_everything(instrument, server):
+    instrument.zmq_lazy_pirate(True)
+    assert instrument._send_command("setState", "start")["result"] == "ok"
+    assert server.methods == ["setState", "setState"]
+
+
+@pytest.mark.parametrize("server", [5], indirect=True)
+def test_retries_give_up(instrument, server):
+    instrument.zmq_retries(2)
+    with pytest.raises(zmq.Again):
+        instrument._send_command("getStatus")
+    assert server.methods == ["getStatus"] * 3
+
+
+@pytest.mark.parametrize("server", [4], indirect=True)
+def test_no_retries_while_the_server_is_down(instrument, server):
+    with pytest.raises(zmq.Again):
+        instrument._send_command("getStatus")
+    # Given up on: the next request gets a single attempt
+    with pytest.raises(zmq.Again):
+        instrument._send_command("getResults")
+    assert server.methods == ["getStatus"] * 3 + ["getResults"]
+    # It answers again, and retries are back
+    assert instrument._send_command("getStatus")["result"] == "ok"
+    assert not instrument._server_down
+
+
+def test_ppms_snapshot_of_a_dead_server_costs_one_timeout():
+    server = FlakyServer(drop=1000)
+    try:
+        start = time.perf_counter()
+        ppms = PPMSSim("dead_ppms", server.address, timeout=0.2)
+        try:
+            assert time.perf_counter() - start < 1
+            assert server.methods == ["Get Temperature"]
+            assert ppms.metrics.snapshot()["retries"] == {}
+        finally:
+            ppms.close()
+    finally:
+        server.stop.set()
+        server.thread.join(timeout=1)